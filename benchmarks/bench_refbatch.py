@@ -0,0 +1,95 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+# RefBatch against per-reference libgit2 calls.
+#
+# Every measurement is the best of `repeat` runs, each one on a new
+# repository.
+#
+# usage: python benchmarks/bench_refbatch.py [number of refs [repeat]]
+
+import sys
+import ctypes as ct
+
+import libgit2
+
+from benchutil import git, scratch_repo, best_of, report
+
+
+def create_each(repo, names, target):
+    ref = ct.POINTER(libgit2.git_reference)()
+    oid = libgit2.git_oid()
+    libgit2.git_oid_fromstr(ct.byref(oid), target.encode())
+    for name in names:
+        assert libgit2.git_reference_create(ct.byref(ref), repo, name.encode(), ct.byref(oid),
+                                            0, b"bench") == 0
+        libgit2.git_reference_free(ref)
+
+
+def delete_each(repo, names, target=None):
+    ref = ct.POINTER(libgit2.git_reference)()
+    for name in names:
+        assert libgit2.git_reference_lookup(ct.byref(ref), repo, name.encode()) == 0
+        assert libgit2.git_reference_delete(ref) == 0
+        libgit2.git_reference_free(ref)
+
+
+def create_batch(repo, names, target, reflog=True):
+    batch = libgit2.RefBatch(repo, reflog=reflog, message="bench")
+    for name in names:
+        batch.create(name, target)
+    assert not batch.commit().failures
+
+
+def create_batch_noreflog(repo, names, target):
+    create_batch(repo, names, target, reflog=False)
+
+
+def delete_batch(repo, names, target=None):
+    batch = libgit2.RefBatch(repo)
+    for name in names:
+        batch.delete(name)
+    assert not batch.commit().failures
+
+
+def main(count=5000, repeat=5):
+    names = ["refs/heads/bench/{}".format(i) for i in range(count)]
+
+    for bare in (False, True):
+        print("{} loose refs ({})".format(count, "bare repository, no reflogs" if bare
+                                          else "reflogs"))
+        for label, func in (("git_reference_create per ref", create_each),
+                            ("RefBatch.create", create_batch),
+                            ("RefBatch.create (reflog=False)", create_batch_noreflog)):
+            with scratch_repo(*(("--bare",) if bare else ())) as (path, open_repo):
+                target = git(path, "commit-tree", "-m", "bench",
+                             git(path, "hash-object", "-t", "tree", "-w", "--stdin", input=""))
+                counter = iter(range(repeat))
+
+                def setup():
+                    run = next(counter)
+                    return (open_repo(), [name + "/{}".format(run) for name in names], target)
+
+                report("  " + label, best_of(repeat, setup, func))
+
+    packed = min(count, 2000)
+    print("{} packed refs".format(packed))
+    for label, func in (("git_reference_delete per ref", delete_each),
+                        ("RefBatch.delete", delete_batch)):
+        with scratch_repo() as (path, open_repo):
+            target = git(path, "commit-tree", "-m", "bench",
+                         git(path, "hash-object", "-t", "tree", "-w", "--stdin", input=""))
+
+            def setup():
+                git(path, "update-ref", "--stdin",
+                    input="".join("create {} {}\n".format(name, target)
+                                  for name in names[:packed]))
+                git(path, "pack-refs", "--all")
+                return (open_repo(), names[:packed])
+
+            report("  " + label, best_of(repeat, setup, func))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,70 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+# status_scan_workdir against git_status_list_new.
+#
+# The working directory has `count` files spread over directories of 100,
+# a few of them modified and a few untracked.  Every measurement is the
+# best of `repeat` runs on the same repository, each one with a new
+# repository handle.
+#
+# usage: python benchmarks/bench_status_scan.py [number of files [repeat]]
+
+import os
+import sys
+import ctypes as ct
+
+import libgit2
+
+from benchutil import git, scratch_repo, best_of, report
+
+
+def status_list(repo):
+    opts = libgit2.git_status_options()
+    libgit2.git_status_options_init(ct.byref(opts), libgit2.GIT_STATUS_OPTIONS_VERSION)
+    opts.flags = (libgit2.GIT_STATUS_OPT_INCLUDE_UNTRACKED |
+                  libgit2.GIT_STATUS_OPT_RECURSE_UNTRACKED_DIRS)
+    statuses = ct.POINTER(libgit2.git_status_list)()
+    assert libgit2.git_status_list_new(ct.byref(statuses), repo, ct.byref(opts)) == 0
+    count = libgit2.git_status_list_entrycount(statuses)
+    libgit2.git_status_list_free(statuses)
+    return count
+
+
+def scan_serial(repo):
+    return len(libgit2.status_scan_workdir(repo, workers=1))
+
+
+def scan_parallel(repo):
+    return len(libgit2.status_scan_workdir(repo))
+
+
+def main(count=20000, repeat=5):
+    with scratch_repo() as (path, open_repo):
+        for i in range(count):
+            name = os.path.join(path, "d{}".format(i // 100), "f{}.txt".format(i))
+            os.makedirs(os.path.dirname(name), exist_ok=True)
+            with open(name, "w") as f:
+                f.write("{}\n".format(i))
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", "bench")
+        for i in range(0, count, count // 10):
+            with open(os.path.join(path, "d{}".format(i // 100), "f{}.txt".format(i)),
+                      "a") as f:
+                f.write("changed\n")
+            with open(os.path.join(path, "d{}".format(i // 100), "new{}".format(i)),
+                      "w") as f:
+                f.write("new\n")
+
+        print("{} files, {} cpus".format(count, os.cpu_count()))
+        expected = status_list(open_repo())
+        for label, func in (("git_status_list_new", status_list),
+                            ("status_scan_workdir (workers=1)", scan_serial),
+                            ("status_scan_workdir", scan_parallel)):
+            assert func(open_repo()) == expected
+            report("  " + label, best_of(repeat, lambda: (open_repo(),), func))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import ctypes as ct
+from contextlib import contextmanager
+
+import libgit2
+
+GIT_ENV = dict(os.environ,
+               GIT_AUTHOR_NAME="Bench",    GIT_AUTHOR_EMAIL="bench@example.com",
+               GIT_COMMITTER_NAME="Bench", GIT_COMMITTER_EMAIL="bench@example.com",
+               GIT_CONFIG_NOSYSTEM="1")
+
+
+def git(path, *args, input=None):
+    return subprocess.run(("git",) + args, cwd=path, env=GIT_ENV, input=input,
+                          capture_output=True, text=True, check=True).stdout.rstrip("\n")
+
+
+@contextmanager
+def scratch_repo(*init_args):
+    # The path of a new repository (made with the git CLI) and a function
+    # opening a libgit2 handle on it (all freed on exit).
+    libgit2.git_libgit2_init()
+    tmpdir = tempfile.mkdtemp(prefix="libgit2-bench-")
+    path = os.path.join(tmpdir, "repo")
+    git(tmpdir, "init", "-q", "-b", "main", *init_args, path)
+    handles = []
+
+    def open_repo():
+        repo = ct.POINTER(libgit2.git_repository)()
+        if libgit2.git_repository_open(ct.byref(repo), os.fsencode(path)) < 0:
+            raise RuntimeError("cannot open " + path)
+        handles.append(repo)
+        return repo
+
+    try:
+        yield path, open_repo
+    finally:
+        for repo in handles:
+            libgit2.git_repository_free(repo)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        libgit2.git_libgit2_shutdown()
+
+
+def best_of(repeat, setup, func):
+    # The best time of `repeat` runs of `func(*setup())`.
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(label, seconds):
+    print("{:<48} {:8.3f}s".format(label, seconds))
@@ -7,13 +7,34 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+from collections import namedtuple as _namedtuple
+
 from .common import *  # noqa
+from .oid    import git_oid
+from .oid    import _git_oid
+from .types  import git_object
+from .types  import GIT_OBJECT_ANY, GIT_OBJECT_TREE, GIT_OBJECT_COMMIT
+from .types  import git_odb
+from .types  import git_odb_object
+from .types  import git_odb_backend
 from .types  import git_repository
 from .diff   import git_diff
 from .diff   import git_diff_delta
 from .diff   import git_diff_hunk
 from .types  import git_index
 from .types  import git_tree
+from .errors import GitError, _git_check
+from .object import git_object_lookup, git_object_peel, git_object_free
+from .tree   import git_tree_lookup, git_tree_free, git_tree_id, git_tree_entrycount
+from .tree   import git_tree_entry_byindex, git_tree_entry_id, git_tree_entry_type
+from .index  import git_index_write_tree_to, git_index_free
+from .odb    import git_odb_free, git_odb_exists, git_odb_read, git_odb_write
+from .odb    import git_odb_add_backend, git_odb_object_free, git_odb_object_data
+from .odb    import git_odb_object_size, git_odb_object_type
+from .repository import git_repository_path, git_repository_open
+from .repository import git_repository_free, git_repository_odb
+from .sys.mempack import git_mempack_new as _git_mempack_new
+from .sys.mempack import git_mempack_reset as _git_mempack_reset
 
 # @file git2/apply.h
 # @brief Git patch application routines
@@ -165,3 +186,213 @@ git_apply = CFUNC(ct.c_int,
     (1, "options"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Result of `apply_batch`: the id (hex str) of the final tree, the ids of
+# the trees written at the checkpoints and the errors (`GitError`) of the
+# patches that did not apply, keyed by their position in the batch.
+#
+ApplyBatchResult = _namedtuple("ApplyBatchResult", ["tree", "checkpoints", "errors"])
+
+# Apply many diffs one after another on top of a tree, in memory.
+#
+# Each diff is applied with `git_apply_to_tree` to the postimage of the
+# previous one.  The intermediate trees and blobs are written to an
+# in-memory object store (a mempack backend on a private repository
+# handle), so nothing reaches the object database of `repo` until a
+# checkpoint: then only the objects of the current tree that are missing
+# there are copied, and the in-memory store is emptied.  No index file is
+# ever written.
+#
+# A diff that does not apply (e.g. GIT_EAPPLYFAIL) is recorded in `errors`
+# and skipped; the next one is applied to the same preimage.
+#
+# Call `checkpoint()` (or close the batch with `close()`/`with`) to make
+# the current tree persistent; trees not checkpointed are discarded.
+#
+# @param repo the repository
+# @param tree id of the tree (or of a commit or tag, peeled) to start from
+# @param checkpoint write the current tree every `checkpoint` applied
+#                   patches (None: only at the end)
+# @param options the options for the apply (or None for defaults)
+#
+class ApplyBatch:
+
+    _repo   = None
+    _result = None
+
+    def __init__(self, repo, tree, checkpoint=None, options=None):
+        self.checkpoint_every = checkpoint
+        self.options = options
+        self.checkpoints = []
+        self.errors = {}
+        self._count   = 0
+        self._pending = 0
+        self._odb = ct.POINTER(git_odb)()
+        _git_check(git_repository_odb(ct.byref(self._odb), repo))
+        self._repo = ct.POINTER(git_repository)()
+        self._scratch_odb = ct.POINTER(git_odb)()
+        self._mempack = ct.POINTER(git_odb_backend)()
+        try:
+            _git_check(git_repository_open(ct.byref(self._repo),
+                                           git_repository_path(repo)))
+            _git_check(git_repository_odb(ct.byref(self._scratch_odb), self._repo))
+            _git_check(_git_mempack_new(ct.byref(self._mempack)))
+            # The odb takes the ownership of the backend.
+            _git_check(git_odb_add_backend(self._scratch_odb, self._mempack, 1000))
+            obj = ct.POINTER(git_object)()
+            _git_check(git_object_lookup(ct.byref(obj), self._repo,
+                                         ct.byref(_git_oid(tree)), GIT_OBJECT_ANY))
+            try:
+                peeled = ct.POINTER(git_object)()
+                _git_check(git_object_peel(ct.byref(peeled), obj, GIT_OBJECT_TREE))
+            finally:
+                git_object_free(obj)
+            self._tree = ct.cast(peeled, ct.POINTER(git_tree))
+        except BaseException:
+            self._free()
+            raise
+
+    def __del__(self):
+        self._free()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self._free()
+
+    # Id (hex str) of the current tree, which may exist only in memory.
+    @property
+    def tree(self):
+        return bytes(git_tree_id(self._tree).contents.id).hex()
+
+    # Number of diffs applied (not counting the failed ones).
+    @property
+    def applied(self):
+        return self._count
+
+    # Apply `diff` to the current tree.
+    #
+    # @return None, or the `GitError` if the diff did not apply
+    #
+    def apply(self, diff):
+        position = self._count + len(self.errors)
+        index = ct.POINTER(git_index)()
+        try:
+            _git_check(git_apply_to_tree(ct.byref(index), self._repo, self._tree, diff,
+                                         None if self.options is None
+                                         else ct.byref(self.options)))
+            oid = git_oid()
+            _git_check(git_index_write_tree_to(ct.byref(oid), index, self._repo))
+            tree = ct.POINTER(git_tree)()
+            _git_check(git_tree_lookup(ct.byref(tree), self._repo, ct.byref(oid)))
+        except GitError as exc:
+            self.errors[position] = exc
+            return exc
+        finally:
+            git_index_free(index)
+        git_tree_free(self._tree)
+        self._tree = tree
+        self._count   += 1
+        self._pending += 1
+        if self.checkpoint_every and self._pending >= self.checkpoint_every:
+            self.checkpoint()
+        return None
+
+    # Make the current tree (and the objects it needs) persistent in the
+    # object database of the repository.
+    #
+    # @return the id (hex str) of the tree
+    #
+    def checkpoint(self):
+        tree = self.tree
+        if self._pending or not self.checkpoints:
+            self._persist(self._tree)
+            _git_check(_git_mempack_reset(self._mempack))
+            self.checkpoints.append(tree)
+            self._pending = 0
+        return tree
+
+    # Checkpoint the current tree and release the resources.
+    #
+    # @return the `ApplyBatchResult`
+    #
+    def close(self):
+        if self._result is None:
+            try:
+                tree = self.checkpoint()
+            finally:
+                self._free()
+            self._result = ApplyBatchResult(tree, self.checkpoints, self.errors)
+        return self._result
+
+    def _persist(self, tree):
+        # Copy the objects missing from the odb of the repository, depth
+        # first; a tree which is already there has all its entries too.
+        for idx in range(git_tree_entrycount(tree)):
+            entry = git_tree_entry_byindex(tree, idx)
+            oid = git_tree_entry_id(entry)
+            kind = git_tree_entry_type(entry)
+            if kind == GIT_OBJECT_COMMIT or git_odb_exists(self._odb, oid):
+                continue
+            if kind == GIT_OBJECT_TREE:
+                subtree = ct.POINTER(git_tree)()
+                _git_check(git_tree_lookup(ct.byref(subtree), self._repo, oid))
+                try:
+                    self._persist(subtree)
+                finally:
+                    git_tree_free(subtree)
+            else:
+                self._copy(oid)
+        oid = git_tree_id(tree)
+        if not git_odb_exists(self._odb, oid):
+            self._copy(oid)
+
+    def _copy(self, oid):
+        obj = ct.POINTER(git_odb_object)()
+        _git_check(git_odb_read(ct.byref(obj), self._scratch_odb, oid))
+        try:
+            _git_check(git_odb_write(ct.byref(git_oid()), self._odb,
+                                     git_odb_object_data(obj), git_odb_object_size(obj),
+                                     git_odb_object_type(obj)))
+        finally:
+            git_odb_object_free(obj)
+
+    def _free(self):
+        if self._repo is None: return
+        if getattr(self, "_tree", None):
+            git_tree_free(self._tree)
+        self._tree = None
+        git_odb_free(self._scratch_odb)
+        if self._repo:
+            git_repository_free(self._repo)
+        git_odb_free(self._odb)
+        self._repo = None
+
+# Apply many diffs one after another on top of a tree, in memory, writing
+# the trees only at the end and every `checkpoint` applied patches.
+#
+# @see ApplyBatch
+#
+# @param repo the repository
+# @param tree id of the tree (or of a commit or tag, peeled) to start from
+# @param diffs iterable of `git_diff` pointers
+# @param checkpoint write the current tree every `checkpoint` applied
+#                   patches (None: only at the end)
+# @param options the options for the apply (or None for defaults)
+# @return the `ApplyBatchResult`
+#
+def apply_batch(repo, tree, diffs, checkpoint=None, options=None):
+    batch = ApplyBatch(repo, tree, checkpoint, options)
+    try:
+        for diff in diffs:
+            batch.apply(diff)
+    except BaseException:
+        batch._free()
+        raise
+    return batch.close()
@@ -7,10 +7,44 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+import array as _array
+import bisect as _bisect
+import itertools as _itertools
+from collections import namedtuple as _namedtuple
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED as _FIRST_COMPLETED
+from concurrent.futures import wait as _wait
+
 from .common import *  # noqa
 from .oid    import git_oid
 from .types  import git_signature
 from .types  import git_repository
+from .types  import git_commit
+from .types  import git_tree
+from .types  import git_tree_entry
+from .types  import git_blob
+from .types  import git_revwalk
+from .errors import GitError, _git_check
+from .oid    import _git_oid
+from .refs   import git_reference_name_to_id
+from .commit import git_commit_lookup, git_commit_free, git_commit_tree
+from .commit import git_commit_author, git_commit_parentcount, git_commit_parent_id
+from .tree   import git_tree_free, git_tree_entry_bypath, git_tree_entry_free
+from .tree   import git_tree_entry_id
+from .blob   import git_blob_lookup, git_blob_free
+from .graph  import git_graph_descendant_of
+from .revwalk import git_revwalk_new, git_revwalk_free, git_revwalk_push
+from .revwalk import git_revwalk_hide, git_revwalk_next, git_revwalk_sorting
+from .revwalk import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE
+from .revwalk import _path_history
+from .diff   import git_diff_options, git_diff_options_init, GIT_DIFF_OPTIONS_VERSION
+from .diff   import GIT_DIFF_FLAG_BINARY
+from .patch  import git_patch, git_patch_from_blobs, git_patch_free
+from .patch  import git_patch_get_delta, git_patch_num_hunks, git_patch_get_hunk
+from .diff   import git_diff_hunk
+from .repository import _git_repository_handles
 
 # @file git2/blame.h
 # @brief Git blame routines
@@ -280,3 +314,503 @@ git_blame_free = CFUNC(None,
     (1, "blame"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Commit a blame hunk is attributed to: its id (hex str) and the name,
+# e-mail, time and time offset of its (final) signature.
+#
+BlameCommit = _namedtuple("BlameCommit", ("id", "name", "email", "time", "offset"))
+
+# One hunk of a `BlameResult` (line numbers are 1-based).
+#
+BlameHunk = _namedtuple("BlameHunk", ("final_start_line_number", "lines_in_hunk",
+                                      "commit", "orig_path", "orig_start_line_number",
+                                      "boundary"))
+
+# Blame of a file as compact arrays.
+#
+# The hunks are stored column-wise: `final_start`, `lines_in_hunk`,
+# `orig_start` and `commit_index` are `array.array`s, `boundary` a byte
+# array and `orig_paths` a list of str; `commit_index` refers to the
+# `commits` table of `BlameCommit`s, which holds each attributed commit
+# only once.  `commit_id` is the (hex) id of the blamed commit.
+#
+class BlameResult:
+
+    __slots__ = ("path", "commit_id", "final_start", "lines_in_hunk", "orig_start",
+                 "commit_index", "boundary", "orig_paths", "commits")
+
+    def __init__(self, path, commit_id):
+        self.path          = path
+        self.commit_id     = commit_id
+        self.final_start   = _array.array("Q")
+        self.lines_in_hunk = _array.array("Q")
+        self.orig_start    = _array.array("Q")
+        self.commit_index  = _array.array("I")
+        self.boundary      = _array.array("B")
+        self.orig_paths    = []
+        self.commits       = []
+
+    # Number of hunks.
+    def __len__(self):
+        return len(self.final_start)
+
+    def __getitem__(self, idx):
+        return BlameHunk(self.final_start[idx], self.lines_in_hunk[idx],
+                         self.commits[self.commit_index[idx]], self.orig_paths[idx],
+                         self.orig_start[idx], bool(self.boundary[idx]))
+
+    # Number of blamed lines.
+    @property
+    def num_lines(self):
+        return sum(self.lines_in_hunk)
+
+    # Index of the hunk containing line `lineno` (1-based), or -1.
+    def hunk_index_byline(self, lineno):
+        idx = _bisect.bisect_right(self.final_start, lineno) - 1
+        if idx < 0 or lineno >= self.final_start[idx] + self.lines_in_hunk[idx]:
+            return -1
+        return idx
+
+    # The hunk containing line `lineno` (1-based), or None.
+    def hunk_byline(self, lineno):
+        idx = self.hunk_index_byline(lineno)
+        return self[idx] if idx >= 0 else None
+
+    def _append(self, final_start, lines, commit_idx, orig_path, orig_start, boundary):
+        self.final_start.append(final_start)
+        self.lines_in_hunk.append(lines)
+        self.commit_index.append(commit_idx)
+        self.orig_paths.append(orig_path)
+        self.orig_start.append(orig_start)
+        self.boundary.append(boundary)
+
+    @classmethod
+    def _from_blame(cls, blame, path, commit_id):
+        result  = cls(path, commit_id)
+        commits = {}
+        for idx in range(git_blame_get_hunk_count(blame)):
+            hunk = git_blame_get_hunk_byindex(blame, idx).contents
+            key  = bytes(hunk.final_commit_id.id)
+            commit_idx = commits.get(key)
+            if commit_idx is None:
+                commit_idx = commits[key] = len(result.commits)
+                result.commits.append(_blame_commit(key, hunk.final_signature))
+            result._append(hunk.final_start_line_number, hunk.lines_in_hunk, commit_idx,
+                           os.fsdecode(hunk.orig_path) if hunk.orig_path else path,
+                           hunk.orig_start_line_number, 1 if hunk.boundary else 0)
+        return result
+
+    def _line_origins(self):
+        # Per-line (commit_idx, orig_path, orig_line, boundary) tuples.
+        lines = []
+        for idx in range(len(self.final_start)):
+            commit_idx, orig_path = self.commit_index[idx], self.orig_paths[idx]
+            orig_start, boundary  = self.orig_start[idx], self.boundary[idx]
+            lines.extend((commit_idx, orig_path, orig_start + i, boundary)
+                         for i in range(self.lines_in_hunk[idx]))
+        return lines
+
+    @classmethod
+    def _from_line_origins(cls, path, commit_id, commits, lines):
+        # Group consecutive lines of the same origin into hunks.
+        result = cls(path, commit_id)
+        result.commits = list(commits)
+        start = 0
+        for lineno in range(1, len(lines) + 1):
+            if (lineno < len(lines)
+                and lines[lineno][0] == lines[start][0]
+                and lines[lineno][1] == lines[start][1]
+                and lines[lineno][2] == lines[start][2] + (lineno - start)
+                and lines[lineno][3] == lines[start][3]):  # noqa: E129
+                continue
+            commit_idx, orig_path, orig_line, boundary = lines[start]
+            result._append(start + 1, lineno - start, commit_idx, orig_path,
+                           orig_line, boundary)
+            start = lineno
+        return result
+
+def _blame_commit(key, signature):
+    if not signature:
+        return BlameCommit(key.hex(), None, None, 0, 0)
+    sig = signature.contents
+    return BlameCommit(key.hex(),
+                       sig.name.decode("utf-8", "replace") if sig.name else None,
+                       sig.email.decode("utf-8", "replace") if sig.email else None,
+                       sig.when.time, sig.when.offset)
+
+# Blame a file into a `BlameResult`.
+#
+# @param repo repository whose history is to be walked
+# @param path path to file to consider
+# @param options options for the blame operation or None
+# @return `BlameResult`
+#
+def blame_file(repo, path, options=None):
+    blame = ct.POINTER(git_blame)()
+    _git_check(git_blame_file(ct.byref(blame), repo, os.fsencode(path),
+                              ct.byref(options) if options is not None else None))
+    try:
+        commit_id = (bytes(options.newest_commit.id).hex()
+                     if options is not None and any(options.newest_commit.id) else None)
+        return BlameResult._from_blame(blame, os.fsdecode(path), commit_id)
+    finally:
+        git_blame_free(blame)
+
+# Blame service with result caching and incremental re-blame.
+#
+# Results of `blame()` are cached, keyed by the path, the blamed commit OID
+# and the blame options.  A blame of a commit that is not in the cache but
+# descends from a cached blame of the same file, through a linear history
+# in which the file changed in at most `max_incremental` commits, is derived
+# from the cached one: the lines changed by each of those commits (found by
+# diffing the consecutive blobs, as `git_blame_buffer` does) are attributed
+# to it and all other lines keep their attribution.  Anything else (merges,
+# renames, copy tracking, mailmap, whitespace or line range options) is
+# blamed from scratch with `git_blame_file`.
+#
+# The service is thread-safe; every blame is computed on a private
+# repository handle of the calling thread.
+#
+# @param repo the repository
+# @param max_entries maximum number of cached results (LRU)
+# @param max_incremental maximum number of changes of the file for an
+#                        incremental re-blame
+# @param max_walk maximum number of commits walked to find them
+# @param history_index a `PathHistoryIndex` of the repository to take the
+#                      path histories from (they are computed by walking
+#                      the history otherwise, as they are for commits it
+#                      does not index)
+#
+class BlameService:
+
+    def __init__(self, repo, max_entries=256, max_incremental=16, max_walk=1000,
+                 history_index=None):
+        self.history_index   = history_index
+        self.max_entries     = max_entries
+        self.max_incremental = max_incremental
+        self.max_walk        = max_walk
+        self.stats   = dict(hits=0, misses=0, incremental=0)
+        self._repo   = repo
+        self._cache  = _OrderedDict()
+        self._histories = _OrderedDict()
+        self._lock   = _threading.Lock()
+        self._handles = _git_repository_handles(repo)
+
+    # Blame `path` at `commit` (an OID as `git_oid`, hex str or raw bytes;
+    # HEAD if None) with `options` (a `git_blame_options`, or None).
+    #
+    # @return `BlameResult`
+    #
+    def blame(self, path, commit=None, options=None):
+        repo = self._handles.get()
+        path = os.fsdecode(path)
+        if commit is None:
+            oid = git_oid()
+            _git_check(git_reference_name_to_id(ct.byref(oid), repo, b"HEAD"))
+        else:
+            oid = _git_oid(commit)
+        commit_key = bytes(oid.id)
+        opts_key   = _blame_options_key(options)
+        key = (path, commit_key, opts_key)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return result
+            bases = [base_commit for (base_path, base_commit, base_opts) in reversed(self._cache)
+                     if base_path == path and base_opts == opts_key]
+        result = None
+        if opts_key == _blame_options_key(None):
+            for base_commit in bases:
+                with self._lock:
+                    base = self._cache.get((path, base_commit, opts_key))
+                if base is None:
+                    continue
+                result = self._reblame(repo, base, base_commit, commit_key)
+                if result is not None:
+                    break
+        with self._lock:
+            self.stats["incremental" if result is not None else "misses"] += 1
+        if result is None:
+            if options is not None:
+                opts = git_blame_options.from_buffer_copy(options)
+            else:
+                opts = git_blame_options()
+                _git_check(git_blame_options_init(ct.byref(opts), GIT_BLAME_OPTIONS_VERSION))
+            opts.newest_commit = oid
+            result = blame_file(repo, path, opts)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    # Blame lines `start` to `end` (1-based, inclusive) of `path` at
+    # `commit` (HEAD if None).
+    #
+    # The blame is bounded by `min_line`/`max_line`.  Without `since`
+    # (a commit at which to stop, as `oldest_commit`) the history of the
+    # path is used to bound the walk as well: the blame is first stopped at
+    # the 2nd most recent commit that touched the path, then the 4th, 8th,
+    # ... until the requested lines are all accounted for by newer commits
+    # (no boundary hunks).  The path histories come from the
+    # `history_index` of the service, or are computed once and cached.
+    #
+    # @return `BlameResult` of the requested lines
+    #
+    def blame_lines(self, path, start, end, since=None, commit=None):
+        repo = self._handles.get()
+        path = os.fsdecode(path)
+        if commit is None:
+            oid = git_oid()
+            _git_check(git_reference_name_to_id(ct.byref(oid), repo, b"HEAD"))
+        else:
+            oid = _git_oid(commit)
+        commit_key = bytes(oid.id)
+        since_key  = bytes(_git_oid(since).id) if since is not None else b""
+        key = (path, commit_key, ("lines", start, end, since_key))
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return result
+            self.stats["misses"] += 1
+        opts = git_blame_options()
+        _git_check(git_blame_options_init(ct.byref(opts), GIT_BLAME_OPTIONS_VERSION))
+        opts.newest_commit = oid
+        opts.min_line, opts.max_line = start, end
+        if since is not None:
+            opts.oldest_commit = _git_oid(since)
+            result = blame_file(repo, path, opts)
+        else:
+            history = self._history(repo, path, commit_key)
+            depth = 1
+            while depth < len(history) - 1:
+                opts.oldest_commit = _git_oid(history[depth])
+                result = blame_file(repo, path, opts)
+                if not any(result.boundary):
+                    break
+                depth *= 2
+            else:
+                opts.oldest_commit = git_oid()
+                result = blame_file(repo, path, opts)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    # Drop all cached results.
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._histories.clear()
+
+    # Free the repository handles of the service.
+    def close(self):
+        self.clear()
+        self._handles.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _history(self, repo, path, commit_key):
+        # Commits (raw ids, newest first) that touched `path`, up to
+        # `commit_key`.
+        if self.history_index is not None:
+            history = self.history_index._history(os.fsencode(path), commit_key)
+            if history is not None:
+                return history
+        key = (path, commit_key)
+        with self._lock:
+            history = self._histories.get(key)
+        if history is None:
+            history = _path_history(repo, os.fsencode(path), commit_key)
+            with self._lock:
+                self._histories[key] = history
+                while len(self._histories) > self.max_entries:
+                    self._histories.popitem(last=False)
+        return history
+
+    def _reblame(self, repo, base, base_commit, commit_key):
+        # Derive the blame of `commit_key` from the `base` blame of its
+        # ancestor `base_commit`; None if not possible.
+        if git_graph_descendant_of(repo, ct.byref(_git_oid(commit_key)),
+                                   ct.byref(_git_oid(base_commit))) != 1:
+            return None
+        changes = _blame_path_changes(repo, base.path, base_commit, commit_key,
+                                      self.max_walk, self.max_incremental)
+        if changes is None:
+            return None
+        commits = list(base.commits)
+        lines   = base._line_origins()
+        for old_blob, new_blob, commit in changes:
+            hunks = _blame_blob_hunks(repo, old_blob, new_blob, base.path)
+            if hunks is None:
+                return None
+            commit_idx = len(commits)
+            commits.append(commit)
+            new_lines, prev = [], 0
+            for old_start, old_lines, new_start, new_lines_count in hunks:
+                # With no context, a pure insertion is reported after old_start.
+                old_from = old_start - 1 if old_lines else old_start
+                new_lines.extend(lines[prev:old_from])
+                new_lines.extend((commit_idx, base.path, new_start + i, 0)
+                                 for i in range(new_lines_count))
+                prev = old_from + old_lines
+            new_lines.extend(lines[prev:])
+            lines = new_lines
+        used = sorted({line[0] for line in lines})
+        remap = {old: new for new, old in enumerate(used)}
+        return BlameResult._from_line_origins(
+            base.path, commit_key.hex(), [commits[idx] for idx in used],
+            [(remap[line[0]],) + line[1:] for line in lines])
+
+def _blame_options_key(options):
+    if options is None:
+        return (GIT_BLAME_NORMAL, 0, b"", 0, 0)
+    return (options.flags, options.min_match_characters,
+            bytes(options.oldest_commit.id).strip(b"\0"),
+            options.min_line, options.max_line)
+
+def _blame_blob_id(repo, commit, path):
+    # Blob id (raw bytes) of `path` in `commit`, or None.
+    tree = ct.POINTER(git_tree)()
+    _git_check(git_commit_tree(ct.byref(tree), commit))
+    try:
+        entry = ct.POINTER(git_tree_entry)()
+        if git_tree_entry_bypath(ct.byref(entry), tree, os.fsencode(path)) < 0:
+            return None
+        try:
+            return bytes(git_tree_entry_id(entry).contents.id)
+        finally:
+            git_tree_entry_free(entry)
+    finally:
+        git_tree_free(tree)
+
+def _blame_path_changes(repo, path, base_commit, commit_key, max_walk, max_changes):
+    # The (old_blob, new_blob, BlameCommit) changes of `path` on the linear
+    # history from `base_commit` (exclusive) to `commit_key`; None if the
+    # history is not linear or too long.
+    walk = ct.POINTER(git_revwalk)()
+    _git_check(git_revwalk_new(ct.byref(walk), repo))
+    try:
+        _git_check(git_revwalk_sorting(walk, GIT_SORT_TOPOLOGICAL | GIT_SORT_REVERSE))
+        _git_check(git_revwalk_push(walk, ct.byref(_git_oid(commit_key))))
+        _git_check(git_revwalk_hide(walk, ct.byref(_git_oid(base_commit))))
+        oids = []
+        oid  = git_oid()
+        while git_revwalk_next(ct.byref(oid), walk) == 0:
+            oids.append(bytes(oid.id))
+            if len(oids) > max_walk:
+                return None
+    finally:
+        git_revwalk_free(walk)
+    changes = []
+    prev_commit, prev_blob = base_commit, None
+    commit = ct.POINTER(git_commit)()
+    _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(_git_oid(base_commit))))
+    try:
+        prev_blob = _blame_blob_id(repo, commit, path)
+    finally:
+        git_commit_free(commit)
+    if prev_blob is None:
+        return None
+    for key in oids:
+        _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(_git_oid(key))))
+        try:
+            if git_commit_parentcount(commit) != 1:
+                return None
+            if bytes(git_commit_parent_id(commit, 0).contents.id) != prev_commit:
+                return None
+            blob = _blame_blob_id(repo, commit, path)
+            if blob is None:
+                return None
+            if blob != prev_blob:
+                if len(changes) == max_changes:
+                    return None
+                changes.append((prev_blob, blob,
+                                _blame_commit(key, git_commit_author(commit))))
+        finally:
+            git_commit_free(commit)
+        prev_commit, prev_blob = key, blob
+    return changes
+
+def _blame_blob_hunks(repo, old_blob_id, new_blob_id, path):
+    # (old_start, old_lines, new_start, new_lines) of the context-free diff
+    # of two blobs; None for binary content.
+    old_blob, new_blob = ct.POINTER(git_blob)(), ct.POINTER(git_blob)()
+    patch = ct.POINTER(git_patch)()
+    try:
+        _git_check(git_blob_lookup(ct.byref(old_blob), repo, ct.byref(_git_oid(old_blob_id))))
+        _git_check(git_blob_lookup(ct.byref(new_blob), repo, ct.byref(_git_oid(new_blob_id))))
+        opts = git_diff_options()
+        _git_check(git_diff_options_init(ct.byref(opts), GIT_DIFF_OPTIONS_VERSION))
+        opts.context_lines = opts.interhunk_lines = 0
+        bpath = os.fsencode(path)
+        _git_check(git_patch_from_blobs(ct.byref(patch), old_blob, bpath,
+                                        new_blob, bpath, ct.byref(opts)))
+        if not patch:
+            return []
+        if git_patch_get_delta(patch).contents.flags & GIT_DIFF_FLAG_BINARY:
+            return None
+        hunks = []
+        hunk  = ct.POINTER(git_diff_hunk)()
+        num_lines = ct.c_size_t()
+        for idx in range(git_patch_num_hunks(patch)):
+            _git_check(git_patch_get_hunk(ct.byref(hunk), ct.byref(num_lines), patch, idx))
+            h = hunk.contents
+            hunks.append((h.old_start, h.old_lines, h.new_start, h.new_lines))
+        return hunks
+    finally:
+        git_patch_free(patch)
+        git_blob_free(new_blob)
+        git_blob_free(old_blob)
+
+# Blame many files in parallel.
+#
+# `git_blame_file` is run for every path on a pool of `workers` threads,
+# each thread using its own repository handle.  All fields of `options`
+# (e.g. `min_line`/`max_line`, `newest_commit` or the
+# `GIT_BLAME_USE_MAILMAP` flag) apply to every file.  At most `2 * workers`
+# files are queued at a time, and the results are yielded as soon as each
+# file completes, so in no particular order.
+#
+# @param repo the repository
+# @param paths iterable of paths to blame
+# @param workers number of threads; defaults to `os.cpu_count()`
+# @param options options for the blame operations or None
+# @return generator of `(path, result)` tuples, where `result` is the
+#         `BlameResult` of the path or the `GitError` raised for it
+#
+def blame_many(repo, paths, workers=None, options=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with _git_repository_handles(repo) as handles:
+
+        def blame_one(path):
+            opts = (git_blame_options.from_buffer_copy(options)
+                    if options is not None else None)
+            try:
+                return path, blame_file(handles.get(), path, opts)
+            except GitError as exc:
+                return path, exc
+
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = iter(paths)
+            pending = {executor.submit(blame_one, path)
+                       for path in _itertools.islice(paths, 2 * workers)}
+            while pending:
+                done, pending = _wait(pending, return_when=_FIRST_COMPLETED)
+                pending.update(executor.submit(blame_one, path)
+                               for path in _itertools.islice(paths, len(done)))
+                for future in done:
+                    yield future.result()
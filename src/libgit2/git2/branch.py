@@ -7,13 +7,24 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+from collections import namedtuple as _namedtuple
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common import *  # noqa
-from .buffer import git_buf
+from .buffer import git_buf, git_buf_dispose
+from .oid    import _git_oid
 from .types  import git_repository
 from .types  import git_branch_t
 from .types  import git_reference
 from .types  import git_annotated_commit
 from .types  import git_commit
+from .errors import _git_check
+from .errors import GIT_ENOTFOUND
+from .refs   import list_refs
+from .graph  import git_graph_ahead_behind
+from .repository import git_repository_path, git_repository_commondir
+from .repository import git_repository_is_bare
+from .repository import _git_repository_handles
 
 # @file git2/branch.h
 # @brief Git branch parsing routines
@@ -395,3 +406,105 @@ git_branch_name_is_valid = CFUNC(ct.c_int,
     (1, "name"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+
+BranchSummary = _namedtuple("BranchSummary", ("name", "target", "upstream",
+                           "upstream_target", "ahead", "behind",
+                           "is_head", "checked_out"))
+
+# Summarize the local branches of a repository in one pass.
+#
+# For each local branch this gives what `git_branch_name`,
+# `git_branch_upstream_name`, `git_graph_ahead_behind`, `git_branch_is_head`
+# and `git_branch_is_checked_out` would give for it.  The branches and the
+# remote-tracking branches are resolved in bulk (see `list_refs`), the HEAD
+# files are read directly and the ahead/behind counts of the distinct
+# (branch, upstream) pairs are computed in parallel.
+#
+# With a `cache` (any mutable mapping, e.g. a dict kept across calls), the
+# ahead/behind counts are memoized by the (local, upstream) OIDs pair.
+#
+# The `upstream` is the full name of the upstream reference (or None if the
+# branch has no upstream configured); `upstream_target`, `ahead` and
+# `behind` are None when there is no upstream or it does not exist.
+#
+# @param repo the repository
+# @param workers number of worker threads, defaults to `os.cpu_count()`
+# @param cache mapping of the ahead/behind counts
+# @return list of `BranchSummary`, sorted by the branch name
+#
+def branch_summary(repo, workers=None, cache=None):
+    if cache is None:
+        cache = {}
+    branches = list_refs(repo, "refs/heads/")
+    targets = {name: target for name, target, _ in branches}
+    targets.update((name, target) for name, target, _ in list_refs(repo, "refs/remotes/"))
+
+    upstreams = {}
+    buf = git_buf()
+    try:
+        for name in branches.names:
+            error = git_branch_upstream_name(ct.byref(buf), repo, name.encode("utf-8"))
+            if error == GIT_ENOTFOUND:
+                continue
+            _git_check(error)
+            upstreams[name] = ct.string_at(buf.ptr, buf.size).decode("utf-8")
+    finally:
+        git_buf_dispose(ct.byref(buf))
+
+    head = _branch_head(os.fsdecode(git_repository_path(repo)))
+    checked_out = set()
+    if not git_repository_is_bare(repo):
+        commondir = os.fsdecode(git_repository_commondir(repo))
+        checked_out.add(_branch_head(commondir))
+        try:
+            worktrees = os.listdir(os.path.join(commondir, "worktrees"))
+        except (FileNotFoundError, NotADirectoryError):
+            worktrees = []
+        for worktree in worktrees:
+            checked_out.add(_branch_head(os.path.join(commondir, "worktrees", worktree)))
+
+    pairs = {(targets[name], targets[upstream])
+             for name, upstream in upstreams.items() if upstream in targets}
+    missing = [pair for pair in pairs if pair not in cache]
+    if missing:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(missing)))
+        size = -(-len(missing) // workers)
+        chunks = [missing[start:start + size] for start in range(0, len(missing), size)]
+        with _git_repository_handles(repo) as handles, \
+             _ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk, counts in zip(chunks, executor.map(
+                    lambda chunk: [_branch_ahead_behind(handles.get(), pair)
+                                   for pair in chunk], chunks)):
+                for pair, count in zip(chunk, counts):
+                    cache[pair] = count
+
+    summary = []
+    for name, target, _ in branches:
+        upstream = upstreams.get(name)
+        upstream_target = targets.get(upstream)
+        ahead, behind = ((None, None) if upstream_target is None
+                         else cache[(target, upstream_target)])
+        summary.append(BranchSummary(name[len("refs/heads/"):], target,
+                                     upstream, upstream_target, ahead, behind,
+                                     name == head, name in checked_out))
+    return summary
+
+def _branch_head(gitdir):
+    # Name of the branch the HEAD of `gitdir` points at, or None.
+    try:
+        with open(os.path.join(gitdir, "HEAD"), "rb") as f:
+            content = f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not content.startswith(b"ref:"):
+        return None
+    return content[len(b"ref:"):].strip().decode("utf-8")
+
+def _branch_ahead_behind(repo, pair):
+    ahead, behind = ct.c_size_t(), ct.c_size_t()
+    _git_check(git_graph_ahead_behind(ct.byref(ahead), ct.byref(behind), repo,
+                                      ct.byref(_git_oid(pair[0])),
+                                      ct.byref(_git_oid(pair[1]))))
+    return (ahead.value, behind.value)
@@ -7,12 +7,19 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import time as _time
+import threading as _threading
+
 from .common import *  # noqa
-from .buffer import git_buf
+from .buffer import git_buf, git_buf_dispose
 from .types  import git_repository
 from .types  import git_config
 from .types  import git_config_backend
 from .types  import git_transaction
+from .errors import _git_check
+from .errors import GIT_ITEROVER
+from .repository import git_repository_config_snapshot
+from .repository import git_repository_path, git_repository_commondir
 
 # @file git2/config.h
 # @brief Git config management routines
@@ -972,3 +979,217 @@ git_config_lock = CFUNC(ct.c_int,
     (1, "cfg"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# A read-only view of the configuration of a repository, for repeated
+# lookups.
+#
+# All the entries of a snapshot of the configuration
+# (`git_repository_config_snapshot`) are loaded at once into a dict, by
+# normalized name, and their typed values (`git_config_parse_bool`,
+# `git_config_parse_int64`, `git_config_parse_path`) are parsed on first
+# use and kept.  Before a lookup, the view is loaded again if one of the
+# configuration files (of the repository, the global, xdg, system and
+# programdata ones found when loading, the included ones and
+# `$GIT_DIR/config.worktree`, for the libgit2 versions which read it)
+# was changed, created or removed.  The files are checked at most once
+# every `interval` seconds (0 to check them before each lookup, which
+# costs a stat() per file).
+#
+# @param repo the repository
+# @param interval minimum delay (seconds) between the checks of the files
+#
+class ConfigView:
+
+    def __init__(self, repo, interval=1.0):
+        self.repo     = repo
+        self.interval = interval
+        self._lock    = _threading.Lock()
+        self._checked = None
+        self._stamps  = None
+        self._entries = {}
+        self._parsed  = {}
+        self.refresh(force=True)
+
+    def __contains__(self, name):
+        return _config_name(name) in self._current()
+
+    # @return the value of the variable `name` (None for a variable without
+    #         value, e.g. "[core] bare"), as `git_config_get_string`; or
+    #         `default` if it is not set
+    #
+    def get(self, name, default=None):
+        values = self._current().get(_config_name(name))
+        return default if values is None else values[-1]
+
+    # @return the values of the multivar `name`, from the lowest priority
+    #         file to the highest (as `git config --get-all`)
+    #
+    def get_all(self, name):
+        return list(self._current().get(_config_name(name), ()))
+
+    # @return the value of `name` as a bool (`git_config_parse_bool`), or
+    #         `default` if it is not set
+    #
+    def get_bool(self, name, default=None):
+        return self._typed(name, default, _config_parse_bool)
+
+    # @return the value of `name` as an int (`git_config_parse_int64`, with
+    #         the k/m/g suffixes), or `default` if it is not set
+    #
+    def get_int(self, name, default=None):
+        return self._typed(name, default, _config_parse_int64)
+
+    # @return the value of `name` as a path (`git_config_parse_path`, with
+    #         the "~" expanded), or `default` if it is not set
+    #
+    def get_path(self, name, default=None):
+        return self._typed(name, default, _config_parse_path)
+
+    # @return the normalized names of the variables which are set
+    #
+    def names(self):
+        return list(self._current())
+
+    # Load the configuration again if one of its files changed (or if
+    # `force`).
+    #
+    # @return True if the configuration was loaded again
+    #
+    def refresh(self, force=False):
+        with self._lock:
+            self._checked = _time.monotonic()
+            if not force and all(_config_stamp(path) == stamp
+                                 for path, stamp in self._stamps):
+                return False
+            files = self._files()
+            stamps = [(path, _config_stamp(path)) for path in files.values()]
+            worktree = os.path.join(os.fsdecode(git_repository_path(self.repo)),
+                                    "config.worktree")
+            stamps.append((worktree, _config_stamp(worktree)))
+            entries, includes = _config_entries(self.repo, files)
+            stamps += [(path, _config_stamp(path)) for path in includes
+                       if path not in files.values()]
+            self._stamps = tuple(stamps)
+            self._entries = entries
+            self._parsed  = {}
+            return True
+
+    def _current(self):
+        if _time.monotonic() - self._checked >= self.interval:
+            self.refresh()
+        return self._entries
+
+    def _typed(self, name, default, parse):
+        name = _config_name(name)
+        entries = self._current()
+        key = (name, parse)
+        parsed = self._parsed
+        if key not in parsed:
+            values = entries.get(name)
+            if values is None:
+                return default
+            parsed[key] = parse(values[-1])
+        return parsed[key]
+
+    def _files(self):
+        # {level: path} of the files the configuration is read from.
+        files = {GIT_CONFIG_LEVEL_LOCAL:
+                 os.path.join(os.fsdecode(git_repository_commondir(self.repo)), "config")}
+        buf = git_buf()
+        try:
+            for level, find in ((GIT_CONFIG_LEVEL_GLOBAL,      git_config_find_global),
+                                (GIT_CONFIG_LEVEL_XDG,         git_config_find_xdg),
+                                (GIT_CONFIG_LEVEL_SYSTEM,      git_config_find_system),
+                                (GIT_CONFIG_LEVEL_PROGRAMDATA, git_config_find_programdata)):
+                if find(ct.byref(buf)) == 0:
+                    files[level] = os.fsdecode(ct.string_at(buf.ptr, buf.size))
+                git_buf_dispose(ct.byref(buf))
+        finally:
+            git_buf_dispose(ct.byref(buf))
+        return files
+
+def _config_name(name):
+    # The normalized form of a variable name, as libgit2 gives it: the
+    # section and the variable in lower case, the subsection as is.
+    section, _, rest = name.partition(".")
+    subsection, _, key = rest.rpartition(".")
+    if not subsection:
+        return section.lower() + "." + key.lower()
+    return section.lower() + "." + subsection + "." + key.lower()
+
+def _config_entries(repo, files):
+    # {normalized name: [values, lowest priority first]} of a snapshot of
+    # the configuration of `repo`, and the paths of the files included from
+    # the `files` ({level: path}).
+    config = ct.POINTER(git_config)()
+    _git_check(git_repository_config_snapshot(ct.byref(config), repo))
+    try:
+        iterator = ct.POINTER(git_config_iterator)()
+        _git_check(git_config_iterator_new(ct.byref(iterator), config))
+        try:
+            records = []
+            while True:
+                entry = ct.POINTER(git_config_entry)()
+                error = git_config_next(ct.byref(entry), iterator)
+                if error == GIT_ITEROVER:
+                    break
+                _git_check(error)
+                value = entry.contents.value
+                records.append((entry.contents.level, entry.contents.include_depth,
+                                entry.contents.name.decode("utf-8"),
+                                None if value is None else value.decode("utf-8")))
+        finally:
+            git_config_iterator_free(iterator)
+    finally:
+        git_config_free(config)
+    # The snapshot iterates from the highest priority file to the lowest,
+    # and the entries of a file in order, those of an included file right
+    # after the include (one level deeper).
+    records.sort(key=lambda record: record[0])
+    entries, includes = {}, []
+    containing, last_level = [], None
+    for level, depth, name, value in records:
+        entries.setdefault(name, []).append(value)
+        if level != last_level:
+            containing, last_level = [files.get(level)], level
+        del containing[depth + 1:]
+        if value and (name == "include.path" or (name.startswith("includeif.") and
+                                                 name.endswith(".path"))):
+            # Relative paths are relative to the file of the include.
+            path = _config_parse_path(value)
+            parent = containing[depth] if depth < len(containing) else None
+            if not os.path.isabs(path) and parent is not None:
+                path = os.path.join(os.path.dirname(parent), path)
+            includes.append(path)
+            containing.append(path)
+    return entries, includes
+
+def _config_stamp(path):
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _config_parse_bool(value):
+    out = ct.c_int()
+    _git_check(git_config_parse_bool(ct.byref(out), None if value is None
+                                     else value.encode("utf-8")))
+    return bool(out.value)
+
+def _config_parse_int64(value):
+    out = ct.c_int64()
+    _git_check(git_config_parse_int64(ct.byref(out), None if value is None
+                                      else value.encode("utf-8")))
+    return out.value
+
+def _config_parse_path(value):
+    buf = git_buf()
+    try:
+        _git_check(git_config_parse_path(ct.byref(buf), None if value is None
+                                         else value.encode("utf-8")))
+        return os.fsdecode(ct.string_at(buf.ptr, buf.size))
+    finally:
+        git_buf_dispose(ct.byref(buf))
@@ -9,8 +9,19 @@
 
 from .common import *  # noqa
 from .buffer import git_buf
+from .oid    import git_oid
+from .oid    import _git_oid
 from .types  import git_object
 from .types  import git_repository
+from .types  import git_commit
+from .types  import git_odb
+from .errors import GitError, _git_check
+from .errors import GIT_ENOTFOUND, GIT_EAMBIGUOUS
+from .commit import git_commit_lookup, git_commit_time, git_commit_free
+from .commit import git_commit_parentcount, git_commit_parent_id
+from .odb    import git_odb_exists_prefix, git_odb_free
+from .repository import git_repository_odb
+from .tag    import tag_catalog
 
 # @file git2/describe.h
 # @brief Git describing routines
@@ -199,3 +210,265 @@ git_describe_result_free = CFUNC(None,
     (1, "result"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Describe many commits, as `git_describe_commit` then `git_describe_format`
+# with the default options would: the nearest annotated tag, among the
+# first GIT_DESCRIBE_DEFAULT_MAX_CANDIDATES_TAGS ones met, as "<tag>" for a
+# tagged commit, else as "<tag>-<distance>-g<abbreviated id>".
+#
+# The tags are indexed once (see `tag_catalog`) and each commit of the
+# history is looked up once, its parents and commit time kept in integer
+# indexed columns shared by all the walks.  The walks are the ones libgit2
+# does (newest commit first, in the same order for the commits of the same
+# time), so that the choice between candidate tags and the distances are
+# the same; but a walk is only done from the merges and root commits, the
+# outcome for a commit with one parent following from the parent's one.
+#
+# @param repo the repository
+# @param commits iterable of the ids of the commits (as `git_oid`, hex str
+#                or raw bytes)
+# @return list of the descriptions (str, or the `GitError` raised for the
+#         commit, e.g. GIT_ENOTFOUND when no tag can describe it), in the
+#         order of `commits`
+#
+def describe_batch(repo, commits):
+    keys = [bytes(_git_oid(commit).id) for commit in commits]
+    tags = tag_catalog(repo)
+    # Names of the annotated tags by peeled id (of the latest tagger date
+    # when several point at the same commit), and the lightweight ones.
+    names, lightweight = {}, set()
+    size = tags.oid_size
+    for idx, name in enumerate(tags.names):
+        peeled = tags.peeled[idx * size:(idx + 1) * size]
+        if tags.summaries[idx] is None:
+            lightweight.add(peeled)
+            continue
+        entry = names.get(peeled)
+        if entry is None or entry[1] < tags.times[idx]:
+            names[peeled] = (name, tags.times[idx])
+    names = {peeled: entry[0] for peeled, entry in names.items()}
+    odb = ct.POINTER(git_odb)()
+    _git_check(git_repository_odb(ct.byref(odb), repo))
+    try:
+        graph = _DescribeGraph(repo, names, lightweight)
+        walks = {}
+        results = {}
+        for key in dict.fromkeys(keys):
+            try:
+                if not tags.names:
+                    raise GitError(GIT_ENOTFOUND, "cannot describe - no reference "
+                                   "found, cannot describe anything.")
+                name = names.get(key)
+                if name is None:
+                    name, depth, unannotated = _describe(graph, walks, graph.node(key))
+                    if name is None:
+                        raise GitError(GIT_ENOTFOUND,
+                            "cannot describe - no annotated tags can describe '{}'; "
+                            "however, there were unannotated tags.".format(key.hex())
+                            if unannotated else
+                            "cannot describe - no tags can describe '{}'.".format(key.hex()))
+                    name = "{}-{}-g{}".format(name, depth, _describe_abbrev(odb, key))
+                results[key] = name
+            except GitError as exc:
+                results[key] = exc
+    finally:
+        git_odb_free(odb)
+    return [results[key] for key in keys]
+
+class _DescribeGraph:
+
+    # Commits of the history met by the walks, by index: `ids`, commit
+    # `times`, `parents` (raw ids, then indices once walked through) and
+    # `tags` (name of the annotated tag, True for a lightweight one).
+
+    def __init__(self, repo, names, lightweight):
+        self.repo    = repo
+        self.names   = names
+        self.lightweight = lightweight
+        self.index   = {}
+        self.ids     = []
+        self.times   = []
+        self.parents = []
+        self.tags    = []
+
+    def node(self, oid):
+        idx = self.index.get(oid)
+        if idx is not None:
+            return idx
+        commit = ct.POINTER(git_commit)()
+        _git_check(git_commit_lookup(ct.byref(commit), self.repo,
+                                     ct.byref(_git_oid(oid))))
+        try:
+            time = git_commit_time(commit)
+            parents = [bytes(git_commit_parent_id(commit, i).contents.id)
+                       for i in range(git_commit_parentcount(commit))]
+        finally:
+            git_commit_free(commit)
+        idx = self.index[oid] = len(self.ids)
+        self.ids.append(oid)
+        self.times.append(time)
+        self.parents.append(parents)
+        self.tags.append(self.names.get(oid) or oid in self.lightweight or None)
+        return idx
+
+    def parents_of(self, idx):
+        parents = self.parents[idx]
+        if parents and isinstance(parents[0], bytes):
+            parents = self.parents[idx] = [self.node(oid) for oid in parents]
+        return parents
+
+# libgit2 keeps the flags of the walked commits in 4 bits: from the fourth
+# candidate tag on, the commits are never seen as reachable from it.
+_describe_flags_mask = 0xF
+
+def _describe(graph, walks, start):
+    # (name of the best candidate tag (or None), distance, whether
+    # lightweight tags were met) for the commit `start`, as the walk of
+    # libgit2 from it finds them.
+    #
+    # That walk, from a commit with only one parent, first takes the commit
+    # (not a candidate unless it is itself tagged) and then goes on as the
+    # walk from the parent does: the outcome is the parent's one, one commit
+    # further.  So the walks are memoized in `walks` and only done from the
+    # merges and root commits, the commits of the linear stretches of
+    # history above being then assigned in one pass.
+    tags = graph.tags
+    chain = []
+    node = start
+    while node not in walks:
+        tag = tags[node]
+        parents = graph.parents_of(node)
+        if (tag is not None and tag is not True) or len(parents) != 1:
+            walks[node] = _describe_walk(graph, node)
+            break
+        chain.append(node)
+        node = parents[0]
+    name, depth, unannotated = walks[node]
+    for node in reversed(chain):
+        if name is None:
+            unannotated = unannotated or tags[node] is True
+        else:
+            depth += 1
+        walks[node] = (name, depth, unannotated)
+    return walks[start]
+
+def _describe_walk(graph, start):
+    # The walk of libgit2 from the commit `start`.
+    tags = graph.tags
+    flags = {start: 1}  # bit 0: seen, bit n: reachable from the candidate n
+    queue = _DescribeQueue(graph.times)
+    queue.insert(start)
+    matches = []  # [name, depth, flag, found order]
+    seen = unannotated = 0
+    gave_up_on = None
+    while queue:
+        commit = queue.pop()
+        seen += 1
+        tag = tags[commit]
+        if tag is True:
+            unannotated += 1
+        elif tag is not None:
+            if len(matches) < GIT_DESCRIBE_DEFAULT_MAX_CANDIDATES_TAGS:
+                flag = 2 << len(matches)
+                matches.append([tag, seen - 1, flag, len(matches)])
+                flags[commit] = (flags[commit] | flag) & _describe_flags_mask
+            else:
+                gave_up_on = commit
+                break
+        commit_flags = flags[commit]
+        for match in matches:
+            if not commit_flags & match[2]:
+                match[1] += 1
+        if matches and not queue:
+            break
+        for parent in graph.parents_of(commit):
+            parent_flags = flags.get(parent)
+            if parent_flags is None:
+                queue.insert(parent)
+                flags[parent] = commit_flags
+            else:
+                flags[parent] = parent_flags | commit_flags
+    if not matches:
+        return (None, None, unannotated > 0)
+    best = min(matches, key=lambda match: (match[1], match[3]))
+    if gave_up_on is not None:
+        queue.insert(gave_up_on)
+    # Finish the distance of the best candidate: count the commits not
+    # reachable from it until all the pending ones are.
+    depth, flag = best[1], best[2]
+    while queue:
+        commit = queue.pop()
+        commit_flags = flags[commit]
+        if commit_flags & flag:
+            if all(flags[pending] & flag for pending in queue.items):
+                break
+        else:
+            depth += 1
+        for parent in graph.parents_of(commit):
+            parent_flags = flags.get(parent)
+            if parent_flags is None:
+                queue.insert(parent)
+                flags[parent] = commit_flags
+            else:
+                flags[parent] = parent_flags | commit_flags
+    return (best[0], depth, False)
+
+class _DescribeQueue:
+
+    # The binary heap of libgit2 (`git_pqueue`), newest commit first, so
+    # that commits of the same time come out in the same order.
+
+    def __init__(self, times):
+        self.times = times
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def insert(self, item):
+        items, times = self.items, self.times
+        el = len(items)
+        items.append(item)
+        while el > 0:
+            parent_el = (el - 1) // 2
+            parent = items[parent_el]
+            if times[parent] >= times[item]:
+                break
+            items[el] = parent
+            el = parent_el
+        items[el] = item
+
+    def pop(self):
+        items, times = self.items, self.times
+        top = items[0]
+        last = items.pop()
+        if items:
+            el, size = 0, len(items)
+            while True:
+                kid_el = 2 * el + 1
+                if kid_el >= size:
+                    break
+                if kid_el + 1 < size and times[items[kid_el]] < times[items[kid_el + 1]]:
+                    kid_el += 1
+                if times[last] >= times[items[kid_el]]:
+                    break
+                items[el] = items[kid_el]
+                el = kid_el
+            items[el] = last
+        return top
+
+def _describe_abbrev(odb, oid):
+    # Shortest unique prefix of `oid` (hex str), of at least
+    # GIT_DESCRIBE_DEFAULT_ABBREVIATED_SIZE characters.
+    full = _git_oid(oid)
+    found = git_oid()
+    hexsize = 2 * len(oid)
+    for size in range(GIT_DESCRIBE_DEFAULT_ABBREVIATED_SIZE, hexsize):
+        error = git_odb_exists_prefix(ct.byref(found), odb, ct.byref(full), size)
+        if error == 0:
+            return oid.hex()[:size]
+        if error != GIT_EAMBIGUOUS:
+            _git_check(error)
+    return oid.hex()
@@ -7,6 +7,10 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common   import *  # noqa
 from .buffer   import git_buf
 from .strarray import git_strarray
@@ -19,6 +23,22 @@ from .types    import git_blob
 from .types    import git_index
 from .types    import git_tree
 from .types    import git_submodule_ignore_t
+from .errors   import GIT_ERROR, _git_check
+from .oid      import _git_oid
+from .blob     import git_blob_lookup, git_blob_free
+from .blob     import git_blob_rawcontent, git_blob_rawsize
+from .repository import _git_repository_handles
+from .types    import git_commit
+from .commit   import git_commit_lookup, git_commit_free, git_commit_tree
+from .commit   import git_commit_parentcount, git_commit_parent
+from .tree     import git_tree_free
+from .sys.hashsig import git_hashsig as _git_hashsig
+from .sys.hashsig import git_hashsig_create as _git_hashsig_create
+from .sys.hashsig import git_hashsig_create_fromfile as _git_hashsig_create_fromfile
+from .sys.hashsig import git_hashsig_free as _git_hashsig_free
+from .sys.hashsig import git_hashsig_compare as _git_hashsig_compare
+from .sys.hashsig import GIT_HASHSIG_NORMAL, GIT_HASHSIG_IGNORE_WHITESPACE
+from .sys.hashsig import GIT_HASHSIG_SMART_WHITESPACE, GIT_HASHSIG_ALLOW_SMALL_FILES
 
 # @file git2/diff.h
 # @brief Git tree and file differencing routines.
@@ -1579,3 +1599,311 @@ git_diff_patchid = CFUNC(ct.c_int,
     (1, "opts"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Persistent cache of similarity signatures for rename/copy detection.
+#
+# Signatures (`git_hashsig`) of blobs are kept across calls, keyed by blob
+# OID, together with the similarity scores of already compared pairs of
+# blobs.  The cache is plugged into `git_diff_find_similar` as a
+# `git_diff_similarity_metric` (see `diff_find_similar_cached`), so that
+# repeated analyses of overlapping commits reuse the signatures instead
+# of rehashing the blobs.  Working directory files (which have no known
+# OID) are hashed on every call and never cached.
+#
+# A cache must not be used by several `diff_find_similar_cached` calls at
+# the same time.
+#
+# @param options One of GIT_HASHSIG_NORMAL, GIT_HASHSIG_IGNORE_WHITESPACE
+#                or GIT_HASHSIG_SMART_WHITESPACE (the `git_diff_find_similar`
+#                default); GIT_HASHSIG_ALLOW_SMALL_FILES is always added, as
+#                `git_diff_find_similar` does for its own metric
+# @param max_entries Maximum number of cached signatures (and ten times
+#                    that many scores); the least recently used ones are
+#                    dropped after every `diff_find_similar_cached` call.
+#                    None means unbounded.
+#
+class HashsigCache:
+
+    def __init__(self, options=GIT_HASHSIG_SMART_WHITESPACE, max_entries=None):
+        self.options     = options | GIT_HASHSIG_ALLOW_SMALL_FILES
+        self.max_entries = max_entries
+        self._sigs   = _OrderedDict()  # oid -> git_hashsig pointer
+        self._owners = {}             # signature address -> oid
+        self._temp   = set()          # addresses of uncached signatures
+        self._scores = _OrderedDict()  # (oid, oid) -> score
+        self._lock   = _threading.Lock()
+        callbacks = dict(git_diff_similarity_metric._fields_)
+        self._callbacks = (
+            callbacks["file_signature"](self._file_signature),
+            callbacks["buffer_signature"](self._buffer_signature),
+            callbacks["free_signature"](self._free_signature),
+            callbacks["similarity"](self._similarity))
+        self.metric = git_diff_similarity_metric(*self._callbacks, None)
+
+    def __len__(self):
+        return len(self._sigs)
+
+    # Compute the missing signatures of the blobs of `diff` and the
+    # similarity scores of its candidate pairs on a pool of `workers`
+    # threads, so that `git_diff_find_similar` finds them in the cache.
+    #
+    # Sources are the old sides of deleted and (with `copies`) modified
+    # deltas, targets are the new sides of added deltas.  Scores are only
+    # precomputed when there are at most `max_pairs` candidate pairs.
+    #
+    def prepare(self, repo, diff, workers=None, copies=False, max_pairs=1000 * 1000):
+        sources, targets = set(), set()
+        for idx in range(git_diff_num_deltas(diff)):
+            delta = git_diff_get_delta(diff, idx).contents
+            if delta.status in (GIT_DELTA_DELETED, GIT_DELTA_MODIFIED):
+                if delta.status == GIT_DELTA_DELETED or copies:
+                    key = _diff_file_key(delta.old_file)
+                    if key is not None: sources.add(key)
+            if delta.status in (GIT_DELTA_ADDED, GIT_DELTA_MODIFIED):
+                key = _diff_file_key(delta.new_file)
+                if key is not None: targets.add(key)
+        with self._lock:
+            missing = [key for key in sources | targets if key not in self._sigs]
+        with _git_repository_handles(repo) as handles, \
+             _ThreadPoolExecutor(max_workers=workers) as executor:
+            for key, sig in zip(missing, executor.map(
+                    lambda key: self._blob_signature(handles.get(), key), missing)):
+                with self._lock:
+                    self._put(key, sig)
+            if not sources or not targets or len(sources) * len(targets) > max_pairs:
+                return
+            with self._lock:
+                pairs = [_diff_score_key(a, b) for a in sources for b in targets if a != b]
+                pairs = [pair for pair in set(pairs) if pair not in self._scores]
+                sigs  = {key: self._sigs.get(key) for key in sources | targets}
+            for pair, score in zip(pairs, executor.map(
+                    lambda pair: _diff_hashsig_score(sigs[pair[0]], sigs[pair[1]]), pairs)):
+                if score is not None:
+                    with self._lock:
+                        self._scores[pair] = score
+
+    # Drop the least recently used entries above `max_entries`.
+    def trim(self):
+        if self.max_entries is None:
+            return
+        with self._lock:
+            while len(self._sigs) > self.max_entries:
+                key, sig = self._sigs.popitem(last=False)
+                self._owners.pop(ct.addressof(sig.contents), None)
+                _git_hashsig_free(sig)
+            while len(self._scores) > self.max_entries * 10:
+                self._scores.popitem(last=False)
+
+    # Free all cached signatures.
+    def clear(self):
+        with self._lock:
+            for sig in self._sigs.values():
+                _git_hashsig_free(sig)
+            self._sigs.clear()
+            self._owners.clear()
+            self._scores.clear()
+
+    def __del__(self):
+        if getattr(self, "_sigs", None):
+            self.clear()
+
+    def _put(self, key, sig):
+        if key in self._sigs:
+            _git_hashsig_free(sig)
+            return self._sigs[key]
+        self._sigs[key] = sig
+        self._owners[ct.addressof(sig.contents)] = key
+        return sig
+
+    def _get(self, key):
+        sig = self._sigs.get(key)
+        if key in self._sigs:
+            self._sigs.move_to_end(key)
+        return sig
+
+    def _blob_signature(self, repo, key):
+        blob = ct.POINTER(git_blob)()
+        _git_check(git_blob_lookup(ct.byref(blob), repo, ct.byref(_git_oid(key))))
+        try:
+            size = git_blob_rawsize(blob)
+            data = git_blob_rawcontent(blob)
+            if self.options & GIT_HASHSIG_IGNORE_WHITESPACE:
+                # git_hashsig_create() may modify the buffer in place.
+                data = ct.create_string_buffer(ct.string_at(data, size), size)
+            return self._create(_git_hashsig_create,
+                                ct.cast(data, git_buffer_t), size, self.options)
+        finally:
+            git_blob_free(blob)
+
+    @staticmethod
+    def _create(create, *args):
+        sig = ct.POINTER(_git_hashsig)()
+        _git_check(create(ct.byref(sig), *args))
+        return sig
+
+    def _signature(self, out, file, create, *args):
+        try:
+            key = _diff_file_key(file.contents)
+            with self._lock:
+                if key is not None and key in self._sigs:
+                    sig = self._get(key)
+                    out[0] = ct.addressof(sig.contents)
+                    return 0
+            sig = self._create(create, *args)
+            with self._lock:
+                if key is not None:
+                    sig = self._put(key, sig)
+                else:
+                    self._temp.add(ct.addressof(sig.contents))
+            out[0] = ct.addressof(sig.contents)
+            return 0
+        except Exception:
+            return GIT_ERROR
+
+    def _file_signature(self, out, file, fullpath, payload):
+        return self._signature(out, file, _git_hashsig_create_fromfile,
+                               fullpath, self.options)
+
+    def _buffer_signature(self, out, file, buf, buflen, payload):
+        if self.options & GIT_HASHSIG_IGNORE_WHITESPACE:
+            buf = ct.cast(ct.create_string_buffer(ct.string_at(buf, buflen), buflen),
+                          git_buffer_t)
+        return self._signature(out, file, _git_hashsig_create, buf, buflen, self.options)
+
+    def _free_signature(self, sig, payload):
+        with self._lock:
+            if sig in self._temp:
+                self._temp.discard(sig)
+                _git_hashsig_free(ct.cast(sig, ct.POINTER(_git_hashsig)))
+
+    def _similarity(self, score, siga, sigb, payload):
+        with self._lock:
+            keya, keyb = self._owners.get(siga), self._owners.get(sigb)
+            pair = _diff_score_key(keya, keyb) if keya and keyb else None
+            cached = self._scores.get(pair) if pair else None
+        if cached is None:
+            cached = _git_hashsig_compare(ct.cast(siga, ct.POINTER(_git_hashsig)),
+                                          ct.cast(sigb, ct.POINTER(_git_hashsig)))
+            if cached < 0:
+                return cached
+            if pair:
+                with self._lock:
+                    self._scores[pair] = cached
+        score[0] = cached
+        return 0
+
+def _diff_file_key(file):
+    # Blob OID of a diff side as cache key, or None if not known.
+    if not file.flags & GIT_DIFF_FLAG_VALID_ID or (file.mode & 0o170000) != 0o100000:
+        return None
+    key = bytes(file.id.id)
+    return key if any(key) else None
+
+def _diff_score_key(keya, keyb):
+    return (keya, keyb) if keya <= keyb else (keyb, keya)
+
+def _diff_hashsig_score(siga, sigb):
+    score = _git_hashsig_compare(siga, sigb)
+    return score if score >= 0 else None
+
+# Run `git_diff_find_similar` with signatures from a `HashsigCache`.
+#
+# The signatures and pair scores missing from the cache are first computed
+# in parallel (`HashsigCache.prepare`), then the rename/copy detection
+# itself is done by libgit2 with the cache as similarity metric.  The
+# cache must use the same whitespace option as the one selected by the
+# find `opts` flags.
+#
+# @param repo The repository of the diff
+# @param diff diff to run detection algorithms on
+# @param opts Options for how the detection should be run, NULL for defaults
+# @param cache The `HashsigCache` to use (a new one if None)
+# @param workers Number of threads; defaults to `os.cpu_count()`
+# @return the cache used
+#
+def diff_find_similar_cached(repo, diff, opts=None, cache=None, workers=None):
+    if opts is None:
+        opts = git_diff_find_options()
+        _git_check(git_diff_find_options_init(ct.byref(opts),
+                                              GIT_DIFF_FIND_OPTIONS_VERSION))
+    if cache is None:
+        if opts.flags & GIT_DIFF_FIND_IGNORE_WHITESPACE:
+            cache = HashsigCache(GIT_HASHSIG_IGNORE_WHITESPACE)
+        elif opts.flags & GIT_DIFF_FIND_DONT_IGNORE_WHITESPACE:
+            cache = HashsigCache(GIT_HASHSIG_NORMAL)
+        else:
+            cache = HashsigCache()
+    cache.prepare(repo, diff, workers,
+                  copies=bool(opts.flags & (GIT_DIFF_FIND_COPIES |
+                                            GIT_DIFF_FIND_COPIES_FROM_UNMODIFIED)))
+    metric, opts.metric = opts.metric, ct.pointer(cache.metric)
+    try:
+        _git_check(git_diff_find_similar(diff, ct.byref(opts)))
+    finally:
+        opts.metric = metric
+    cache.trim()
+    return cache
+
+# Internal addition for the high-level helpers of this package.
+#
+# Compute the patch IDs of many commits in parallel.
+#
+# The patch ID of a commit is the `git_diff_patchid` of the diff between
+# the tree of its first parent (or the empty tree for a root commit) and
+# its own tree; merge commits have none (as with `git patch-id`).  The
+# commits are processed on a pool of `workers` threads, each with its own
+# repository handle.  Results are stored in `cache` (any mutable mapping
+# keyed by commit id, e.g. a dict kept across calls or a `shelve`), and
+# commits already in it are not recomputed.
+#
+# Cherry-picks between two branches are the commits whose patch IDs are
+# in both results.
+#
+# @param repo the repository
+# @param commits iterable of commit ids (as `git_oid`, hex str or raw bytes)
+# @param workers number of threads; defaults to `os.cpu_count()`
+# @param cache mapping {commit id (hex str): patch id (hex str) or None}
+# @return dict {commit id (hex str): patch id (hex str) or None}
+#
+def patch_ids(repo, commits, workers=None, cache=None):
+    if cache is None:
+        cache = {}
+    keys = [bytes(_git_oid(commit).id).hex() for commit in commits]
+    missing = list(dict.fromkeys(key for key in keys if key not in cache))
+    if missing:
+        with _git_repository_handles(repo) as handles, \
+             _ThreadPoolExecutor(max_workers=workers) as executor:
+            for key, patch_id in zip(missing, executor.map(
+                    lambda key: _diff_commit_patchid(handles.get(), key), missing)):
+                cache[key] = patch_id
+    return {key: cache[key] for key in keys}
+
+def _diff_commit_patchid(repo, key):
+    commit = ct.POINTER(git_commit)()
+    _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(_git_oid(key))))
+    try:
+        if git_commit_parentcount(commit) > 1:
+            return None
+        tree, parent_tree = ct.POINTER(git_tree)(), ct.POINTER(git_tree)()
+        diff = ct.POINTER(git_diff)()
+        try:
+            _git_check(git_commit_tree(ct.byref(tree), commit))
+            if git_commit_parentcount(commit) == 1:
+                parent = ct.POINTER(git_commit)()
+                _git_check(git_commit_parent(ct.byref(parent), commit, 0))
+                try:
+                    _git_check(git_commit_tree(ct.byref(parent_tree), parent))
+                finally:
+                    git_commit_free(parent)
+            _git_check(git_diff_tree_to_tree(ct.byref(diff), repo, parent_tree, tree, None))
+            patch_id = git_oid()
+            _git_check(git_diff_patchid(ct.byref(patch_id), diff, None))
+            return bytes(patch_id.id).hex()
+        finally:
+            git_diff_free(diff)
+            git_tree_free(parent_tree)
+            git_tree_free(tree)
+    finally:
+        git_commit_free(commit)
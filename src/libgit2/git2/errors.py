@@ -186,3 +186,34 @@ git_error_set_oom = CFUNC(None)(
     ("git_error_set_oom", dll),)
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Exception raised when a libgit2 call made by a helper fails.
+#
+# `code` is the (negative) `git_error_code` returned by libgit2 and
+# `klass` is the `git_error_t` class of the last error of this thread.
+#
+class GitError(Exception):
+
+    def __init__(self, code, message=None, klass=GIT_ERROR_NONE):
+        super().__init__(message or "libgit2 error {}".format(code))
+        self.code  = code
+        self.klass = klass
+
+# Raise `GitError` for a negative libgit2 return code.
+#
+# Must be called in the same thread, right after the failed call, while
+# the thread-local last error is still available.
+#
+# @param error value returned by a libgit2 function
+# @return `error` unchanged if it is not an error code
+#
+def _git_check(error):
+    if error >= 0:
+        return error
+    last = git_error_last()
+    if last and last.contents.message:
+        raise GitError(error, last.contents.message.decode("utf-8", "replace"),
+                       last.contents.klass)
+    raise GitError(error)
@@ -7,6 +7,11 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from collections import namedtuple as _namedtuple
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common   import *  # noqa
 from .oid      import git_oid
 from .oidarray import git_oidarray
@@ -19,6 +24,17 @@ from .index    import git_index_entry
 from .types    import git_tree
 from .checkout import git_checkout_options
 from .diff     import git_diff_similarity_metric
+from .oid      import _git_oid
+from .oidarray import git_oidarray_dispose as _git_oidarray_dispose
+from .errors   import GitError, _git_check
+from .errors   import GIT_ENOTFOUND, GIT_ITEROVER
+from .types    import git_index_conflict_iterator
+from .index    import git_index_free
+from .index    import git_index_conflict_iterator_new, git_index_conflict_next
+from .index    import git_index_conflict_iterator_free
+from .commit   import git_commit_lookup, git_commit_free, git_commit_tree_id
+from .tree     import git_tree_lookup, git_tree_free
+from .repository import _git_repository_handles
 
 # @file git2/merge.h
 # @brief Git merge routines
@@ -674,3 +690,269 @@ git_merge = CFUNC(ct.c_int,
     (1, "checkout_opts"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Result of a mergeability check: whether the merge is clean, the merge
+# bases (hex str) used and the paths (str) in conflict.
+#
+Mergeability = _namedtuple("Mergeability", ["mergeable", "bases", "conflicts"])
+
+# Test whether commits merge cleanly, without touching the working
+# directory, the index or the object database.
+#
+# The merge bases are cached by (unordered) commit pair, and the outcome
+# of each tree merge by (base tree, our tree, their tree), so a re-check
+# after an unrelated push reuses the work already done; merges where one
+# side did not change the base tree are decided without merging at all.
+# Criss-cross merges (several merge bases) go through `git_merge_commits`,
+# which builds the virtual base as `git merge` does.
+#
+# Checks may run concurrently from several threads (see `check_many`);
+# each thread uses its own repository handle.
+#
+# @param repo the repository
+# @param options the `git_merge_options` (or None for defaults)
+# @param max_entries maximum number of merge bases and of merge outcomes
+#                    kept in the caches
+#
+class MergeabilityChecker:
+
+    def __init__(self, repo, options=None, max_entries=4096):
+        if options is not None:
+            self.options = git_merge_options.from_buffer_copy(options)
+        else:
+            self.options = git_merge_options()
+            _git_check(git_merge_options_init(ct.byref(self.options),
+                                              GIT_MERGE_OPTIONS_VERSION))
+        self.max_entries = max_entries
+        self.stats   = dict(base_hits=0, base_misses=0, merge_hits=0, merge_misses=0)
+        self._bases  = _OrderedDict()
+        self._merges = _OrderedDict()
+        self._lock   = _threading.Lock()
+        self._handles = _git_repository_handles(repo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Check whether `theirs` merges cleanly into `ours` (OIDs of commits as
+    # `git_oid`, hex str or raw bytes).
+    #
+    # @return `Mergeability`
+    #
+    def check(self, ours, theirs):
+        repo = self._handles.get()
+        ours, theirs = _git_oid(ours), _git_oid(theirs)
+        bases = self.merge_bases(ours, theirs)
+        if len(bases) > 1:
+            conflicts = self._merge_commits(repo, ours, theirs)
+        else:
+            trees = (_merge_tree_id(repo, bases[0]) if bases else None,
+                     _merge_tree_id(repo, ours), _merge_tree_id(repo, theirs))
+            with self._lock:
+                conflicts = self._merges.get(trees)
+                if conflicts is not None:
+                    self._merges.move_to_end(trees)
+                    self.stats["merge_hits"] += 1
+            if conflicts is None:
+                if trees[0] is not None and trees[0] in (trees[1], trees[2]):
+                    conflicts = ()
+                else:
+                    conflicts = self._merge_trees(repo, *trees)
+                with self._lock:
+                    self.stats["merge_misses"] += 1
+                    self._store(self._merges, trees, conflicts)
+        return Mergeability(not conflicts, [base.hex() for base in bases],
+                            list(conflicts))
+
+    # Check many (ours, theirs) pairs on a pool of `workers` threads
+    # (defaults to `os.cpu_count()`).
+    #
+    # @return list of `Mergeability` (or of the `GitError` raised for the
+    #         pair), in the order of `pairs`
+    #
+    def check_many(self, pairs, workers=None):
+        def check(pair):
+            try:
+                return self.check(*pair)
+            except GitError as exc:
+                return exc
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(check, pairs))
+
+    # Merge bases (raw bytes OIDs) of two commits, cached.
+    #
+    # @return tuple of the merge bases (empty if the commits are unrelated)
+    #
+    def merge_bases(self, one, two):
+        one, two = _git_oid(one), _git_oid(two)
+        key = tuple(sorted((bytes(one.id), bytes(two.id))))
+        with self._lock:
+            bases = self._bases.get(key)
+            if bases is not None:
+                self._bases.move_to_end(key)
+                self.stats["base_hits"] += 1
+                return bases
+        bases = _merge_bases(self._handles.get(), one, two)
+        with self._lock:
+            self.stats["base_misses"] += 1
+            self._store(self._bases, key, bases)
+        return bases
+
+    def clear(self):
+        with self._lock:
+            self._bases.clear()
+            self._merges.clear()
+
+    def close(self):
+        self.clear()
+        self._handles.close()
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _merge_trees(self, repo, *tree_ids):
+        trees = []
+        try:
+            for tree_id in tree_ids:
+                tree = ct.POINTER(git_tree)()
+                if tree_id is not None:
+                    _git_check(git_tree_lookup(ct.byref(tree), repo,
+                                               ct.byref(_git_oid(tree_id))))
+                trees.append(tree)
+            index = ct.POINTER(git_index)()
+            _git_check(git_merge_trees(ct.byref(index), repo, *trees,
+                                       ct.byref(self.options)))
+        finally:
+            for tree in trees:
+                git_tree_free(tree)
+        try:
+            return _merge_index_conflicts(index)
+        finally:
+            git_index_free(index)
+
+    def _merge_commits(self, repo, ours, theirs):
+        commits = []
+        try:
+            for oid in (ours, theirs):
+                commit = ct.POINTER(git_commit)()
+                _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(oid)))
+                commits.append(commit)
+            index = ct.POINTER(git_index)()
+            _git_check(git_merge_commits(ct.byref(index), repo, *commits,
+                                         ct.byref(self.options)))
+        finally:
+            for commit in commits:
+                git_commit_free(commit)
+        try:
+            return _merge_index_conflicts(index)
+        finally:
+            git_index_free(index)
+
+def _merge_bases(repo, one, two):
+    bases = git_oidarray()
+    error = git_merge_bases(ct.byref(bases), repo, ct.byref(one), ct.byref(two))
+    if error == GIT_ENOTFOUND:
+        return ()
+    _git_check(error)
+    try:
+        return tuple(bytes(bases.ids[idx].id) for idx in range(bases.count))
+    finally:
+        _git_oidarray_dispose(ct.byref(bases))
+
+def _merge_tree_id(repo, oid):
+    commit = ct.POINTER(git_commit)()
+    _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(_git_oid(oid))))
+    try:
+        return bytes(git_commit_tree_id(commit).contents.id)
+    finally:
+        git_commit_free(commit)
+
+def _merge_index_conflicts(index):
+    # Paths in conflict in an in-memory merge result, in index order.
+    iterator = ct.POINTER(git_index_conflict_iterator)()
+    _git_check(git_index_conflict_iterator_new(ct.byref(iterator), index))
+    try:
+        paths = []
+        ancestor = ct.POINTER(git_index_entry)()
+        our      = ct.POINTER(git_index_entry)()
+        their    = ct.POINTER(git_index_entry)()
+        while True:
+            error = git_index_conflict_next(ct.byref(ancestor), ct.byref(our),
+                                            ct.byref(their), iterator)
+            if error == GIT_ITEROVER:
+                break
+            _git_check(error)
+            entry = our or their or ancestor
+            paths.append(os.fsdecode(entry.contents.path))
+        return tuple(paths)
+    finally:
+        git_index_conflict_iterator_free(iterator)
+
+# Compute the merge bases of many commit pairs and octopus sets.
+#
+# Each item of `commits` is a sequence of commit ids (as `git_oid`, hex str
+# or raw bytes): the merge base of a pair is `git_merge_base`, that of a
+# larger set `git_merge_base_octopus`.  Items are unordered, so (a, b) and
+# (b, a) are computed once, and the ones already in `cache` (a mutable
+# mapping, e.g. a dict kept across calls) are not computed again.
+#
+# The items are split between `workers` threads, each with its own
+# repository handle; items sharing an endpoint (e.g. the main branch
+# against every pull request) go to the same thread, so the walks over
+# the history of that endpoint hit its object cache.  libgit2 loads the
+# repository's commit-graph file (`git commit-graph write`), if any, and
+# then uses its generation numbers to cut the walks short.
+#
+# @param repo the repository
+# @param commits iterable of sequences of commit ids
+# @param workers number of threads; defaults to `os.cpu_count()`
+# @param cache mapping {sorted tuple of commit ids (hex str): merge base
+#              (hex str) or None}
+# @return list of the merge bases (hex str, or None for unrelated commits),
+#         in the order of `commits`
+#
+def merge_base_batch(repo, commits, workers=None, cache=None):
+    if cache is None:
+        cache = {}
+    keys = [tuple(sorted({bytes(_git_oid(commit).id).hex() for commit in item}))
+            for item in commits]
+    missing = list(dict.fromkeys(key for key in keys if key not in cache))
+    if missing:
+        uses = {}
+        for key in missing:
+            for commit in key:
+                uses[commit] = uses.get(commit, 0) + 1
+        missing.sort(key=lambda key: max((uses[commit], commit) for commit in key))
+        workers = max(1, min(workers or os.cpu_count() or 1, len(missing)))
+        size = -(-len(missing) // workers)
+        chunks = [missing[start:start + size] for start in range(0, len(missing), size)]
+        with _git_repository_handles(repo) as handles, \
+             _ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk, bases in zip(chunks, executor.map(
+                    lambda chunk: [_merge_base(handles.get(), key) for key in chunk],
+                    chunks)):
+                for key, base in zip(chunk, bases):
+                    cache[key] = base
+    return [cache[key] for key in keys]
+
+def _merge_base(repo, key):
+    if len(key) == 1:
+        return key[0]
+    base = git_oid()
+    if len(key) == 2:
+        error = git_merge_base(ct.byref(base), repo,
+                               ct.byref(_git_oid(key[0])), ct.byref(_git_oid(key[1])))
+    else:
+        oids = (git_oid * len(key))(*(_git_oid(commit) for commit in key))
+        error = git_merge_base_octopus(ct.byref(base), repo, len(key), oids)
+    if error == GIT_ENOTFOUND:
+        return None
+    _git_check(error)
+    return bytes(base.id).hex()
@@ -466,3 +466,17 @@ git_oid_shorten_free = CFUNC(None,
     (1, "os"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Convert an object id given as a `git_oid`, a hex string or raw bytes
+# to a `git_oid` structure.
+#
+def _git_oid(value):
+    if isinstance(value, git_oid):
+        return value
+    if isinstance(value, str):
+        value = bytes.fromhex(value)
+    oid = git_oid()
+    oid.id[:len(value)] = value
+    return oid
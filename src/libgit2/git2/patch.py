@@ -7,8 +7,14 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+import array as _array
+from collections import namedtuple as _namedtuple
+from collections import deque as _deque
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common import *  # noqa
-from .buffer import git_buf
+from .buffer import git_buf, git_buf_dispose
 from .types  import git_repository
 from .types  import git_blob
 from .diff   import git_diff
@@ -17,6 +23,13 @@ from .diff   import git_diff_delta
 from .diff   import git_diff_hunk
 from .diff   import git_diff_line
 from .diff   import git_diff_line_cb
+from .diff   import git_diff_num_deltas
+from .diff   import git_diff_get_delta
+from .diff   import git_diff_free
+from .diff   import GIT_DIFF_FLAG_BINARY
+from .errors import GitError, _git_check
+from .errors import GIT_EMODIFIED
+from .repository import _git_repository_handles
 
 # @file git2/patch.h
 # @brief Patch handling routines.
@@ -344,3 +357,294 @@ git_patch_to_buf = CFUNC(ct.c_int,
     (1, "patch"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Streaming diff records.
+#
+# `DiffDeltaRecord` describes one delta of a diff: its position in the
+# diff (`index`), `git_delta_t` `status`, `git_diff_flag_t` `flags`,
+# `similarity`, old/new paths (str), old/new ids (hex str) and its `hunks`
+# (a tuple of `DiffHunkRecord`, or None if hunks were not requested).
+#
+# `DiffHunkRecord` holds the line ranges, the `header` (str) and the
+# `lines` of a hunk (a tuple of `DiffLineRecord`, or None if lines were not
+# requested).
+#
+# `DiffLineRecord` holds the `git_diff_line_t` `origin` (str), the old and
+# new line numbers (-1 if absent) and the `content` (bytes, or None if
+# line content was not requested).
+#
+DiffDeltaRecord = _namedtuple("DiffDeltaRecord",
+                              ("index", "status", "flags", "similarity",
+                               "old_path", "new_path", "old_id", "new_id", "hunks"))
+DiffHunkRecord  = _namedtuple("DiffHunkRecord",
+                              ("old_start", "old_lines", "new_start", "new_lines",
+                               "header", "lines"))
+DiffLineRecord  = _namedtuple("DiffLineRecord",
+                              ("origin", "old_lineno", "new_lineno", "content"))
+
+# Iterate over a diff without any Python callbacks.
+#
+# Unlike `git_diff_foreach`, which calls back into Python for every file,
+# hunk and line, the patch of every delta is generated by
+# `git_patch_from_diff` and read with `git_patch_get_hunk` and
+# `git_patch_get_line_in_hunk`.  One `DiffDeltaRecord` is yielded per delta,
+# as soon as its patch has been read.
+#
+# @param diff A git_diff generated by one of the above functions.
+# @param hunks Read the hunks of the deltas (otherwise no patch is
+#              generated at all and `hunks` is None)
+# @param lines Read the lines of the hunks
+# @param content Read the content of the lines
+# @param binary Yield deltas of binary files (their hunks are empty); with
+#               `hunks` false only the deltas already known to be binary
+#               can be skipped
+# @return generator of `DiffDeltaRecord`
+#
+def diff_iter(diff, hunks=True, lines=True, content=True, binary=True):
+    for idx in range(git_diff_num_deltas(diff)):
+        if not hunks:
+            delta = git_diff_get_delta(diff, idx).contents
+            if not binary and delta.flags & GIT_DIFF_FLAG_BINARY:
+                continue
+            yield _diff_delta_record(idx, delta, None)
+            continue
+        patch = ct.POINTER(git_patch)()
+        _git_check(git_patch_from_diff(ct.byref(patch), diff, idx))
+        try:
+            delta = (git_patch_get_delta(patch) if patch
+                     else git_diff_get_delta(diff, idx)).contents
+            if not binary and delta.flags & GIT_DIFF_FLAG_BINARY:
+                continue
+            hunk_records = (tuple(_patch_hunk_records(patch, lines, content))
+                            if patch else ())
+            yield _diff_delta_record(idx, delta, hunk_records)
+        finally:
+            git_patch_free(patch)
+
+def _diff_delta_record(idx, delta, hunks):
+    old_file, new_file = delta.old_file, delta.new_file
+    return DiffDeltaRecord(idx, delta.status, delta.flags, delta.similarity,
+                           os.fsdecode(old_file.path) if old_file.path else None,
+                           os.fsdecode(new_file.path) if new_file.path else None,
+                           bytes(old_file.id.id).hex(), bytes(new_file.id.id).hex(),
+                           hunks)
+
+def _patch_hunk_records(patch, lines=True, content=True):
+    # Read all hunks (and their lines) of a patch.
+    hunk = ct.POINTER(git_diff_hunk)()
+    line = ct.POINTER(git_diff_line)()
+    num_lines = ct.c_size_t()
+    for hunk_idx in range(git_patch_num_hunks(patch)):
+        _git_check(git_patch_get_hunk(ct.byref(hunk), ct.byref(num_lines), patch, hunk_idx))
+        h = hunk.contents
+        line_records = None
+        if lines:
+            line_records = []
+            for line_idx in range(num_lines.value):
+                _git_check(git_patch_get_line_in_hunk(ct.byref(line), patch,
+                                                      hunk_idx, line_idx))
+                ln = line.contents
+                line_records.append(DiffLineRecord(
+                    ln.origin.decode("ascii"), ln.old_lineno, ln.new_lineno,
+                    ct.string_at(ln.content, ln.content_len) if content else None))
+            line_records = tuple(line_records)
+        yield DiffHunkRecord(h.old_start, h.old_lines, h.new_start, h.new_lines,
+                             h.header[:h.header_len].decode("utf-8", "replace"),
+                             line_records)
+
+# Internal addition for the high-level helpers of this package.
+#
+# Result of `diff_patches` for one delta: its position in the diff, its
+# old and new paths (str), the patch text (bytes; None if not requested or
+# if no patch was generated, e.g. for unmodified entries), the numbers of
+# context, added and deleted lines and whether the delta is binary (binary
+# deltas have no line statistics).
+#
+DiffPatchRecord = _namedtuple("DiffPatchRecord",
+                              ("index", "old_path", "new_path", "patch",
+                               "context", "additions", "deletions", "binary"))
+
+# Generate the patches of all deltas of a diff in parallel.
+#
+# The deltas of one diff are independent of each other, so they are
+# distributed over a pool of `workers` threads, each one calling
+# `git_patch_from_diff` and then `git_patch_to_buf` (if `text` is true)
+# and `git_patch_line_stats`.  The results are yielded in delta order.
+#
+# A `git_diff` must not be used from several threads at the same time
+# (generating a patch loads content through the repository of the diff
+# and updates state shared by all its deltas), so every worker needs a
+# diff of its own.  `diff` is therefore either a callable, which is
+# given a repository and returns a new `git_diff` built with the same
+# options on that repository (looking up any trees or index in it), or
+# a `git_diff`, whose patches are then generated one by one in the
+# caller's thread.  The callable is called once on `repo` and once for
+# every worker on a repository handle of its own; all the diffs must
+# have the same deltas, so a diff involving the working directory must
+# not be built while it changes.
+#
+# At most `max_pending` deltas are in flight at a time, and no new work
+# is started while the generated but not yet consumed patch texts take
+# more than `max_bytes` bytes.
+#
+# @param diff A git_diff generated by one of the above functions, or a
+#             callable returning a new one for a given repository.
+# @param workers Number of threads; defaults to `os.cpu_count()`
+# @param text Generate the patch text of the deltas
+# @param max_pending Maximum number of deltas in flight
+# @param max_bytes Maximum size of the patch texts held in memory
+# @param repo Repository object the diffs are built for (required if
+#             `diff` is a callable)
+# @return generator of `DiffPatchRecord`
+#
+def diff_patches(diff, workers=None, text=True, max_pending=None, max_bytes=64 << 20,
+                 repo=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = workers * 4
+    with _diff_handles(diff, repo) as diffs:
+        num_deltas = diffs.num_deltas
+        if not diffs.parallel or workers <= 1:
+            for idx in range(num_deltas):
+                yield _diff_patch_record(diffs.diff, idx, text)
+            return
+
+        lock = _threading.Lock()
+        held = [0]
+
+        def patch_record(idx):
+            record = _diff_patch_record(diffs.get(), idx, text)
+            if record.patch:
+                with lock:
+                    held[0] += len(record.patch)
+            return record
+
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            window = _deque()
+            next_idx = 0
+            try:
+                while next_idx < num_deltas or window:
+                    while (next_idx < num_deltas and len(window) < max_pending
+                           and (held[0] < max_bytes or not window)):
+                        window.append(executor.submit(patch_record, next_idx))
+                        next_idx += 1
+                    record = window.popleft().result()
+                    if record.patch:
+                        with lock:
+                            held[0] -= len(record.patch)
+                    yield record
+            finally:
+                for future in window:
+                    future.cancel()
+
+def _diff_patch_record(diff, idx, text=True):
+    patch = ct.POINTER(git_patch)()
+    _git_check(git_patch_from_diff(ct.byref(patch), diff, idx))
+    try:
+        delta = (git_patch_get_delta(patch) if patch
+                 else git_diff_get_delta(diff, idx)).contents
+        old_path = os.fsdecode(delta.old_file.path) if delta.old_file.path else None
+        new_path = os.fsdecode(delta.new_file.path) if delta.new_file.path else None
+        binary   = bool(delta.flags & GIT_DIFF_FLAG_BINARY)
+        if not patch:
+            return DiffPatchRecord(idx, old_path, new_path, None, 0, 0, 0, binary)
+        patch_text = None
+        if text:
+            buf = git_buf()
+            _git_check(git_patch_to_buf(ct.byref(buf), patch))
+            try:
+                patch_text = ct.string_at(buf.ptr, buf.size)
+            finally:
+                git_buf_dispose(ct.byref(buf))
+        context, additions, deletions = ct.c_size_t(), ct.c_size_t(), ct.c_size_t()
+        _git_check(git_patch_line_stats(ct.byref(context), ct.byref(additions),
+                                        ct.byref(deletions), patch))
+        return DiffPatchRecord(idx, old_path, new_path, patch_text,
+                               context.value, additions.value, deletions.value, binary)
+    finally:
+        git_patch_free(patch)
+
+class _diff_handles:
+    # The diff of `diff_patches` and, when it is given as a callable, the
+    # per-thread diffs of its workers, each one built on the per-thread
+    # repository handle of that worker and freed by `close()`.
+
+    def __init__(self, diff, repo=None):
+        self.parallel = callable(diff)
+        self._diffs   = []
+        if not self.parallel:
+            self.diff = diff
+        else:
+            if repo is None:
+                raise ValueError("a repository is required to build the diffs")
+            self._make    = diff
+            self._repos   = _git_repository_handles(repo)
+            self._local   = _threading.local()
+            self._lock    = _threading.Lock()
+            self.diff     = self._make(repo)
+            self._diffs.append(self.diff)
+        self.num_deltas = git_diff_num_deltas(self.diff)
+
+    def get(self):
+        diff = getattr(self._local, "diff", None)
+        if diff is None:
+            diff = self._make(self._repos.get())
+            with self._lock:
+                self._diffs.append(diff)
+            if git_diff_num_deltas(diff) != self.num_deltas:
+                raise GitError(GIT_EMODIFIED, "the diff changed while its patches "
+                                              "were generated")
+            self._local.diff = diff
+        return diff
+
+    def close(self):
+        diffs, self._diffs = self._diffs, []
+        for diff in diffs:
+            git_diff_free(diff)
+        if self.parallel:
+            self._repos.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Internal addition for the high-level helpers of this package.
+#
+# Per-path line statistics of a diff (like `git diff --numstat`): the new
+# paths of the deltas (str) and, in the same order, `array.array`s of the
+# numbers of added and deleted lines and of the binary flags (1 for binary
+# deltas, which have no line statistics).
+#
+DiffNumstat = _namedtuple("DiffNumstat", ("paths", "additions", "deletions", "binary"))
+
+# Compute the per-path insertions and deletions of a diff.
+#
+# The numbers come from `git_patch_line_stats` on the patch of every delta
+# (`diff_patches` without the patch texts), so no line content is ever
+# transferred to Python.  As with `diff_patches`, the deltas are only
+# processed by a pool of threads if `diff` is a callable building a new
+# diff for a given repository.
+#
+# @param diff A git_diff generated by one of the above functions, or a
+#             callable returning a new one for a given repository.
+# @param workers Number of threads; defaults to `os.cpu_count()`
+# @param repo Repository object the diffs are built for (required if
+#             `diff` is a callable)
+# @return `DiffNumstat`
+#
+def diff_numstat(diff, workers=None, repo=None):
+    paths     = []
+    additions = _array.array("Q")
+    deletions = _array.array("Q")
+    binary    = _array.array("B")
+    for record in diff_patches(diff, workers, text=False, repo=repo):
+        paths.append(record.new_path)
+        additions.append(record.additions)
+        deletions.append(record.deletions)
+        binary.append(record.binary)
+    return DiffNumstat(paths, additions, deletions, binary)
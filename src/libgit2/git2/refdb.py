@@ -7,9 +7,36 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import abc as _abc
+import time as _time
+import fnmatch as _fnmatch
+import itertools as _itertools
+import sqlite3 as _sqlite3
+import threading as _threading
+
 from .common import *  # noqa
+from .oid    import git_oid
+from .oid    import _git_oid
 from .types  import git_refdb
 from .types  import git_repository
+from .types  import git_reference
+from .types  import GIT_REFERENCE_DIRECT
+from .errors import GitError, _git_check, git_error_set_str
+from .errors import GIT_ERROR_REFERENCE, GIT_ENOTFOUND, GIT_EEXISTS
+from .errors import GIT_EMODIFIED, GIT_ELOCKED, GIT_ITEROVER
+from .refs   import git_reference_name_to_id, _refs_loose_scan
+from .refs   import git_reference_name, git_reference_type
+from .refs   import git_reference_target, git_reference_symbolic_target
+from .sys.refs import git_reference__alloc as _git_reference__alloc
+from .sys.refs import git_reference__alloc_symbolic as _git_reference__alloc_symbolic
+from .sys.repository import git_repository_set_refdb as _git_repository_set_refdb
+from .sys.refdb_backend import git_refdb_backend as _git_refdb_backend
+from .sys.refdb_backend import git_reference_iterator as _git_reference_iterator
+from .sys.refdb_backend import git_refdb_init_backend as _git_refdb_init_backend
+from .sys.refdb_backend import git_refdb_set_backend as _git_refdb_set_backend
+from .sys.refdb_backend import GIT_REFDB_BACKEND_VERSION as _GIT_REFDB_BACKEND_VERSION
+from .repository import git_repository_path, git_repository_commondir
+from .repository import git_repository_open, git_repository_free
 
 # @file git2/refdb.h
 # @brief Git custom refs backend functions
@@ -75,3 +102,506 @@ git_refdb_free = CFUNC(None,
     (1, "refdb"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Compact (`git_refdb_compress`, i.e. pack the loose references of) the
+# reference database of a repository when a policy says so: when there
+# are at least `max_loose` loose references, or when there is at least
+# one and `packed-refs` is older than `max_age` seconds (if not None).
+#
+# `run()` checks the policy and compacts if due; `start()` does it every
+# `interval` seconds in a background (daemon) thread until `stop()`.  The
+# compaction runs on a private repository handle; the libgit2 files
+# backend only holds the `packed-refs` lock while writing and leaves the
+# loose references being updated concurrently in place, and a compaction
+# that finds the lock taken is skipped until the next check.
+#
+# Each compaction is recorded in `history` (the last `max_history`), with
+# the mean latency of looking up a sample of up to `sample_size` of the
+# loose references (on a fresh handle) before and after it.
+#
+# @param repo the repository
+# @param max_loose number of loose references which triggers a compaction
+# @param max_age age (seconds) of `packed-refs` which triggers a compaction
+# @param interval seconds between the checks of the background thread
+# @param sample_size number of references timed before and after
+#
+class RefdbMaintenance:
+
+    def __init__(self, repo, max_loose=1000, max_age=None, interval=60.0,
+                 sample_size=100, max_history=100):
+        self.max_loose   = max_loose
+        self.max_age     = max_age
+        self.interval    = interval
+        self.sample_size = sample_size
+        self.max_history = max_history
+        self.history = []
+        self.errors  = []
+        self._path      = git_repository_path(repo)
+        self._commondir = os.fsdecode(git_repository_commondir(repo))
+        self._lock   = _threading.Lock()
+        self._stop   = _threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # @return list of the names (bytes) of the loose references
+    #
+    def loose_refs(self):
+        return _refs_loose_scan(self._commondir, "refs/")[1]
+
+    # @return age (seconds) of `packed-refs`, or None if there is none
+    #
+    def packed_age(self):
+        try:
+            return _time.time() - os.stat(os.path.join(self._commondir,
+                                                       "packed-refs")).st_mtime
+        except FileNotFoundError:
+            return None
+
+    # @return the reason why a compaction is due ("loose" or "age"), or None
+    #
+    def due(self, loose=None):
+        count = len(self.loose_refs() if loose is None else loose)
+        if self.max_loose is not None and count >= self.max_loose:
+            return "loose"
+        if self.max_age is not None and count:
+            age = self.packed_age()
+            if age is None or age >= self.max_age:
+                return "age"
+        return None
+
+    # Compact if due (or anyway with `force`).
+    #
+    # @return the record of the compaction (also appended to `history`),
+    #         or None if none was due or the `packed-refs` lock was taken
+    #
+    def run(self, force=False):
+        with self._lock:
+            loose = self.loose_refs()
+            reason = "forced" if force else self.due(loose)
+            if reason is None:
+                return None
+            sample = loose[:self.sample_size]
+            latency_before = self._latency(sample)
+            start = _time.perf_counter()
+            repo  = ct.POINTER(git_repository)()
+            refdb = ct.POINTER(git_refdb)()
+            try:
+                _git_check(git_repository_open(ct.byref(repo), self._path))
+                _git_check(git_refdb_open(ct.byref(refdb), repo))
+                error = git_refdb_compress(refdb)
+                if error == GIT_ELOCKED:
+                    return None
+                _git_check(error)
+            finally:
+                git_refdb_free(refdb)
+                git_repository_free(repo)
+            duration = _time.perf_counter() - start
+            record = dict(time=_time.time(), reason=reason, duration=duration,
+                          loose_before=len(loose), loose_after=len(self.loose_refs()),
+                          latency_before=latency_before,
+                          latency_after=self._latency(sample))
+            self.history.append(record)
+            del self.history[:-self.max_history]
+            return record
+
+    # Start checking (and compacting) in a background thread.
+    #
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = _threading.Thread(target=self._loop, daemon=True,
+                                         name="RefdbMaintenance")
+        self._thread.start()
+
+    # Stop the background thread (waiting for a running compaction).
+    #
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except GitError as exc:
+                self.errors.append(exc)
+                del self.errors[:-self.max_history]
+
+    def _latency(self, names):
+        # Mean time (seconds) of looking up `names` on a fresh handle.
+        if not names:
+            return None
+        repo = ct.POINTER(git_repository)()
+        _git_check(git_repository_open(ct.byref(repo), self._path))
+        try:
+            oid = git_oid()
+            start = _time.perf_counter()
+            for name in names:
+                git_reference_name_to_id(ct.byref(oid), repo, name)
+            return (_time.perf_counter() - start) / len(names)
+        finally:
+            git_repository_free(repo)
+
+# Base class of the reference databases implemented in Python.
+#
+# It does the wiring of the `git_refdb_backend` callbacks (the semantics
+# of the filesystem backend: expected old values, existence and
+# directory/file conflicts, locks for transactions), and a subclass only
+# implements the storage:
+#
+#   lookup(name)            value of `name`: raw OID (bytes), symbolic target
+#                           (str) or None
+#   names(glob=None)        iterable of the names (str) matching `glob`
+#                           (`fnmatch` semantics, as `wildmatch` without
+#                           WM_PATHNAME)
+#   store(name, value)      create or replace `name`
+#   remove(name)            remove `name`
+#   compress()              optional
+#
+# The storage methods are called with the backend's lock held.  Install the
+# backend on a repository with `install(repo)`; the refdb of the repository
+# then owns it (one repository per backend).
+#
+# The backends keep no reflogs: libgit2 offers no way to allocate a
+# `git_reflog` outside of its own backends, so none could be returned by
+# `git_reflog_read`.  No reference has a reflog (`git_reference_has_log`),
+# updates are not logged, `git_reflog_read` fails with `GIT_ENOTFOUND`
+# and `git_reference_ensure_log` with an error.
+#
+class RefdbBackend(_abc.ABC):
+
+    _alive = set()
+
+    def __init__(self):
+        self._mutex  = _threading.RLock()
+        self._locked = {}  # payload: name
+        self._payloads = _itertools.count(1)
+        self._iterators = {}
+        self._backend = _git_refdb_backend()
+        _git_check(_git_refdb_init_backend(ct.byref(self._backend),
+                                           _GIT_REFDB_BACKEND_VERSION))
+        callbacks = dict(_git_refdb_backend._fields_)
+        methods = ["exists", "lookup", "iterator", "write", "rename", "del",
+                   "has_log", "ensure_log", "free", "reflog_read", "reflog_write",
+                   "reflog_rename", "reflog_delete", "lock", "unlock"]
+        if type(self).compress is not RefdbBackend.compress:
+            methods.append("compress")
+        self._callbacks = {name: callbacks[name](_refdb_callback(getattr(self, "_" + name)))
+                           for name in methods}
+        for name, callback in self._callbacks.items():
+            setattr(self._backend, name, callback)
+
+    @_abc.abstractmethod
+    def lookup(self, name):
+        pass
+
+    @_abc.abstractmethod
+    def names(self, glob=None):
+        pass
+
+    @_abc.abstractmethod
+    def store(self, name, value):
+        pass
+
+    @_abc.abstractmethod
+    def remove(self, name):
+        pass
+
+    def compress(self):
+        pass
+
+    # Make this backend the reference database of `repo`.
+    #
+    def install(self, repo):
+        if self in RefdbBackend._alive:
+            raise GitError(GIT_EEXISTS, "the refdb backend is already installed")
+        refdb = ct.POINTER(git_refdb)()
+        _git_check(git_refdb_new(ct.byref(refdb), repo))
+        try:
+            _git_check(_git_refdb_set_backend(refdb, ct.byref(self._backend)))
+            RefdbBackend._alive.add(self)
+            _git_check(_git_repository_set_refdb(repo, refdb))
+        finally:
+            git_refdb_free(refdb)
+
+    # Callbacks
+
+    def _exists(self, exists, backend, ref_name):
+        with self._mutex:
+            exists[0] = self.lookup(ref_name.decode("utf-8")) is not None
+        return 0
+
+    def _lookup(self, out, backend, ref_name):
+        with self._mutex:
+            value = self.lookup(ref_name.decode("utf-8"))
+        if value is None:
+            raise GitError(GIT_ENOTFOUND,
+                           "reference '{}' not found".format(ref_name.decode("utf-8")))
+        out[0] = _refdb_alloc(ref_name, value)
+        return 0
+
+    def _iterator(self, out, backend, glob):
+        with self._mutex:
+            # As on disk, only the references under "refs/" are iterated.
+            names = [name.encode("utf-8")
+                     for name in self.names(None if glob is None else glob.decode("utf-8"))
+                     if name.startswith("refs/")]
+        iterator = _RefdbIterator(self, names)
+        self._iterators[ct.addressof(iterator.iterator)] = iterator
+        out[0] = ct.pointer(iterator.iterator)
+        return 0
+
+    def _write(self, backend, ref, force, who, message, old, old_target):
+        name, value = _refdb_ref_value(ref)
+        with self._mutex:
+            if name in self._locked.values():
+                raise GitError(GIT_ELOCKED, "reference '{}' is locked".format(name))
+            current = self.lookup(name)
+            self._check_old(name, current, old, old_target)
+            if not force and current is not None:
+                raise GitError(GIT_EEXISTS,
+                               "a reference with the name '{}' already exists".format(name))
+            self._check_available(name)
+            self.store(name, value)
+        return 0
+
+    def _rename(self, out, backend, old_name, new_name, force, who, message):
+        old, new = old_name.decode("utf-8"), new_name.decode("utf-8")
+        with self._mutex:
+            value = self.lookup(old)
+            if value is None:
+                raise GitError(GIT_ENOTFOUND, "reference '{}' not found".format(old))
+            if not force and self.lookup(new) is not None:
+                raise GitError(GIT_EEXISTS,
+                               "a reference with the name '{}' already exists".format(new))
+            self.remove(old)
+            try:
+                self._check_available(new)
+            except GitError:
+                self.store(old, value)
+                raise
+            self.store(new, value)
+        out[0] = _refdb_alloc(new_name, value)
+        return 0
+
+    def _del(self, backend, ref_name, old_id, old_target):
+        name = ref_name.decode("utf-8")
+        with self._mutex:
+            if name in self._locked.values():
+                raise GitError(GIT_ELOCKED, "reference '{}' is locked".format(name))
+            current = self.lookup(name)
+            if current is None:
+                raise GitError(GIT_ENOTFOUND, "reference '{}' not found".format(name))
+            self._check_old(name, current, old_id, old_target)
+            self.remove(name)
+        return 0
+
+    def _compress(self, backend):
+        with self._mutex:
+            self.compress()
+        return 0
+
+    def _has_log(self, backend, refname):
+        return 0
+
+    def _ensure_log(self, backend, refname):
+        raise GitError(-1, "reflogs are not supported by Python refdb backends")
+
+    def _free(self, backend):
+        for iterator in list(self._iterators.values()):
+            iterator._free(None)
+        RefdbBackend._alive.discard(self)
+
+    def _reflog_read(self, out, backend, name):
+        raise GitError(GIT_ENOTFOUND,
+                       "reference '{}' has no reflog".format(name.decode("utf-8")))
+
+    def _reflog_write(self, backend, reflog):
+        raise GitError(-1, "reflogs are not supported by Python refdb backends")
+
+    def _reflog_rename(self, backend, old_name, new_name):
+        return 0
+
+    def _reflog_delete(self, backend, name):
+        return 0
+
+    def _lock(self, payload_out, backend, refname):
+        name = refname.decode("utf-8")
+        with self._mutex:
+            if name in self._locked.values():
+                raise GitError(GIT_ELOCKED, "reference '{}' is locked".format(name))
+            payload = next(self._payloads)
+            self._locked[payload] = name
+        payload_out[0] = payload
+        return 0
+
+    def _unlock(self, backend, payload, success, update_reflog, ref, sig, message):
+        with self._mutex:
+            name = self._locked.pop(payload, None)
+            if name is None or not success:
+                return 0
+            if success == 2:
+                self.remove(name)
+            else:
+                name, value = _refdb_ref_value(ref)
+                self._check_available(name)
+                self.store(name, value)
+        return 0
+
+    # Helpers
+
+    def _check_old(self, name, current, old_id, old_target):
+        if old_id:
+            if current != bytes(old_id.contents.id):
+                raise GitError(GIT_EMODIFIED,
+                               "old reference value does not match for '{}'".format(name))
+        elif old_target is not None:
+            if current != old_target.decode("utf-8"):
+                raise GitError(GIT_EMODIFIED,
+                               "old reference value does not match for '{}'".format(name))
+
+    def _check_available(self, name):
+        # A reference cannot be a "directory" of another one (as on disk).
+        parts = name.split("/")
+        for end in range(1, len(parts)):
+            if self.lookup("/".join(parts[:end])) is not None:
+                break
+        else:
+            if not any(True for _ in self.names(name + "/*")):
+                return
+        raise GitError(GIT_EEXISTS, "path to reference '{}' collides "
+                                    "with existing one".format(name))
+
+class _RefdbIterator:
+
+    def __init__(self, backend, names):
+        self.backend = backend
+        self.names = names
+        self.position = 0
+        self.current = None
+        callbacks = dict(_git_reference_iterator._fields_)
+        self.callbacks = (callbacks["next"](_refdb_callback(self._next)),
+                          callbacks["next_name"](_refdb_callback(self._next_name)),
+                          callbacks["free"](self._free))
+        self.iterator = _git_reference_iterator(None, *self.callbacks)
+
+    def _advance(self):
+        # Skip the references removed since the iterator was created.
+        with self.backend._mutex:
+            while self.position < len(self.names):
+                name = self.names[self.position]
+                self.position += 1
+                value = self.backend.lookup(name.decode("utf-8"))
+                if value is not None:
+                    return name, value
+        raise GitError(GIT_ITEROVER, None)
+
+    def _next(self, ref, iter):
+        name, value = self._advance()
+        ref[0] = _refdb_alloc(name, value)
+        return 0
+
+    def _next_name(self, ref_name, iter):
+        self.current = self._advance()[0]
+        ref_name[0] = self.current
+        return 0
+
+    def _free(self, iter):
+        self.backend._iterators.pop(ct.addressof(self.iterator), None)
+
+def _refdb_callback(func):
+    # Report the exceptions of a callback to libgit2 as its error code.
+    def callback(*args):
+        try:
+            return func(*args)
+        except GitError as exc:
+            if exc.code != GIT_ITEROVER:
+                git_error_set_str(GIT_ERROR_REFERENCE, str(exc).encode("utf-8"))
+            return exc.code
+        except Exception as exc:
+            git_error_set_str(GIT_ERROR_REFERENCE,
+                              "{}: {}".format(type(exc).__name__, exc).encode("utf-8"))
+            return -1
+    return callback
+
+def _refdb_alloc(name, value):
+    if isinstance(value, bytes):
+        return _git_reference__alloc(name, ct.byref(_git_oid(value)), None)
+    return _git_reference__alloc_symbolic(name, value.encode("utf-8"))
+
+def _refdb_ref_value(ref):
+    name = git_reference_name(ref).decode("utf-8")
+    if git_reference_type(ref) == GIT_REFERENCE_DIRECT:
+        return name, bytes(git_reference_target(ref).contents.id)
+    return name, git_reference_symbolic_target(ref).decode("utf-8")
+
+# Reference database kept in memory (e.g. for tests and ephemeral
+# repositories).
+#
+class MemoryRefdbBackend(RefdbBackend):
+
+    def __init__(self, refs=None):
+        super().__init__()
+        self.refs = dict(refs or {})
+
+    def lookup(self, name):
+        return self.refs.get(name)
+
+    def names(self, glob=None):
+        names = sorted(self.refs)
+        if glob is None:
+            return names
+        return [name for name in names if _fnmatch.fnmatchcase(name, glob)]
+
+    def store(self, name, value):
+        self.refs[name] = value
+
+    def remove(self, name):
+        self.refs.pop(name, None)
+
+# Reference database kept in a SQLite database (`path`, or in memory by
+# default).
+#
+class SQLiteRefdbBackend(RefdbBackend):
+
+    def __init__(self, path=":memory:"):
+        super().__init__()
+        self.db = _sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS refs (
+                name TEXT PRIMARY KEY, oid BLOB, symbolic TEXT);
+        """)
+
+    def lookup(self, name):
+        row = self.db.execute("SELECT oid, symbolic FROM refs WHERE name = ?",
+                              (name,)).fetchone()
+        return None if row is None else (row[0] if row[0] is not None else row[1])
+
+    def names(self, glob=None):
+        if glob is None:
+            rows = self.db.execute("SELECT name FROM refs ORDER BY name")
+        else:
+            rows = self.db.execute("SELECT name FROM refs WHERE name GLOB ? ORDER BY name",
+                                   (glob,))
+        return [row[0] for row in rows]
+
+    def store(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO refs VALUES (?, ?, ?)",
+                        (name, value, None) if isinstance(value, bytes)
+                        else (name, None, value))
+
+    def remove(self, name):
+        self.db.execute("DELETE FROM refs WHERE name = ?", (name,))
+
+    def close(self):
+        self.db.close()
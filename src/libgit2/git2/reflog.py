@@ -7,12 +7,21 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import re as _re
+import time as _time
+import array as _array
+import binascii as _binascii
+
 from .common import *  # noqa
 from .oid    import git_oid
+from .oid    import GIT_OID_SHA1_SIZE
 from .types  import git_signature
 from .types  import git_repository
 from .types  import git_reflog
 from .types  import git_reflog_entry
+from .errors import GitError
+from .errors import GIT_ELOCKED
+from .repository import git_repository_path, git_repository_commondir
 
 # @file git2/reflog.h
 # @brief Git reflog management routines
@@ -212,3 +221,148 @@ git_reflog_free = CFUNC(None,
     (1, "reflog"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Entries of a reflog as columns, most recent first (the order of
+# `git_reflog_entry_byindex`): the raw old and new OIDs packed one after
+# another in `old_ids` and `new_ids`, the committer `names` and `emails`,
+# the `times` (array of seconds since the epoch), the `offsets` (array of
+# timezone offsets in minutes) and the `messages` (str lists).
+#
+class ReflogColumns:
+
+    __slots__ = ("old_ids", "new_ids", "names", "emails", "times", "offsets",
+                 "messages", "oid_size")
+
+    def __init__(self, old_ids, new_ids, names, emails, times, offsets, messages,
+                 oid_size=GIT_OID_SHA1_SIZE):
+        self.old_ids  = old_ids
+        self.new_ids  = new_ids
+        self.names    = names
+        self.emails   = emails
+        self.times    = times
+        self.offsets  = offsets
+        self.messages = messages
+        self.oid_size = oid_size
+
+    def __len__(self):
+        return len(self.names)
+
+    # @return (old id (hex str), new id (hex str), name, email, time, offset,
+    #          message)
+    #
+    def __getitem__(self, idx):
+        idx = range(len(self.names))[idx]
+        start, end = idx * self.oid_size, (idx + 1) * self.oid_size
+        return (self.old_ids[start:end].hex(), self.new_ids[start:end].hex(),
+                self.names[idx], self.emails[idx], self.times[idx], self.offsets[idx],
+                self.messages[idx])
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self.names)))
+
+# Read the reflog of the reference `name` in bulk, as columns.
+#
+# The log file is parsed in one pass instead of going through
+# `git_reflog_read` and five calls per entry.  This assumes the default
+# (files) refdb; a reference without a reflog gives no entries.
+#
+# @param repo the repository
+# @param name name of the reference (e.g. "HEAD", "refs/heads/main")
+# @return `ReflogColumns`
+#
+def reflog_columns(repo, name):
+    try:
+        with open(_reflog_path(repo, name), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = b""
+    records = _reflog_re.findall(data)
+    records.reverse()
+    if not records:
+        return ReflogColumns(b"", b"", [], [], _array.array("q"), _array.array("i"), [])
+    old_ids, new_ids, names, emails, times, offsets, messages = (
+        [record[column] for record in records] for column in range(7))
+    zones = {offset: _reflog_offset(offset) for offset in set(offsets)}
+    return ReflogColumns(_binascii.unhexlify(b"".join(old_ids)),
+                         _binascii.unhexlify(b"".join(new_ids)),
+                         _reflog_decode(names), _reflog_decode(emails),
+                         _array.array("q", map(int, times)),
+                         _array.array("i", map(zones.__getitem__, offsets)),
+                         _reflog_decode(messages), len(old_ids[0]) // 2)
+
+# Expire the entries of the reflog of the reference `name` older than
+# `max_age` seconds and/or beyond the `max_count` most recent ones (as
+# `git reflog expire --expire=<time>` and a count limit would).
+#
+# The kept entries are written to a new log in one pass, replacing the old
+# one atomically, instead of one `git_reflog_drop` per entry.  As git does,
+# the reference is locked meanwhile, so that no update appends to the log
+# being rewritten; GitError(GIT_ELOCKED) is raised if it is already locked.
+# This assumes the default (files) refdb.
+#
+# @param repo the repository
+# @param name name of the reference
+# @param max_age maximum age (seconds) of the kept entries, or None
+# @param max_count maximum number of kept entries, or None
+# @param now reference time (seconds since the epoch); defaults to now
+# @return the number of entries removed
+#
+def reflog_expire(repo, name, max_age=None, max_count=None, now=None):
+    path = _reflog_path(repo, name)
+    lock_path = os.path.join(_reflog_refs_dir(repo, name), name) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    try:
+        lock = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        raise GitError(GIT_ELOCKED, "failed to lock reference '{}': "
+                                    "the lock file '{}' exists".format(name, lock_path))
+    try:
+        try:
+            with open(path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+        except FileNotFoundError:
+            return 0
+        kept = lines
+        if max_age is not None:
+            cutoff = (_time.time() if now is None else now) - max_age
+            kept = [line for line in kept if _reflog_time(line) >= cutoff]
+        if max_count is not None:
+            kept = kept[max(0, len(kept) - max_count):] if max_count else []
+        removed = len(lines) - len(kept)
+        if removed:
+            with open(path + ".lock", "xb") as f:
+                f.write(b"".join(kept))
+            os.replace(path + ".lock", path)
+        return removed
+    finally:
+        os.close(lock)
+        os.unlink(lock_path)
+
+_reflog_re = _re.compile(rb"^([0-9a-f]+) ([0-9a-f]+) ([^<\n]*?) ?<([^>\n]*)> "
+                         rb"(\d+) ([+-]\d{4})(?:\t([^\n]*))?$", _re.M)
+
+def _reflog_refs_dir(repo, name):
+    # Per-worktree references live in the git directory of the worktree.
+    if "/" not in name or name.startswith(("refs/bisect/", "refs/worktree/",
+                                           "refs/rewritten/")):
+        return os.fsdecode(git_repository_path(repo))
+    return os.fsdecode(git_repository_commondir(repo))
+
+def _reflog_path(repo, name):
+    return os.path.join(_reflog_refs_dir(repo, name), "logs", name)
+
+def _reflog_decode(column):
+    return b"\n".join(column).decode("utf-8", "replace").split("\n")
+
+def _reflog_offset(offset):
+    minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+    return -minutes if offset[:1] == b"-" else minutes
+
+def _reflog_time(line):
+    # Time of a reflog line; unparsable lines are kept.
+    try:
+        return int(line.partition(b"\t")[0].rsplit(b" ", 2)[1])
+    except (IndexError, ValueError):
+        return float("inf")
@@ -7,15 +7,24 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import re as _re
+import binascii as _binascii
+
 from .common   import *  # noqa
 from .strarray import git_strarray
 from .oid      import git_oid
+from .oid      import GIT_OID_SHA1_SIZE
 from .types    import git_object_t
 from .types    import git_object
+from .types    import GIT_OBJECT_ANY
 from .types    import git_repository
 from .types    import git_reference_t
 from .types    import git_reference
 from .types    import git_reference_iterator
+from .errors   import _git_check
+from .errors   import GIT_ENOTFOUND
+from .object   import git_object_id, git_object_free
+from .repository import git_repository_commondir
 
 # @file git2/refs.h
 # @brief Git reference management routines
@@ -939,3 +948,226 @@ git_reference_shorthand = CFUNC(ct.c_char_p,
     (1, "ref"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# References listed by `list_refs`, in name order: `names` (str), and the
+# raw OIDs of their targets (and, if peeled, of the objects they peel to)
+# packed one after another in the `targets` (and `peeled`) bytes.
+#
+class RefList:
+
+    __slots__ = ("names", "targets", "peeled", "oid_size")
+
+    def __init__(self, names, targets, peeled=None, oid_size=GIT_OID_SHA1_SIZE):
+        self.names    = names
+        self.targets  = targets
+        self.peeled   = peeled
+        self.oid_size = oid_size
+
+    def __len__(self):
+        return len(self.names)
+
+    # @return (name, target (hex str), peeled target (hex str) or None), or
+    #         for a slice, the `RefList` of the references in it
+    #
+    def __getitem__(self, idx):
+        size = self.oid_size
+        if isinstance(idx, slice):
+            indices = range(len(self.names))[idx]
+            return RefList(self.names[idx],
+                           b"".join(self.targets[i * size:(i + 1) * size]
+                                    for i in indices),
+                           None if self.peeled is None else
+                           b"".join(self.peeled[i * size:(i + 1) * size]
+                                    for i in indices), size)
+        name = self.names[idx]
+        idx  = range(len(self.names))[idx] * size
+        end  = idx + size
+        return (name, self.targets[idx:end].hex(),
+                None if self.peeled is None else self.peeled[idx:end].hex())
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self.names)))
+
+# List the references whose names start with `prefix`, with their target
+# OIDs (and with `peel`, the OIDs of the objects they peel to).
+#
+# The references are read in bulk from the files of the repository:
+# `packed-refs` (only the range of the prefix when the file is sorted, its
+# peeled values when it has them) and the loose references under the
+# prefix, which take precedence.  Only symbolic references and the peeling
+# of the rest go through libgit2.  This assumes the default (files) refdb.
+#
+# With a `cache` (any mutable mapping, e.g. a dict kept across calls), the
+# result is reused while the modification times of `packed-refs` and of
+# the loose references directories under the prefix do not change.
+#
+# @param repo the repository
+# @param prefix prefix of the reference names (e.g. "refs/pull/")
+# @param peel whether to peel the references
+# @param cache mapping of the snapshots
+# @return `RefList`
+#
+def list_refs(repo, prefix="refs/", peel=False, cache=None):
+    commondir = os.fsdecode(git_repository_commondir(repo))
+    bprefix = prefix.encode("utf-8")
+    packed_path = os.path.join(commondir, "packed-refs")
+    try:
+        st = os.stat(packed_path)
+        packed_stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    except FileNotFoundError:
+        packed_stamp = None
+    loose_dirs, loose_files = _refs_loose_scan(commondir, prefix)
+    stamp = (packed_stamp, loose_dirs)
+    key = (commondir, prefix, bool(peel))
+    if cache is not None:
+        snapshot = cache.get(key)
+        if snapshot is not None and snapshot[0] == stamp:
+            return snapshot[1]
+
+    # Columns of the hex targets and peeled targets (None if unknown).
+    names, targets, peeled = [], [], []
+    if packed_stamp is not None:
+        with open(packed_path, "rb") as f:
+            data = f.read()
+        records = _refs_packed_records(data, bprefix)
+        names   = [record[1] for record in records]
+        targets = [record[0] for record in records]
+        header = data[:data.find(b"\n")] if data.startswith(b"# pack-refs with:") else b""
+        traits = header.split()
+        if b"fully-peeled" in traits:
+            peeled = [record[2] or record[0] for record in records]
+        elif b"peeled" in traits:
+            peeled = [record[2] or (record[0] if record[1].startswith(b"refs/tags/")
+                                    else None) for record in records]
+        else:
+            peeled = [record[2] or None for record in records]
+        del data, records
+    if loose_files:
+        position = {name: idx for idx, name in enumerate(names)}
+        count = len(names)
+        for name in loose_files:
+            try:
+                with open(os.path.join(commondir, os.fsdecode(name)), "rb") as f:
+                    content = f.read().strip()
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            if content.startswith(b"ref:"):
+                target = _refs_resolve(repo, name)
+                if target is None:
+                    # A dangling symbolic reference hides a packed one.
+                    if name in position: targets[position[name]] = None
+                    continue
+                target = target.hex().encode("ascii")
+            elif _re.fullmatch(rb"[0-9a-f]+", content):
+                target = content
+            else:
+                continue
+            idx = position.get(name)
+            if idx is None:
+                position[name] = len(names)
+                names.append(name)
+                targets.append(target)
+                peeled.append(None)
+            else:
+                targets[idx] = target
+                peeled[idx]  = None
+        if len(names) > count or None in targets:
+            order   = sorted((idx for idx in range(len(names)) if targets[idx] is not None),
+                             key=names.__getitem__)
+            names   = [names[idx]   for idx in order]
+            targets = [targets[idx] for idx in order]
+            peeled  = [peeled[idx]  for idx in order]
+
+    oid_size = len(targets[0]) // 2 if targets else GIT_OID_SHA1_SIZE
+    if peel:
+        peeled = _binascii.unhexlify(b"".join(
+                 peeled[idx] or _refs_peeled(repo, names[idx]).hex().encode("ascii")
+                 for idx in range(len(names))))
+    else:
+        peeled = None
+    result = RefList(b"\n".join(names).decode("utf-8").split("\n") if names else [],
+                     _binascii.unhexlify(b"".join(targets)), peeled, oid_size)
+    if cache is not None:
+        cache[key] = (stamp, result)
+    return result
+
+_refs_packed_re = _re.compile(rb"^([0-9a-f]+) ([^\n]*)\n(?:\^([0-9a-f]+)\n)?", _re.M)
+
+def _refs_packed_records(data, prefix):
+    # Records (target, name, peeled) of the packed refs starting with
+    # `prefix`; binary searched if the file is sorted.
+    body = data.find(b"\n") + 1 if data.startswith(b"#") else 0
+    header = data[:body]
+    if b" sorted" not in header:
+        return [record for record in _refs_packed_re.findall(data, body)
+                if record[1].startswith(prefix)]
+    start = _refs_packed_seek(data, body, prefix)
+    end   = _refs_packed_seek(data, start, prefix + b"\xff")
+    return _refs_packed_re.findall(data[start:end])
+
+def _refs_packed_seek(data, lo, name):
+    # Offset of the first record of sorted packed-refs `data` (from offset
+    # `lo`, a record start) whose name is not lower than `name`.
+    hi = len(data)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos = data.rfind(b"\n", lo, mid) + 1 or lo
+        if data[pos:pos + 1] == b"^":
+            pos = data.rfind(b"\n", lo, pos - 1) + 1 or lo
+        name_start = data.find(b" ", pos) + 1
+        name_end   = data.find(b"\n", name_start)
+        if name_end < 0: name_end = len(data)
+        if data[name_start:name_end] < name:
+            lo = name_end + 1
+            if data[lo:lo + 1] == b"^":
+                lo = data.find(b"\n", lo) + 1 or len(data)
+        else:
+            hi = pos
+    return min(lo, len(data))
+
+def _refs_loose_scan(commondir, prefix):
+    # Directories (with their modification times) and files of the loose
+    # references which may start with `prefix`.
+    # The loose references are all under refs/, whatever the prefix.
+    top = prefix.rpartition("/")[0] if "/" in prefix else "refs"
+    dirs, files = [], []
+    pending = [top]
+    while pending:
+        reldir = pending.pop()
+        path = os.path.join(commondir, reldir)
+        try:
+            dirs.append((reldir, os.stat(path).st_mtime_ns))
+            entries = list(os.scandir(path))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for entry in entries:
+            name = reldir + "/" + entry.name if reldir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if name.startswith(prefix) or prefix.startswith(name + "/"):
+                    pending.append(name)
+            elif name.startswith(prefix) and not name.endswith(".lock"):
+                files.append(name.encode("utf-8"))
+    return tuple(sorted(dirs)), files
+
+def _refs_resolve(repo, name):
+    oid = git_oid()
+    error = git_reference_name_to_id(ct.byref(oid), repo, name)
+    if error == GIT_ENOTFOUND:
+        return None
+    _git_check(error)
+    return bytes(oid.id)
+
+def _refs_peeled(repo, name):
+    ref = ct.POINTER(git_reference)()
+    _git_check(git_reference_lookup(ct.byref(ref), repo, name))
+    try:
+        obj = ct.POINTER(git_object)()
+        _git_check(git_reference_peel(ct.byref(obj), ref, GIT_OBJECT_ANY))
+        try:
+            return bytes(git_object_id(obj).contents.id)
+        finally:
+            git_object_free(obj)
+    finally:
+        git_reference_free(ref)
@@ -7,6 +7,8 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+
 from .common import *  # noqa
 from .buffer import git_buf
 from .oid    import git_oid_t
@@ -20,6 +22,7 @@ from .types  import git_refdb
 from .types  import git_index
 from .types  import git_worktree
 from .types  import git_annotated_commit
+from .errors import _git_check
 
 # @file git2/repository.h
 # @brief Git repository management routines
@@ -1108,3 +1111,42 @@ git_repository_oid_type = CFUNC(git_oid_t,
     (1, "repo"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# A set of per-thread handles to one repository.
+#
+# libgit2 objects must not be used from several threads at the same time,
+# so the parallel helpers give every worker thread its own handle, opened
+# on the git directory of `repo` on first use and freed by `close()`.
+#
+class _git_repository_handles:
+
+    def __init__(self, repo):
+        self._path    = git_repository_path(repo)
+        self._local   = _threading.local()
+        self._lock    = _threading.Lock()
+        self._handles = []
+
+    def get(self):
+        handle = getattr(self._local, "repo", None)
+        if handle is None:
+            handle = ct.POINTER(git_repository)()
+            _git_check(git_repository_open(ct.byref(handle), self._path))
+            self._local.repo = handle
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def close(self):
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for handle in handles:
+            git_repository_free(handle)
+        self._local = _threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -7,10 +7,23 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import re as _re
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common import *  # noqa
 from .types  import git_object
 from .types  import git_repository
 from .types  import git_reference
+from .types  import GIT_REFERENCE_SYMBOLIC
+from .errors import GitError, _git_check
+from .object import git_object_id, git_object_free
+from .refs   import git_reference_lookup
+from .refs   import git_reference_name, git_reference_type, git_reference_symbolic_target
+from .refs   import git_reference_free
+from .repository import git_repository_path, git_repository_commondir
+from .repository import _git_repository_handles
 
 # @file git2/revparse.h
 # @brief Git revision parsing routines
@@ -119,3 +132,171 @@ git_revparse = CFUNC(ct.c_int,
     (1, "spec"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Resolve revision strings (as `git_revparse_single`) to object ids, with
+# a LRU cache of the results.
+#
+# An expression starting from a full OID (e.g. "<oid>^{tree}", "<oid>~2")
+# is immutable and stays cached.  Any other cached result is keyed by the
+# state of the references it depends on: the loose files the leading name
+# may resolve to (the `git_reference_dwim` rules), the targets of the
+# symbolic references on the way, `packed-refs`, and for "<ref>@{n}" the
+# reflogs; the result is reused while none of these files changed.  The
+# expressions whose result depends on something else (the index, all the
+# references, the configuration, the time...: ":path", ":/text",
+# "<ref>@{upstream}", "@{-n}", "<ref>@{yesterday}", abbreviated OIDs) are
+# resolved each time.  This assumes the
+# default (files) refdb.
+#
+# Resolutions may run concurrently from several threads (see
+# `resolve_many`); each thread uses its own repository handle.
+#
+# @param repo the repository
+# @param max_entries maximum number of results kept in the cache
+#
+class RevparseCache:
+
+    def __init__(self, repo, max_entries=1024):
+        self.max_entries = max_entries
+        self.stats    = dict(hits=0, misses=0)
+        self._gitdir    = os.fsdecode(git_repository_path(repo))
+        self._commondir = os.fsdecode(git_repository_commondir(repo))
+        self._entries = _OrderedDict()
+        self._lock    = _threading.Lock()
+        self._handles = _git_repository_handles(repo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Resolve the revision string `spec`.
+    #
+    # @return the id (hex str) of the object `spec` designates
+    # @raise GitError if `spec` is invalid, ambiguous or not found
+    #
+    def resolve(self, spec):
+        with self._lock:
+            entry = self._entries.get(spec)
+        if entry is not None and (entry[1] is None or
+                                  all(_revparse_stamp(path) == stamp
+                                      for path, stamp in entry[1])):
+            with self._lock:
+                if spec in self._entries:
+                    self._entries.move_to_end(spec)
+                self.stats["hits"] += 1
+            return entry[0]
+        repo = self._handles.get()
+        bspec = spec.encode("utf-8")
+        if _revparse_oid_re.match(bspec):
+            deps, cacheable = None, True
+        else:
+            paths = self._dependencies(repo, bspec)
+            deps = (None if paths is None else
+                    tuple((path, _revparse_stamp(path)) for path in paths))
+            cacheable = deps is not None
+        obj = ct.POINTER(git_object)()
+        _git_check(git_revparse_single(ct.byref(obj), repo, bspec))
+        try:
+            oid = bytes(git_object_id(obj).contents.id).hex()
+        finally:
+            git_object_free(obj)
+        with self._lock:
+            self.stats["misses"] += 1
+            if cacheable:
+                self._entries[spec] = (oid, deps)
+                self._entries.move_to_end(spec)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return oid
+
+    # Resolve many revision strings on a pool of `workers` threads
+    # (defaults to `os.cpu_count()`).
+    #
+    # @return list of the object ids (hex str, or the `GitError` raised for
+    #         the revision string), in the order of `specs`
+    #
+    def resolve_many(self, specs, workers=None):
+        def resolve(spec):
+            try:
+                return self.resolve(spec)
+            except GitError as exc:
+                return exc
+        specs = list(specs)
+        unique = list(dict.fromkeys(specs))
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip(unique, executor.map(resolve, unique)))
+        return [results[spec] for spec in specs]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        self.clear()
+        self._handles.close()
+
+    def _dependencies(self, repo, spec):
+        # Files the resolution of `spec` depends on, or None if it can not
+        # be cached.
+        if spec.startswith(b":") or _re.search(rb"@\{(?![0-9]+\})", spec):
+            return None
+        name = _revparse_name_re.match(spec).group()
+        if name in (b"", b"@"):
+            name = b"HEAD"
+        # The names the leading name could designate (in the order of the
+        # `git_reference_dwim` rules) up to the first one which resolves,
+        # with the symbolic references followed on the way.
+        names, resolved = [], None
+        for rule in _revparse_dwim_rules:
+            chain, found = _revparse_chain(repo, rule % name)
+            names += chain
+            if found:
+                resolved = chain
+                break
+        if resolved is None:
+            return None
+        if b"@{" in spec:
+            names += [b"logs/" + name for name in resolved]
+        paths = [self._ref_path(name) for name in names]
+        paths.append(os.path.join(self._commondir, "packed-refs"))
+        return paths
+
+    def _ref_path(self, name):
+        # The HEADs, refs/bisect, refs/worktree and refs/rewritten are per
+        # worktree (as the logs of these).
+        per_worktree = _re.match(rb"(logs/)?([A-Z_]+HEAD$|refs/(bisect|worktree|rewritten)/)",
+                                 name)
+        return os.path.join(self._gitdir if per_worktree else self._commondir,
+                            os.fsdecode(name))
+
+_revparse_oid_re = _re.compile(rb"([0-9a-fA-F]{64}|[0-9a-fA-F]{40})(?![^~^:])")
+_revparse_name_re = _re.compile(rb"(?:[^~^:@]|@(?!\{))*")
+_revparse_dwim_rules = (b"%s", b"refs/%s", b"refs/tags/%s", b"refs/heads/%s",
+                        b"refs/remotes/%s", b"refs/remotes/%s/HEAD")
+
+def _revparse_chain(repo, name):
+    # The reference `name` and the symbolic references it points through,
+    # and whether it resolves to a direct reference.
+    chain = [name]
+    for _ in range(5):
+        ref = ct.POINTER(git_reference)()
+        if git_reference_lookup(ct.byref(ref), repo, chain[-1]) < 0:
+            break
+        try:
+            if git_reference_type(ref) != GIT_REFERENCE_SYMBOLIC:
+                return (chain, True)
+            chain.append(git_reference_symbolic_target(ref))
+        finally:
+            git_reference_free(ref)
+    return (chain, False)
+
+def _revparse_stamp(path):
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
@@ -7,10 +7,28 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import threading as _threading
+import struct as _struct
+import mmap as _mmap
+from collections import OrderedDict as _OrderedDict
+
 from .common import *  # noqa
 from .oid    import git_oid
 from .types  import git_revwalk
 from .types  import git_repository
+from .types  import git_commit
+from .types  import git_tree
+from .types  import git_tree_entry
+from .types  import GIT_FILEMODE_TREE
+from .errors import _git_check
+from .oid    import _git_oid, GIT_OID_SHA1_SIZE
+from .refs   import git_reference_name_to_id
+from .commit import git_commit_lookup, git_commit_free, git_commit_tree
+from .commit import git_commit_parentcount, git_commit_parent_id, git_commit_tree_id
+from .tree   import git_tree_lookup, git_tree_free, git_tree_entry_bypath, git_tree_entry_free
+from .tree   import git_tree_entry_id, git_tree_entrycount, git_tree_entry_byindex
+from .tree   import git_tree_entry_name, git_tree_entry_filemode
+from .repository import git_repository_path
 
 # @file git2/revwalk.h
 # @brief Git revision traversal routines
@@ -347,3 +365,464 @@ git_revwalk_add_hide_cb = CFUNC(ct.c_int,
     (1, "payload"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# History of a path (like `git log --format=%H <commit> -- <path>`).
+#
+# The commits reachable from `commit` are walked in topological order and
+# a commit is reported when the tree entry (blob or tree, with its mode) of
+# `path` in it differs from that in each of its parents.  As with git's
+# default history simplification, the walk only goes on through the first
+# parent with the same entry, if there is one, so that the commits of a
+# side branch whose changes to `path` a merge discarded are not reported.
+#
+# @param repo the repository
+# @param path path of a file or directory
+# @param commit the commit (as `git_oid`, hex str or raw bytes) to start
+#               from; HEAD if None
+# @param limit maximum number of commits to return, or None
+# @return list of commit ids (hex str), newest first
+#
+def path_history(repo, path, commit=None, limit=None):
+    return [key.hex() for key in _path_history(repo, os.fsencode(path), commit, limit)]
+
+def _path_history(repo, path, commit=None, limit=None, simplify=True):
+    # Without `simplify`, all parents of the commits are walked.
+    if commit is None:
+        start = git_oid()
+        _git_check(git_reference_name_to_id(ct.byref(start), repo, b"HEAD"))
+    else:
+        start = _git_oid(commit)
+    entry_ids = {}
+
+    def entry_id(commit):
+        # (id (raw bytes), mode) of the tree entry of `path` in `commit`,
+        # or None.
+        tree = ct.POINTER(git_tree)()
+        _git_check(git_commit_tree(ct.byref(tree), commit))
+        try:
+            entry = ct.POINTER(git_tree_entry)()
+            if git_tree_entry_bypath(ct.byref(entry), tree, path) < 0:
+                return None
+            try:
+                return (bytes(git_tree_entry_id(entry).contents.id),
+                        git_tree_entry_filemode(entry))
+            finally:
+                git_tree_entry_free(entry)
+        finally:
+            git_tree_free(tree)
+
+    def commit_entry_id(key):
+        if key not in entry_ids:
+            commit = ct.POINTER(git_commit)()
+            _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(_git_oid(key))))
+            try:
+                entry_ids[key] = entry_id(commit)
+            finally:
+                git_commit_free(commit)
+        return entry_ids[key]
+
+    history = []
+    followed = {bytes(start.id)}  # commits reached through followed parents
+    walk = ct.POINTER(git_revwalk)()
+    _git_check(git_revwalk_new(ct.byref(walk), repo))
+    try:
+        _git_check(git_revwalk_sorting(walk, GIT_SORT_TOPOLOGICAL | GIT_SORT_TIME))
+        _git_check(git_revwalk_push(walk, ct.byref(start)))
+        oid = git_oid()
+        commit = ct.POINTER(git_commit)()
+        while git_revwalk_next(ct.byref(oid), walk) == 0:
+            key = bytes(oid.id)
+            if simplify and key not in followed:
+                entry_ids.pop(key, None)
+                continue
+            followed.discard(key)
+            _git_check(git_commit_lookup(ct.byref(commit), repo, ct.byref(oid)))
+            try:
+                current = entry_ids.pop(key) if key in entry_ids else entry_id(commit)
+                parents = [bytes(git_commit_parent_id(commit, idx).contents.id)
+                           for idx in range(git_commit_parentcount(commit))]
+            finally:
+                git_commit_free(commit)
+            same = [parent for parent in parents if commit_entry_id(parent) == current]
+            if same:
+                followed.add(same[0])
+                continue
+            followed.update(parents)
+            if current is not None or parents:
+                history.append(key)
+                if limit is not None and len(history) >= limit:
+                    break
+    finally:
+        git_revwalk_free(walk)
+    return history
+
+# On-disk, incrementally updated index of path histories.
+#
+# For every commit reachable from the watched `refs` the index records the
+# paths (files and directories) the commit changed, found by comparing the
+# entry OIDs and modes of the commit's tree with those of its parents' trees
+# (identical subtrees are never descended into).  As with `git log -- path`,
+# a merge commit only changes the paths which differ from all its parents.
+# Unlike `path_history()`, no history simplification is done: a commit of a
+# side branch is reported even if a merge discarded its changes.
+#
+# `update()` indexes the commits that arrived on the watched refs since the
+# last update, `save()` writes the index to `path` (by default
+# "path-history.idx" in the git directory), from where it is memory-mapped
+# on the next open; `history()` answers path queries from the mapped file
+# plus the commits indexed since.  Unless `auto_update` is false, every
+# query first resolves the watched refs and calls `update()` if any of
+# them moved; otherwise the caller must call `update()` itself.
+#
+# The file is little-endian: a header (magic, version, OID size and the
+# numbers of commits, refs, paths and postings), the commit ids in
+# indexing order (parents before children), the last indexed tip of every
+# watched ref, a table of (path offset, path length, postings offset,
+# postings count) entries sorted by path, the path strings and the postings
+# (32-bit commit numbers, ascending).
+#
+# The index is append-only: commits that become unreachable (e.g. after a
+# forced update of a ref) are still reported.
+#
+# @param repo the repository
+# @param path path of the index file, or None
+# @param refs names of the references to watch
+# @param auto_update update the index on queries when the refs moved
+#
+class PathHistoryIndex:
+
+    _MAGIC   = b"GITPHIDX"
+    _VERSION = 1
+    _HEADER  = _struct.Struct("<8sIIIIIQ")
+    _ENTRY   = _struct.Struct("<QIQI")
+    _REF     = _struct.Struct("<H")
+
+    def __init__(self, repo, path=None, refs=("HEAD",), auto_update=True):
+        if path is None:
+            path = os.path.join(os.fsdecode(git_repository_path(repo)), "path-history.idx")
+        self.path = path
+        self.refs = tuple(refs)
+        self.auto_update = auto_update
+        self._repo  = repo
+        self._lock  = _threading.RLock()
+        self._trees = _OrderedDict()
+        self._reset()
+        self._load()
+
+    # Number of indexed commits.
+    def __len__(self):
+        return len(self._commits)
+
+    # Index the commits that arrived on the watched refs since the last
+    # update.
+    #
+    # @return number of newly indexed commits
+    #
+    def update(self):
+        with self._lock:
+            tips = self._current_tips()
+            oid  = git_oid()
+            walk = ct.POINTER(git_revwalk)()
+            _git_check(git_revwalk_new(ct.byref(walk), self._repo))
+            try:
+                _git_check(git_revwalk_sorting(walk, GIT_SORT_TOPOLOGICAL | GIT_SORT_REVERSE))
+                for tip in tips.values():
+                    _git_check(git_revwalk_push(walk, ct.byref(_git_oid(tip))))
+                for tip in set(self._tips.values()):
+                    git_revwalk_hide(walk, ct.byref(_git_oid(tip)))  # may be gone
+                count = 0
+                while git_revwalk_next(ct.byref(oid), walk) == 0:
+                    key = bytes(oid.id)
+                    if key in self._positions:
+                        continue
+                    self._index_commit(key)
+                    count += 1
+            finally:
+                git_revwalk_free(walk)
+            self._tips = tips
+            self._trees.clear()
+            return count
+
+    # Commits which changed `path` (a file or a directory), as
+    # `path_history()` reports them, but without history simplification.
+    #
+    # With `commit`, only its ancestors (and itself) are reported; for a
+    # commit which is not indexed (not reachable from the watched refs) the
+    # history is computed by walking the commits.
+    #
+    # @param path path relative to the root of the repository
+    # @param commit the commit (as `git_oid`, hex str or raw bytes) to start
+    #               from; all indexed commits if None
+    # @param limit maximum number of commits to return, or None
+    # @return list of commit ids (hex str), newest first
+    #
+    def history(self, path, commit=None, limit=None):
+        path = os.fsencode(path)
+        commit_key = bytes(_git_oid(commit).id) if commit is not None else None
+        history = self._history(path, commit_key, limit)
+        if history is None:
+            with self._lock:
+                history = _path_history(self._repo, path, commit_key, limit,
+                                        simplify=False)
+        return [key.hex() for key in history]
+
+    # Write the index to its file and map it.
+    def save(self):
+        with self._lock:
+            paths = {}
+            for idx in range(self._npaths):
+                path, postings = self._mapped_entry(idx)
+                paths[path] = postings
+            for path, postings in self._delta.items():
+                paths[path] = paths.get(path, b"") + _struct.pack("<%dI" % len(postings),
+                                                                  *postings)
+            tmp_path = self.path + ".lock"
+            with open(tmp_path, "wb") as f:
+                self._write(f, paths)
+            self._unmap()
+            os.replace(tmp_path, self.path)
+            self._reset()
+            self._load()
+
+    # Unmap the index file.
+    def close(self):
+        with self._lock:
+            self._unmap()
+            self._reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _reset(self):
+        self._mmap      = None
+        self._commits   = []
+        self._positions = {}
+        self._tips      = {}
+        self._delta     = {}
+        self._npaths    = 0
+        self._table     = 0
+        self._strings   = 0
+        self._postings  = 0
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _load(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < self._HEADER.size:
+                return
+            mm = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        (magic, version, oid_size, ncommits, nrefs,
+         npaths, npostings) = self._HEADER.unpack_from(mm, 0)
+        if magic != self._MAGIC or version != self._VERSION or oid_size != GIT_OID_SHA1_SIZE:
+            mm.close()
+            raise ValueError("unsupported path history index: {}".format(self.path))
+        offset = self._HEADER.size
+        self._commits = [mm[pos:pos + oid_size]
+                         for pos in range(offset, offset + ncommits * oid_size, oid_size)]
+        self._positions = {key: idx for idx, key in enumerate(self._commits)}
+        offset += ncommits * oid_size
+        for _ in range(nrefs):
+            size, = self._REF.unpack_from(mm, offset)
+            offset += self._REF.size
+            name = mm[offset:offset + size].decode("utf-8")
+            offset += size
+            self._tips[name] = mm[offset:offset + oid_size]
+            offset += oid_size
+        self._mmap    = mm
+        self._npaths  = npaths
+        self._table   = offset
+        self._strings = offset + npaths * self._ENTRY.size
+        last = (self._ENTRY.unpack_from(mm, self._table + (npaths - 1) * self._ENTRY.size)
+                if npaths else (0, 0, 0, 0))
+        self._postings = self._strings + last[0] + last[1]
+
+    def _write(self, f, paths):
+        oid_size = GIT_OID_SHA1_SIZE
+        names = sorted(paths)
+        f.write(self._HEADER.pack(self._MAGIC, self._VERSION, oid_size, len(self._commits),
+                                  len(self._tips), len(names),
+                                  sum(len(postings) for postings in paths.values()) // 4))
+        f.write(b"".join(self._commits))
+        for name, tip in self._tips.items():
+            name = name.encode("utf-8")
+            f.write(self._REF.pack(len(name)) + name + tip)
+        string_offset = postings_offset = 0
+        for name in names:
+            f.write(self._ENTRY.pack(string_offset, len(name),
+                                     postings_offset, len(paths[name]) // 4))
+            string_offset   += len(name)
+            postings_offset += len(paths[name])
+        f.write(b"".join(names))
+        for name in names:
+            f.write(paths[name])
+
+    def _mapped_entry(self, idx):
+        # (path, raw postings) of the idx-th entry of the mapped file.
+        string_offset, size, postings_offset, count = self._ENTRY.unpack_from(
+            self._mmap, self._table + idx * self._ENTRY.size)
+        start = self._strings + string_offset
+        postings = self._postings + postings_offset
+        return self._mmap[start:start + size], self._mmap[postings:postings + 4 * count]
+
+    def _mapped_postings(self, path):
+        # Binary search of `path` in the mapped path table.
+        lo, hi = 0, self._npaths
+        while lo < hi:
+            mid = (lo + hi) // 2
+            string_offset, size, postings_offset, count = self._ENTRY.unpack_from(
+                self._mmap, self._table + mid * self._ENTRY.size)
+            start = self._strings + string_offset
+            name = self._mmap[start:start + size]
+            if name < path:
+                lo = mid + 1
+            elif name > path:
+                hi = mid
+            else:
+                return _struct.unpack_from("<%dI" % count, self._mmap,
+                                           self._postings + postings_offset)
+        return ()
+
+    def _current_tips(self):
+        tips = {}
+        oid  = git_oid()
+        for name in self.refs:
+            if git_reference_name_to_id(ct.byref(oid), self._repo, os.fsencode(name)) == 0:
+                tips[name] = bytes(oid.id)
+        return tips
+
+    def _history(self, path, commit_key=None, limit=None):
+        # Raw ids, newest first; None if `commit_key` is not indexed.
+        path = path.rstrip(b"/")
+        with self._lock:
+            if self.auto_update and self._current_tips() != self._tips:
+                self.update()
+            if commit_key is not None and commit_key not in self._positions:
+                return None
+            postings = list(self._mapped_postings(path)) if self._mmap is not None else []
+            postings.extend(self._delta.get(path, ()))
+            postings.reverse()
+            if commit_key is not None:
+                postings = self._ancestors(postings, self._positions[commit_key],
+                                           commit_key, limit)
+            elif limit is not None:
+                del postings[limit:]
+            return [self._commits[idx] for idx in postings]
+
+    def _ancestors(self, postings, position, commit_key, limit):
+        # The postings (newest first) of the ancestors of `commit_key`, at
+        # `position`.  Commits are indexed after their parents, so none
+        # indexed after `commit_key` is one of them; the others are looked
+        # for by walking the history of `commit_key`, until all of them (or
+        # the `limit` newest ones) are found; an unfound one is no ancestor
+        # once the walk is over.
+        postings = [idx for idx in postings if idx <= position]
+        wanted = set(postings)
+        first  = set(postings[:limit] if limit is not None else postings)
+        found  = set()
+        walk = ct.POINTER(git_revwalk)()
+        _git_check(git_revwalk_new(ct.byref(walk), self._repo))
+        try:
+            _git_check(git_revwalk_push(walk, ct.byref(_git_oid(commit_key))))
+            oid = git_oid()
+            while first and git_revwalk_next(ct.byref(oid), walk) == 0:
+                idx = self._positions.get(bytes(oid.id))
+                if idx in wanted:
+                    found.add(idx)
+                    first.discard(idx)
+        finally:
+            git_revwalk_free(walk)
+        postings = [idx for idx in postings if idx in found]
+        if limit is not None:
+            del postings[limit:]
+        return postings
+
+    def _index_commit(self, key):
+        commit = ct.POINTER(git_commit)()
+        _git_check(git_commit_lookup(ct.byref(commit), self._repo, ct.byref(_git_oid(key))))
+        try:
+            tree_id = bytes(git_commit_tree_id(commit).contents.id)
+            parent_tree_ids = []
+            parent = ct.POINTER(git_commit)()
+            for idx in range(git_commit_parentcount(commit)):
+                _git_check(git_commit_lookup(ct.byref(parent), self._repo,
+                                             git_commit_parent_id(commit, idx)))
+                try:
+                    parent_tree_ids.append(bytes(git_commit_tree_id(parent).contents.id))
+                finally:
+                    git_commit_free(parent)
+        finally:
+            git_commit_free(commit)
+        changed = None
+        for parent_tree_id in parent_tree_ids or [None]:
+            paths = set()
+            self._tree_changes(tree_id, parent_tree_id, b"", paths)
+            changed = paths if changed is None else changed & paths
+            if not changed:
+                break
+        idx = len(self._commits)
+        self._commits.append(key)
+        self._positions[key] = idx
+        for path in changed:
+            self._delta.setdefault(path, []).append(idx)
+
+    def _tree_entries(self, tree_id):
+        # {name: (id, mode)} of a tree (recently used trees are cached).
+        if tree_id is None:
+            return {}
+        entries = self._trees.get(tree_id)
+        if entries is not None:
+            self._trees.move_to_end(tree_id)
+            return entries
+        tree = ct.POINTER(git_tree)()
+        _git_check(git_tree_lookup(ct.byref(tree), self._repo, ct.byref(_git_oid(tree_id))))
+        try:
+            entries = {}
+            for idx in range(git_tree_entrycount(tree)):
+                entry = git_tree_entry_byindex(tree, idx)
+                entries[git_tree_entry_name(entry)] = (
+                    bytes(git_tree_entry_id(entry).contents.id),
+                    git_tree_entry_filemode(entry))
+        finally:
+            git_tree_free(tree)
+        self._trees[tree_id] = entries
+        if len(self._trees) > 4096:
+            self._trees.popitem(last=False)
+        return entries
+
+    def _tree_changes(self, tree_id, parent_tree_id, prefix, changed):
+        # Add to `changed` the paths under `prefix` which differ between
+        # the two trees (either may be None).
+        if tree_id == parent_tree_id:
+            return
+        entries = self._tree_entries(tree_id)
+        parent_entries = self._tree_entries(parent_tree_id)
+        for name, entry in entries.items():
+            parent = parent_entries.get(name)
+            if parent == entry:
+                continue
+            path = prefix + name
+            changed.add(path)
+            is_tree = entry[1] == GIT_FILEMODE_TREE
+            parent_is_tree = parent is not None and parent[1] == GIT_FILEMODE_TREE
+            if is_tree or parent_is_tree:
+                self._tree_changes(entry[0] if is_tree else None,
+                                   parent[0] if parent_is_tree else None,
+                                   path + b"/", changed)
+        for name, (entry_id, mode) in parent_entries.items():
+            if name not in entries:
+                path = prefix + name
+                changed.add(path)
+                if mode == GIT_FILEMODE_TREE:
+                    self._tree_changes(None, entry_id, path + b"/", changed)
@@ -7,12 +7,36 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import stat as _stat
+import struct as _struct
+import array as _array
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED as _FIRST_COMPLETED
+from concurrent.futures import wait as _wait
+
 from .common   import *  # noqa
+from .._platform import is_linux as _is_linux
 from .strarray import git_strarray
 from .types    import git_repository
 from .types    import git_status_list
 from .types    import git_tree
-from .diff     import git_diff_delta
+from .types    import git_index
+from .diff     import git_diff_delta, git_diff_file
+from .index    import git_index_entrycount, git_index_get_byindex
+from .index    import git_index_add_bypath, git_index_remove_bypath
+from .index    import git_index_path, git_index_write, git_index_free
+from .index    import git_index_find_prefix
+from .oid      import git_oid
+from .refs     import git_reference_name_to_id
+from .ignore   import git_ignore_path_is_ignored
+from .attr     import git_attr_cache_flush
+from .repository import git_repository_workdir, git_repository_index
+from .repository import git_repository_path, git_repository_config_snapshot
+from .repository import _git_repository_handles
+from .buffer   import git_buf, git_buf_dispose
+from .config   import git_config, git_config_get_path, git_config_find_xdg
+from .config   import git_config_free
+from .errors   import GIT_ENOTFOUND, _git_check
 
 # @file git2/status.h
 # @brief Git file status routines
@@ -448,3 +472,645 @@ git_status_should_ignore = CFUNC(ct.c_int,
     (1, "path"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Parallel stat-based scan of the working directory.
+#
+# The working directory of `repo` is walked by a pool of `workers` threads
+# (one `os.scandir` per directory) and the `lstat` data of every file is
+# compared with the `git_index_time` mtime, file size and mode of its index
+# entry.  Untracked files and directories are skipped when the ignore rules
+# of the repository (`git_ignore_path_is_ignored`) apply to them; nested
+# repositories are not descended into.
+#
+# Only the candidate paths (stat data differing from the index, racily clean
+# entries, untracked files and index entries missing from the working
+# directory) are then passed to `git_status_file`, so the expensive content
+# comparison is limited to them.
+#
+# With `update_index` the stat-dirty tracked candidates are re-added with
+# `git_index_add_bypath`, the deleted ones removed with
+# `git_index_remove_bypath` and the index is written, which is what
+# `git_index_update_all` does for the whole working directory.
+#
+# The scan pays off with several CPUs or a slow (cold or network) file
+# system; with a single CPU and a warm cache `git_status_list_new` is as
+# fast or faster (see benchmarks/bench_status_scan.py).
+#
+# @param repo A repository object (must not be bare)
+# @param workers Number of scanning threads; defaults to `os.cpu_count()`
+# @param update_index Refresh the index for the candidate paths
+# @return list of `(path, status_flags)` tuples, sorted by path, for every
+#         path whose status is not `GIT_STATUS_CURRENT`
+#
+def status_scan_workdir(repo, workers=None, update_index=False):
+
+    workdir = git_repository_workdir(repo)
+    if workdir is None:
+        raise ValueError("cannot scan the working directory of a bare repository")
+    workdir = os.fsencode(os.path.normpath(os.fsdecode(workdir)))
+
+    index = ct.POINTER(git_index)()
+    _git_check(git_repository_index(ct.byref(index), repo))
+    try:
+        tracked, tracked_dirs, racy_since = _status_index_snapshot(index)
+        with _git_repository_handles(repo) as handles:
+            found, candidates = _status_scan_tree(workdir, tracked, tracked_dirs,
+                                                  racy_since, handles, workers)
+        candidates.update(path for path in tracked if path not in found)
+
+        result = []
+        status_flags = ct.c_uint()
+        dirty_index = False
+        for path in sorted(candidates):
+            err = git_status_file(ct.byref(status_flags), repo, path)
+            if err == GIT_ENOTFOUND:
+                continue
+            _git_check(err)
+            flags = status_flags.value
+            if update_index and path in tracked:
+                if flags & GIT_STATUS_WT_DELETED:
+                    _git_check(git_index_remove_bypath(index, path))
+                    dirty_index = True
+                elif not flags & (GIT_STATUS_CONFLICTED | GIT_STATUS_IGNORED):
+                    _git_check(git_index_add_bypath(index, path))
+                    dirty_index = True
+            if flags != GIT_STATUS_CURRENT:
+                result.append((os.fsdecode(path), flags))
+        if dirty_index:
+            _git_check(git_index_write(index))
+        return result
+    finally:
+        git_index_free(index)
+
+def _status_index_snapshot(index):
+    # Stat data of the stage 0 (and conflicted) entries of the index,
+    # keyed by path; plus the set of directories containing them.
+    tracked = {}
+    tracked_dirs = {b""}
+    for i in range(git_index_entrycount(index)):
+        entry = git_index_get_byindex(index, i).contents
+        path = entry.path
+        tracked[path] = (entry.mtime.seconds, entry.mtime.nanoseconds,
+                         entry.file_size, entry.mode)
+        head = path.rpartition(b"/")[0]
+        while head not in tracked_dirs:
+            tracked_dirs.add(head)
+            head = head.rpartition(b"/")[0]
+    # Entries written in the same second as the index file may be racily
+    # clean and must always be checked.
+    index_path = git_index_path(index)
+    try:
+        racy_since = os.stat(index_path).st_mtime_ns // 1_000_000_000 if index_path else 0
+    except OSError:
+        racy_since = 0
+    return tracked, tracked_dirs, racy_since
+
+def _status_index_mode(st):
+    if _stat.S_ISLNK(st.st_mode):
+        return 0o120000
+    return 0o100755 if st.st_mode & 0o100 else 0o100644
+
+def _status_scan_tree(workdir, tracked, tracked_dirs, racy_since, handles, workers):
+
+    def is_ignored(path):
+        ignored = ct.c_int()
+        _git_check(git_ignore_path_is_ignored(ct.byref(ignored), handles.get(), path))
+        return bool(ignored.value)
+
+    def scan_dir(reldir):
+        # Scan one directory; returns its subdirectories to be scanned next,
+        # the tracked paths found in it and the candidate paths.
+        subdirs, found, candidates = [], [], []
+        prefix = reldir + b"/" if reldir else b""
+        with os.scandir(os.path.join(workdir, reldir) if reldir else workdir) as it:
+            for dentry in it:
+                path = prefix + dentry.name
+                if not reldir and dentry.name == b".git":
+                    continue
+                if dentry.is_dir(follow_symlinks=False):
+                    if path in tracked:  # submodule
+                        found.append(path)
+                        candidates.append(path)
+                    elif path in tracked_dirs:
+                        subdirs.append(path)
+                    elif (os.path.lexists(os.path.join(dentry.path, b".git"))
+                          or is_ignored(path + b"/")):
+                        continue
+                    else:
+                        subdirs.append(path)
+                    continue
+                st = dentry.stat(follow_symlinks=False)
+                if not (_stat.S_ISREG(st.st_mode) or _stat.S_ISLNK(st.st_mode)):
+                    continue
+                entry = tracked.get(path)
+                if entry is None:
+                    if not is_ignored(path):
+                        candidates.append(path)
+                    continue
+                found.append(path)
+                seconds, nanoseconds = divmod(st.st_mtime_ns, 1_000_000_000)
+                if ((seconds & 0xFFFFFFFF) != (entry[0] & 0xFFFFFFFF)
+                    or (entry[1] and nanoseconds != entry[1])
+                    or (st.st_size & 0xFFFFFFFF) != entry[2]
+                    or _status_index_mode(st) != entry[3]
+                    or seconds >= racy_since):  # noqa: E129
+                    candidates.append(path)
+        return subdirs, found, candidates
+
+    found, candidates = set(), set()
+    with _ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan_dir, b"")}
+        while pending:
+            done, pending = _wait(pending, return_when=_FIRST_COMPLETED)
+            for future in done:
+                subdirs, dir_found, dir_candidates = future.result()
+                found.update(dir_found)
+                candidates.update(dir_candidates)
+                pending.update(executor.submit(scan_dir, subdir) for subdir in subdirs)
+    return found, candidates
+
+# Internal addition for the high-level helpers of this package.
+#
+# Incremental status backed by a file system monitor.
+#
+# The watcher keeps an inotify watch (Linux only, through the C library by
+# ctypes) on every directory of the working directory of `repo` and
+# collects the paths changed between two `status()` calls.  Only those
+# paths are then passed to `git_status_list_new` as an exact
+# `git_status_options.pathspec` (`GIT_STATUS_OPT_DISABLE_PATHSPEC_MATCH`)
+# and merged into the status kept from the previous call.
+#
+# The whole working directory is rescanned on the first call, when HEAD
+# or the index of the repository change, when a directory is removed or
+# moved away, when the ignore rules change (a `.gitignore`, the files in
+# `$GIT_DIR/info/`, the `core.excludesFile` or the repository
+# configuration) and when the kernel event queue overflows.  After an
+# ignore rule change, directories that are no longer ignored get their
+# watches too.  Without inotify
+# (other platforms, exhausted watch limit) every call is a full scan.
+#
+# Untracked directories are always recursed into
+# (`GIT_STATUS_OPT_RECURSE_UNTRACKED_DIRS`), so that every reported path is
+# a file.  Rename detection is only reliable on full rescans.
+#
+# @param repo A repository object (must not be bare)
+# @param flags OR'ed `git_status_opt_t` values
+# @param show One of the `git_status_show_t` values
+#
+class StatusWatcher:
+
+    _inotify = None
+
+    def __init__(self, repo,
+                 flags=GIT_STATUS_OPT_INCLUDE_UNTRACKED,
+                 show=GIT_STATUS_SHOW_INDEX_AND_WORKDIR):
+        workdir = git_repository_workdir(repo)
+        if workdir is None:
+            raise ValueError("cannot watch the working directory of a bare repository")
+        self._repo    = repo
+        self._workdir = os.fsencode(os.path.normpath(os.fsdecode(workdir)))
+        self._gitdir  = os.fsencode(os.path.normpath(os.fsdecode(git_repository_path(repo))))
+        self._flags   = (flags | GIT_STATUS_OPT_RECURSE_UNTRACKED_DIRS) & ~(
+                        GIT_STATUS_OPT_DISABLE_PATHSPEC_MATCH)
+        self._show    = show
+        self._status  = None
+        self._head    = None
+        self._dirty   = set()
+        self._rescan  = True
+        self._watches = {}
+        self._ignores = {}
+        self._inotify = None
+        if _inotify.available:
+            try:
+                self._inotify = _inotify()
+                self._watch_tree(b"")
+                self._inotify.add_watch(self._gitdir, _inotify.GITDIR_MASK)
+                self._watch_ignores()
+            except OSError:
+                self.close()
+
+    # Whether changes are tracked incrementally (inotify is in use).
+    @property
+    def watching(self):
+        return self._inotify is not None
+
+    # Return the current status as a list of `(path, status_flags)` tuples,
+    # sorted by path, for every path whose status is not
+    # `GIT_STATUS_CURRENT` (or of all paths with
+    # `GIT_STATUS_OPT_INCLUDE_UNMODIFIED`).
+    #
+    def status(self):
+        if self._inotify is not None:
+            self._read_events()
+        head = self._head_id()
+        if self._inotify is None or self._rescan or head != self._head:
+            self._status = _status_collect(self._repo, self._show, self._flags)
+            self._head   = head
+            self._rescan = False
+            self._dirty.clear()
+        elif self._dirty:
+            paths = sorted(self._dirty)
+            self._dirty.clear()
+            for path in paths:
+                self._status.pop(path, None)
+            self._status.update(_status_collect(self._repo, self._show, self._flags
+                                                | GIT_STATUS_OPT_DISABLE_PATHSPEC_MATCH,
+                                                paths))
+        return [(os.fsdecode(path), flags) for path, flags in sorted(self._status.items())]
+
+    # Stop watching and release the inotify instance.
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watches = {}
+        self._ignores = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _head_id(self):
+        oid = git_oid()
+        if git_reference_name_to_id(ct.byref(oid), self._repo, b"HEAD") < 0:
+            return None
+        return bytes(oid.id)
+
+    def _is_ignored(self, path):
+        if self._flags & GIT_STATUS_OPT_INCLUDE_IGNORED:
+            return False
+        ignored = ct.c_int()
+        if git_ignore_path_is_ignored(ct.byref(ignored), self._repo, path + b"/") < 0:
+            return False
+        if not ignored.value:
+            return False
+        # Ignore rules never apply to tracked content.
+        index = ct.POINTER(git_index)()
+        if git_repository_index(ct.byref(index), self._repo) < 0:
+            return False
+        try:
+            pos = ct.c_size_t()
+            return git_index_find_prefix(ct.byref(pos), index, path + b"/") < 0
+        finally:
+            git_index_free(index)
+
+    def _watch_tree(self, reldir, mark_dirty=False):
+        # Watch `reldir` and all its subdirectories.
+        stack = [reldir]
+        while stack:
+            reldir = stack.pop()
+            absdir = os.path.join(self._workdir, reldir) if reldir else self._workdir
+            wd = self._inotify.add_watch(absdir, _inotify.WORKDIR_MASK)
+            self._watches[wd] = reldir
+            prefix = reldir + b"/" if reldir else b""
+            try:
+                it = os.scandir(absdir)
+            except OSError:
+                continue
+            with it:
+                for dentry in it:
+                    path = prefix + dentry.name
+                    if dentry.is_dir(follow_symlinks=False):
+                        if ((reldir or dentry.name != b".git")
+                            and not self._is_ignored(path)):  # noqa: E129
+                            stack.append(path)
+                    elif mark_dirty:
+                        self._dirty.add(path)
+
+    def _watch_ignores(self):
+        # Watch the files ignore rules are read from outside the working
+        # directory: `$GIT_DIR/info/` and the directory of the
+        # `core.excludesFile` (by default `$XDG_CONFIG_HOME/git/ignore`).
+        self._ignores = {}
+        dirs = {os.path.join(self._gitdir, b"info"): None}
+        excludes = self._excludes_file()
+        if excludes is not None:
+            dirname, name = os.path.split(excludes)
+            names = dirs.setdefault(dirname, set())
+            if names is not None:
+                names.add(name)
+        for dirname, names in dirs.items():
+            try:
+                wd = self._inotify.add_watch(dirname, _inotify.GITDIR_MASK)
+            except OSError:
+                continue
+            self._ignores[wd] = names
+
+    def _excludes_file(self):
+        config = ct.POINTER(git_config)()
+        if git_repository_config_snapshot(ct.byref(config), self._repo) < 0:
+            return None
+        buf = git_buf()
+        try:
+            if git_config_get_path(ct.byref(buf), config, b"core.excludesFile") == 0:
+                return os.path.normpath(ct.string_at(buf.ptr, buf.size))
+            git_buf_dispose(ct.byref(buf))
+            if git_config_find_xdg(ct.byref(buf)) == 0:
+                return os.path.join(os.path.dirname(ct.string_at(buf.ptr, buf.size)),
+                                    b"ignore")
+            return None
+        finally:
+            git_buf_dispose(ct.byref(buf))
+            git_config_free(config)
+
+    def _read_events(self):
+        rewatch = reconfig = False
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _inotify.IN_Q_OVERFLOW:
+                self._rescan = True
+                continue
+            if wd in self._ignores:
+                # `$GIT_DIR/info/` or the directory of `core.excludesFile`.
+                names = self._ignores[wd]
+                if mask & _inotify.IN_IGNORED:
+                    del self._ignores[wd]
+                elif names is None or name in names:
+                    self._rescan = rewatch = True
+                continue
+            reldir = self._watches.get(wd)
+            if reldir is None:
+                # The git directory.
+                if name in (b"index", b"HEAD"):
+                    self._rescan = True
+                elif name == b"info":
+                    self._rescan = rewatch = True
+                elif name == b"config":
+                    # `core.excludesFile` may have changed.
+                    self._rescan = rewatch = reconfig = True
+                continue
+            if mask & _inotify.IN_IGNORED:
+                del self._watches[wd]
+                continue
+            if mask & (_inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF):
+                self._rescan = True
+                continue
+            path = reldir + b"/" + name if reldir else name
+            if mask & _inotify.IN_ISDIR:
+                if not reldir and name == b".git":
+                    continue
+                if mask & (_inotify.IN_CREATE | _inotify.IN_MOVED_TO):
+                    if not self._is_ignored(path):
+                        try:
+                            self._watch_tree(path, mark_dirty=True)
+                        except OSError:
+                            self._rescan = True
+                elif mask & (_inotify.IN_DELETE | _inotify.IN_MOVED_FROM):
+                    self._rescan = True
+            elif name == b".gitignore":
+                self._rescan = rewatch = True
+            elif name:
+                self._dirty.add(path)
+        if reconfig:
+            # libgit2 reads `core.excludesFile` only when it (re)builds
+            # its attribute cache.
+            git_attr_cache_flush(self._repo)
+        if rewatch:
+            # Directories that are no longer ignored need watches now;
+            # the ones that already have one keep it.
+            try:
+                self._watch_tree(b"")
+                self._watch_ignores()
+            except OSError:
+                pass
+
+def _status_collect(repo, show, flags, paths=None):
+    # Run `git_status_list_new` and return its entries as a dict
+    # {path (bytes): status_flags}.
+    opts = git_status_options()
+    _git_check(git_status_options_init(ct.byref(opts), GIT_STATUS_OPTIONS_VERSION))
+    opts.show  = show
+    opts.flags = flags
+    if paths is not None:
+        opts.pathspec.strings = (ct.c_char_p * len(paths))(*paths)
+        opts.pathspec.count   = len(paths)
+    with StatusList(repo, opts) as statuslist:
+        return dict(zip(statuslist._raw_paths(), statuslist.flags()))
+
+class _inotify:
+    # Minimal inotify(7) interface through the C library.
+
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF   = 0x00000800
+    IN_Q_OVERFLOW  = 0x00004000
+    IN_IGNORED     = 0x00008000
+    IN_ONLYDIR     = 0x01000000
+    IN_ISDIR       = 0x40000000
+    IN_NONBLOCK    = 0o4000
+    IN_CLOEXEC     = 0o2000000
+
+    WORKDIR_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    GITDIR_MASK  = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+    _event = _struct.Struct("iIII")
+
+    try:
+        _libc = ct.CDLL(None, use_errno=True) if _is_linux else None
+        available = _libc is not None and hasattr(_libc, "inotify_init1")
+    except OSError:  # pragma: no cover
+        _libc, available = None, False
+
+    def __init__(self):
+        fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            errno = ct.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd = fd
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, ct.c_char_p(path), ct.c_uint32(mask))
+        if wd < 0:
+            errno = ct.get_errno()
+            raise OSError(errno, os.strerror(errno), os.fsdecode(path))
+        return wd
+
+    def read_events(self):
+        # Return all pending events as (wd, mask, name) tuples.
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, size = self._event.unpack_from(data, offset)
+                offset += self._event.size
+                name = data[offset:offset + size].rstrip(b"\0")
+                offset += size
+                events.append((wd, mask, name))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+# Internal addition for the high-level helpers of this package.
+#
+# Status results as a lazily decoded, array-backed collection.
+#
+# The native `git_status_list` is kept as is; nothing is converted to
+# Python objects until it is accessed.  Indexing yields `StatusEntry`
+# views whose paths are decoded on access, while `flags()` and `paths()`
+# read the entries in bulk straight from native memory.
+#
+# @param repo Repository object
+# @param opts Status options structure (`git_status_options`), or None for
+#             the defaults
+#
+class StatusList:
+
+    def __init__(self, repo, opts=None):
+        self._list = ct.POINTER(git_status_list)()
+        _git_check(git_status_list_new(ct.byref(self._list), repo,
+                                       ct.byref(opts) if opts is not None else None))
+        self._count = git_status_list_entrycount(self._list)
+        self._flags = None
+
+    # The native `git_status_list` (owned by this object).
+    @property
+    def statuslist(self):
+        return self._list
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._count))]
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError("status list index out of range")
+        return StatusEntry(self, _git_status_byindex_addr(self._list, idx))
+
+    def __iter__(self):
+        for idx in range(self._count):
+            yield StatusEntry(self, _git_status_byindex_addr(self._list, idx))
+
+    # Status flags (combinations of `git_status_t` values) of all entries,
+    # as an `array.array` of unsigned ints.
+    #
+    def flags(self):
+        if self._flags is None:
+            from_address = ct.c_uint.from_address
+            self._flags = _array.array("I", (
+                          from_address(_git_status_byindex_addr(self._list, idx)).value
+                          for idx in range(self._count)))
+        return self._flags
+
+    # Paths of the entries whose status flags match `mask` (any of its bits;
+    # all entries if `mask` is None).
+    #
+    # @param mask OR'ed `git_status_t` values or None
+    # @return list of paths (str)
+    #
+    def paths(self, mask=None):
+        if mask is None:
+            return [os.fsdecode(path) for path in self._raw_paths()]
+        flags = self.flags()
+        return [os.fsdecode(_status_entry_path(_git_status_byindex_addr(self._list, idx)))
+                for idx in range(self._count) if flags[idx] & mask]
+
+    # Free the native status list.
+    def close(self):
+        if self._list:
+            git_status_list_free(self._list)
+        self._list  = ct.POINTER(git_status_list)()
+        self._count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "_list", None):
+            self.close()
+
+    def _raw_paths(self):
+        return [_status_entry_path(_git_status_byindex_addr(self._list, idx))
+                for idx in range(self._count)]
+
+# A view of one entry of a `StatusList`.
+#
+# `status` is the combination of `git_status_t` values, `path` is the
+# path git_status_foreach() would report, `head_to_index` and
+# `index_to_workdir` are the underlying `git_diff_delta` pointers (or None).
+#
+class StatusEntry:
+
+    __slots__ = ("_owner", "_addr")
+
+    def __init__(self, owner, addr):
+        self._owner = owner  # keeps the native list alive
+        self._addr  = addr
+
+    @property
+    def status(self):
+        return ct.c_uint.from_address(self._addr).value
+
+    @property
+    def path(self):
+        return os.fsdecode(_status_entry_path(self._addr))
+
+    @property
+    def old_path(self):
+        path = _status_delta_path(self._addr, _STATUS_DELTA_OLD_PATH)
+        return os.fsdecode(path) if path is not None else None
+
+    @property
+    def new_path(self):
+        path = _status_delta_path(self._addr, _STATUS_DELTA_NEW_PATH)
+        return os.fsdecode(path) if path is not None else None
+
+    @property
+    def head_to_index(self):
+        delta = ct.c_void_p.from_address(self._addr + _STATUS_ENTRY_HEAD_TO_INDEX).value
+        return ct.cast(delta, ct.POINTER(git_diff_delta)) if delta else None
+
+    @property
+    def index_to_workdir(self):
+        delta = ct.c_void_p.from_address(self._addr + _STATUS_ENTRY_INDEX_TO_WORKDIR).value
+        return ct.cast(delta, ct.POINTER(git_diff_delta)) if delta else None
+
+    def __repr__(self):
+        return "StatusEntry(path={!r}, status={:#x})".format(self.path, self.status)
+
+# git_status_byindex() returning a plain address (no ctypes pointer object).
+_git_status_byindex_addr = CFUNC(ct.c_void_p,
+    ct.POINTER(git_status_list),
+    ct.c_size_t)(
+    ("git_status_byindex", dll), (
+    (1, "statuslist"),
+    (1, "idx"),))
+
+_STATUS_ENTRY_HEAD_TO_INDEX    = git_status_entry.head_to_index.offset
+_STATUS_ENTRY_INDEX_TO_WORKDIR = git_status_entry.index_to_workdir.offset
+_STATUS_DELTA_OLD_PATH = git_diff_delta.old_file.offset + git_diff_file.path.offset
+_STATUS_DELTA_NEW_PATH = git_diff_delta.new_file.offset + git_diff_file.path.offset
+
+def _status_delta_path(addr, path_offset):
+    # Path of the first present delta of the entry at `addr`.
+    delta = (ct.c_void_p.from_address(addr + _STATUS_ENTRY_HEAD_TO_INDEX).value or
+             ct.c_void_p.from_address(addr + _STATUS_ENTRY_INDEX_TO_WORKDIR).value)
+    return ct.c_char_p.from_address(delta + path_offset).value if delta else None
+
+def _status_entry_path(addr):
+    # The path git_status_foreach() would report for the entry at `addr`.
+    return _status_delta_path(addr, _STATUS_DELTA_OLD_PATH)
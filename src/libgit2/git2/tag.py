@@ -7,14 +7,28 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+import re as _re
+import array as _array
+import fnmatch as _fnmatch
+import binascii as _binascii
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from .common   import *  # noqa
 from .oid      import git_oid
+from .oid      import GIT_OID_SHA1_SIZE
+from .oid      import _git_oid
 from .strarray import git_strarray
 from .types    import git_object_t
 from .types    import git_object
 from .types    import git_signature
 from .types    import git_repository
 from .types    import git_tag
+from .types    import GIT_OBJECT_ANY, GIT_OBJECT_TAG
+from .errors   import _git_check
+from .object   import git_object_lookup, git_object_id, git_object_type
+from .object   import git_object_free
+from .refs     import list_refs
+from .repository import _git_repository_handles
 
 # @file git2/tag.h
 # @brief Git tag parsing routines
@@ -454,3 +468,123 @@ git_tag_name_is_valid = CFUNC(ct.c_int,
     (1, "name"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Tags of a repository as columns, sorted by name: the tag `names` (without
+# "refs/tags/"), the raw OIDs the tags point at (the tag objects of the
+# annotated tags) and of the objects they peel to packed one after another
+# in `ids` and `peeled`, the `types` of the peeled objects (array of
+# `git_object_t` values), the tagger `times` (array of seconds since the
+# epoch, 0 for lightweight tags) and the message `summaries` (str lists,
+# None for lightweight tags).
+#
+class TagCatalog:
+
+    __slots__ = ("names", "ids", "peeled", "types", "times", "summaries",
+                 "oid_size")
+
+    def __init__(self, names, ids, peeled, types, times, summaries,
+                 oid_size=GIT_OID_SHA1_SIZE):
+        self.names     = names
+        self.ids       = ids
+        self.peeled    = peeled
+        self.types     = types
+        self.times     = times
+        self.summaries = summaries
+        self.oid_size  = oid_size
+
+    def __len__(self):
+        return len(self.names)
+
+    # @return (name, id (hex str), peeled id (hex str), peeled type, time,
+    #          summary)
+    #
+    def __getitem__(self, idx):
+        idx = range(len(self.names))[idx]
+        start, end = idx * self.oid_size, (idx + 1) * self.oid_size
+        return (self.names[idx], self.ids[start:end].hex(),
+                self.peeled[start:end].hex(), self.types[idx], self.times[idx],
+                self.summaries[idx])
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self.names)))
+
+# List the tags matching `pattern` (as `git_tag_list_match`), with what
+# `git_tag_target_id`, `git_tag_peel`, `git_tag_tagger` and `git_tag_message`
+# give for them, as columns.
+#
+# The tag references are resolved in bulk (see `list_refs`) and the tag
+# objects are decoded on a thread pool.  With a `cache` (any mutable mapping,
+# e.g. a dict kept across calls), the decoded values are memoized by the OID
+# of the tag objects (or of the objects pointed at by the lightweight tags),
+# as objects are immutable.
+#
+# @param repo the repository
+# @param pattern standard fnmatch pattern of the tag names, or None for all
+# @param workers number of worker threads, defaults to `os.cpu_count()`
+# @param cache mapping of the decoded tags
+# @return `TagCatalog`
+#
+def tag_catalog(repo, pattern=None, workers=None, cache=None):
+    if cache is None:
+        cache = {}
+    refs = list_refs(repo, "refs/tags/")
+    names = [name[len("refs/tags/"):] for name in refs.names]
+    oid_size = refs.oid_size
+    ids = refs.targets
+    if pattern is not None:
+        keep = [idx for idx, name in enumerate(names)
+                if _fnmatch.fnmatchcase(name, pattern)]
+        names = [names[idx] for idx in keep]
+        ids = b"".join(ids[idx * oid_size:(idx + 1) * oid_size] for idx in keep)
+    keys = _binascii.hexlify(ids).decode("ascii")
+    keys = [keys[start:start + 2 * oid_size]
+            for start in range(0, len(keys), 2 * oid_size)]
+    missing = list(dict.fromkeys(key for key in keys if key not in cache))
+    if missing:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(missing)))
+        size = -(-len(missing) // workers)
+        chunks = [missing[start:start + size] for start in range(0, len(missing), size)]
+        with _git_repository_handles(repo) as handles, \
+             _ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk, values in zip(chunks, executor.map(
+                    lambda chunk: [_tag_decode(handles.get(), key) for key in chunk],
+                    chunks)):
+                for key, value in zip(chunk, values):
+                    cache[key] = value
+    values = [cache[key] for key in keys]
+    return TagCatalog(names, ids,
+                      _binascii.unhexlify("".join(value[0] for value in values)),
+                      _array.array("i", (value[1] for value in values)),
+                      _array.array("q", (value[2] for value in values)),
+                      [value[3] for value in values], oid_size)
+
+_tag_paragraph_re = _re.compile(r"\n[ \t]*\n")
+
+def _tag_decode(repo, key):
+    # (peeled id (hex str), peeled type, tagger time, message summary) of
+    # the object `key` pointed at by a tag.
+    obj = ct.POINTER(git_object)()
+    _git_check(git_object_lookup(ct.byref(obj), repo, ct.byref(_git_oid(key)),
+                                 GIT_OBJECT_ANY))
+    try:
+        if git_object_type(obj) != GIT_OBJECT_TAG:
+            return (key, git_object_type(obj), 0, None)
+        tag = ct.cast(obj, ct.POINTER(git_tag))
+        peeled = ct.POINTER(git_object)()
+        _git_check(git_tag_peel(ct.byref(peeled), tag))
+        try:
+            peeled_id = bytes(git_object_id(peeled).contents.id).hex()
+            peeled_type = git_object_type(peeled)
+        finally:
+            git_object_free(peeled)
+        tagger = git_tag_tagger(tag)
+        message = git_tag_message(tag)
+        message = (message or b"").decode("utf-8", "replace")
+        summary = _tag_paragraph_re.split(message.lstrip(), 1)[0]
+        summary = " ".join(line.strip() for line in summary.splitlines())
+        return (peeled_id, peeled_type,
+                tagger.contents.when.time if tagger else 0, summary)
+    finally:
+        git_object_free(obj)
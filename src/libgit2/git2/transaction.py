@@ -7,12 +7,23 @@
 # This file is part of libgit2, distributed under the GNU GPL v2 with
 # a Linking Exception. For full terms see the included COPYING file.
 
+from collections import namedtuple as _namedtuple
+
 from .common import *  # noqa
 from .types  import git_repository
 from .oid    import git_oid
 from .types  import git_signature
 from .types  import git_reflog
 from .types  import git_transaction
+from .oid    import _git_oid
+from .errors import GitError, _git_check
+from .errors import GIT_ENOTFOUND, GIT_EEXISTS, GIT_EMODIFIED
+from .refs   import git_reference_name_to_id, git_reference_has_log
+from .reflog import git_reflog_read, git_reflog_free
+from .buffer import git_buf, git_buf_dispose
+from .types  import git_config
+from .config import git_config_get_string_buf, git_config_parse_bool, git_config_free
+from .repository import git_repository_is_bare, git_repository_config_snapshot
 
 # @file git2/transaction.h
 # @brief Git transactional reference routines
@@ -161,3 +172,191 @@ git_transaction_free = CFUNC(None,
     (1, "tx"),))
 
 # GIT_END_DECL
+
+# Internal addition for the high-level helpers of this package.
+#
+# Result of `RefBatch.commit`: the names of the references updated and the
+# `GitError` of each one which was not, keyed by name.
+#
+RefBatchResult = _namedtuple("RefBatchResult", ["applied", "failures"])
+
+_REF_ABSENT = b""
+
+# A batch of reference creations, updates and deletions, applied in one
+# `git_transaction`.
+#
+# The changes are queued (the last one queued for a name wins) and
+# `commit()` locks all the references, checks their expected old values,
+# queues the changes in the transaction and commits it.  The references
+# are locked together, but the batch is not atomic: they are written one
+# by one, and a failure leaves the ones written before it changed.  A
+# reference which cannot be locked, whose value is not the expected one
+# or whose change is rejected is reported in the failures, without
+# aborting the rest of the batch.  As `git_transaction_commit` stops at the
+# first failing update, the references of a failed commit are checked
+# afterwards and the ones left unchanged are reported too.
+#
+# A batch is not faster than the same changes made reference by reference:
+# libgit2 still writes every loose reference and reflog entry on its own,
+# and rewrites the packed-refs file for every deleted packed reference
+# (see benchmarks/bench_refbatch.py).
+#
+# With `reflog=False` the changes are not recorded in the reflogs (the
+# existing reflog of each updated reference is written back unchanged).
+#
+# @param repo the repository
+# @param reflog whether to append the updates to the reflogs
+# @param message message to use in the reflogs
+# @param signature `git_signature` to use in the reflogs; None to read
+#                  the identity from the config
+#
+class RefBatch:
+
+    def __init__(self, repo, reflog=True, message=None, signature=None):
+        self.reflog    = reflog
+        self.message   = message
+        self.signature = signature
+        self._repo = repo
+        self._ops  = {}
+
+    def __len__(self):
+        return len(self._ops)
+
+    # Queue the creation of the reference `name` pointing to `target` (an
+    # OID as `git_oid`, hex str or raw bytes).  Unless `force`, it fails if
+    # the reference already exists.
+    #
+    def create(self, name, target, force=False):
+        self._ops[name] = (bytes(_git_oid(target).id), None if force else _REF_ABSENT)
+
+    # Queue the update of the reference `name` to `target`, provided it
+    # currently resolves to `old` (if not None).
+    #
+    def update(self, name, target, old=None):
+        self._ops[name] = (bytes(_git_oid(target).id),
+                           None if old is None else bytes(_git_oid(old).id))
+
+    # Queue the deletion of the reference `name`, provided it currently
+    # resolves to `old` (if not None).
+    #
+    def delete(self, name, old=None):
+        self._ops[name] = (None, None if old is None else bytes(_git_oid(old).id))
+
+    # Apply the queued changes and clear the batch.
+    #
+    # @return `RefBatchResult`
+    #
+    def commit(self):
+        ops, self._ops = self._ops, {}
+        repo = self._repo
+        message = None if self.message is None else self.message.encode("utf-8")
+        signature = self.signature
+        failures = {}
+        queued = []
+        log_all = None if self.reflog else _ref_batch_log_all(repo)
+        tx = ct.POINTER(git_transaction)()
+        _git_check(git_transaction_new(ct.byref(tx), repo))
+        try:
+            for name, (target, old) in ops.items():
+                refname = name.encode("utf-8")
+                error = git_transaction_lock_ref(tx, refname)
+                if error < 0:
+                    failures[name] = _ref_batch_error(error)
+                    continue
+                try:
+                    current = _ref_batch_target(repo, refname)
+                except GitError as exc:
+                    failures[name] = exc
+                    continue
+                if old is not None and current != (old or None):
+                    failures[name] = GitError(GIT_EEXISTS if old == _REF_ABSENT
+                                              else GIT_EMODIFIED,
+                                              "reference '{}' {}".format(name,
+                                              "already exists" if old == _REF_ABSENT
+                                              else "does not have the expected value"))
+                    continue
+                if target is None:
+                    if current is None:
+                        failures[name] = GitError(GIT_ENOTFOUND,
+                                                  "reference '{}' not found".format(name))
+                        continue
+                    error = git_transaction_remove(tx, refname)
+                else:
+                    error = git_transaction_set_target(tx, refname,
+                                                       ct.byref(_git_oid(target)),
+                                                       signature, message)
+                    if error >= 0 and not self.reflog:
+                        error = _ref_batch_keep_reflog(tx, repo, refname, log_all)
+                if error < 0:
+                    failures[name] = _ref_batch_error(error)
+                    continue
+                queued.append(name)
+            error = git_transaction_commit(tx)
+        finally:
+            git_transaction_free(tx)
+        if error < 0:
+            exc = _ref_batch_error(error)
+            for name in queued:
+                try:
+                    current = _ref_batch_target(repo, name.encode("utf-8"))
+                except GitError:
+                    current = _REF_ABSENT
+                if current != ops[name][0]:
+                    failures[name] = exc
+        return RefBatchResult([name for name in queued if name not in failures], failures)
+
+def _ref_batch_error(error):
+    try:
+        _git_check(error)
+    except GitError as exc:
+        return exc
+
+def _ref_batch_target(repo, refname):
+    oid = git_oid()
+    error = git_reference_name_to_id(ct.byref(oid), repo, refname)
+    if error == GIT_ENOTFOUND:
+        return None
+    _git_check(error)
+    return bytes(oid.id)
+
+def _ref_batch_log_all(repo):
+    # `core.logAllRefUpdates` as libgit2 reads it: False, True or "always"
+    # (by default, True unless the repository is bare).
+    config = ct.POINTER(git_config)()
+    _git_check(git_repository_config_snapshot(ct.byref(config), repo))
+    buf = git_buf()
+    try:
+        error = git_config_get_string_buf(ct.byref(buf), config, b"core.logAllRefUpdates")
+        if error == GIT_ENOTFOUND:
+            return not git_repository_is_bare(repo)
+        _git_check(error)
+        value = ct.string_at(buf.ptr, buf.size)
+        if value.lower() == b"always":
+            return "always"
+        result = ct.c_int()
+        _git_check(git_config_parse_bool(ct.byref(result), value))
+        return bool(result.value)
+    finally:
+        git_buf_dispose(ct.byref(buf))
+        git_config_free(config)
+
+def _ref_batch_keep_reflog(tx, repo, refname, log_all):
+    # libgit2 writes no reflog at all without `core.logAllRefUpdates`;
+    # with it, only the references which have a reflog, or which it logs
+    # by default (all of them with "always"), get an entry (then the
+    # existing reflog, or an empty one, is written back instead).
+    if not log_all:
+        return 0
+    if log_all != "always" and not refname.startswith((b"refs/heads/", b"refs/remotes/",
+                                                       b"refs/notes/", b"HEAD")):
+        error = git_reference_has_log(repo, refname)
+        if error <= 0:
+            return error
+    reflog = ct.POINTER(git_reflog)()
+    error = git_reflog_read(ct.byref(reflog), repo, refname)
+    if error < 0:
+        return error
+    try:
+        return git_transaction_set_reflog(tx, refname, reflog)
+    finally:
+        git_reflog_free(reflog)
@@ -0,0 +1,57 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+import ctypes as ct
+
+import libgit2
+
+GIT_ENV = dict(os.environ,
+               GIT_AUTHOR_NAME="Tester",    GIT_AUTHOR_EMAIL="tester@example.com",
+               GIT_COMMITTER_NAME="Tester", GIT_COMMITTER_EMAIL="tester@example.com",
+               GIT_CONFIG_NOSYSTEM="1")
+
+
+class GitRepoTestCase(unittest.TestCase):
+    """Test case with a scratch repository, built with the git CLI."""
+
+    def setUp(self):
+        libgit2.git_libgit2_init()
+        self.tmpdir = tempfile.mkdtemp(prefix="libgit2-test-")
+        self.path = os.path.join(self.tmpdir, "repo")
+        self.git("init", "-q", "-b", "main", self.path, cwd=self.tmpdir)
+        self.repo = self.open_repo()
+
+    def tearDown(self):
+        libgit2.git_repository_free(self.repo)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        libgit2.git_libgit2_shutdown()
+
+    def open_repo(self, path=None):
+        repo = ct.POINTER(libgit2.git_repository)()
+        self.assertEqual(libgit2.git_repository_open(ct.byref(repo),
+                                                     os.fsencode(path or self.path)), 0)
+        return repo
+
+    def git(self, *args, cwd=None, input=None):
+        return subprocess.run(("git",) + args, cwd=cwd or self.path, env=GIT_ENV,
+                              input=input, capture_output=True, text=True,
+                              check=True).stdout.rstrip("\n")
+
+    def write(self, name, content):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def commit(self, message, **files):
+        for name, content in files.items():
+            self.write(name.replace("__", "/"), content)
+        self.git("add", "-A")
+        self.git("commit", "-q", "--allow-empty", "-m", message)
+        return self.git("rev-parse", "HEAD")
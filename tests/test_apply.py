@@ -0,0 +1,88 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+import subprocess
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class ApplyBatchTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        files = {"a.txt": "a\n", "src__b.txt": "".join("b{}\n".format(i) for i in range(20))}
+        self.base = self.commit("base", **files)
+        # The patches are made in another repository, so that none of the
+        # trees they lead to is in this one.
+        self.other = os.path.join(self.tmpdir, "other")
+        self.git("clone", "-q", self.path, self.other)
+        self.patches, self.trees = [], []
+        for i, change in enumerate(({"a.txt": "a\nmore\n"},
+                                    {"src__b.txt": files["src__b.txt"].replace("b5\n", "B5\n")},
+                                    {"src__c.txt": "c\n"},
+                                    {"a.txt": "a\nmore\nand more\n"})):
+            for name, content in change.items():
+                path = os.path.join(self.other, name.replace("__", "/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(content)
+            self.git("add", "-A", cwd=self.other)
+            self.git("commit", "-q", "-m", "change {}".format(i), cwd=self.other)
+            self.patches.append(self.git("diff", "HEAD~", "HEAD", cwd=self.other) + "\n")
+            self.trees.append(self.git("rev-parse", "HEAD^{tree}", cwd=self.other))
+
+    def diff(self, patch):
+        diff = ct.POINTER(libgit2.git_diff)()
+        data = patch.encode()
+        self.assertEqual(libgit2.git_diff_from_buffer(ct.byref(diff),
+                                                      ct.cast(data, ct.POINTER(ct.c_byte)),
+                                                      len(data)), 0)
+        self.addCleanup(libgit2.git_diff_free, diff)
+        return diff
+
+    def has_object(self, oid):
+        try:
+            self.git("cat-file", "-e", oid)
+        except subprocess.CalledProcessError:
+            return False
+        return True
+
+    def test_apply_batch(self):
+        result = libgit2.apply_batch(self.repo, self.base,
+                                     [self.diff(patch) for patch in self.patches],
+                                     checkpoint=3)
+        self.assertEqual(result.tree, self.trees[-1])
+        self.assertEqual(result.checkpoints, [self.trees[2], self.trees[3]])
+        self.assertEqual(result.errors, {})
+        self.assertEqual(self.git("ls-tree", "-r", result.tree),
+                         self.git("ls-tree", "-r", self.trees[-1], cwd=self.other))
+        # Only the checkpointed trees were written.
+        self.assertEqual([self.has_object(tree) for tree in self.trees],
+                         [False, False, True, True])
+
+    def test_errors(self):
+        with libgit2.ApplyBatch(self.repo, self.base) as batch:
+            # Applies to the postimage of the first patch only.
+            error = batch.apply(self.diff(self.patches[3]))
+            self.assertIsInstance(error, libgit2.GitError)
+            self.assertEqual(batch.tree, self.git("rev-parse", self.base + "^{tree}"))
+            self.assertIsNone(batch.apply(self.diff(self.patches[0])))
+            self.assertIsNone(batch.apply(self.diff(self.patches[1])))
+            self.assertEqual(batch.applied, 2)
+            self.assertEqual(batch.errors, {0: error})
+            tree = batch.tree
+            self.assertFalse(self.has_object(tree))
+        self.assertEqual(batch.close().checkpoints, [tree])
+        self.assertTrue(self.has_object(tree))
+        self.assertEqual(self.git("diff", "--name-only", self.base, tree).split(),
+                         ["a.txt", "src/b.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
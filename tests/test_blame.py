@@ -0,0 +1,146 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class BlameTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lines = ["line {}\n".format(i) for i in range(1, 9)]
+        self.commit("first", **{"f.txt": "".join(self.lines)})
+        self.change(2, "second")
+        self.git("checkout", "-q", "-b", "topic")
+        self.change(1, "topic")
+        self.git("checkout", "-q", "main")
+        for i in range(3, 9):
+            self.change(i, "main {}".format(i))
+
+    def change(self, lineno, message):
+        self.lines[lineno - 1] = "{} {}\n".format(message, lineno)
+        return self.commit(message, **{"f.txt": "".join(self.lines)})
+
+    def git_blame(self, commit, path, start=None, end=None, since=None):
+        # Commit id of every (selected) line.
+        return [sha for sha, _ in self.git_blame_origins(commit, path, start, end, since)]
+
+    def git_blame_origins(self, commit, path, start=None, end=None, since=None):
+        # (commit id, line number in that commit) of every (selected) line.
+        args = ("-L{},{}".format(start, end),) if start is not None else ()
+        revs = "{}..{}".format(since, commit) if since is not None else commit
+        output = self.git("blame", "--porcelain", *args, revs, "--", path)
+        return [(line.split()[0], int(line.split()[1])) for line in output.splitlines()
+                if len(line.split()) >= 3 and len(line.split()[0]) == 40
+                and not line.startswith(("author", "committer"))]
+
+    def line_commits(self, result, start, end):
+        return [result.hunk_byline(lineno).commit.id for lineno in range(start, end + 1)]
+
+    def line_origins(self, result):
+        origins = []
+        for hunk in result:
+            origins.extend((hunk.commit.id, hunk.orig_start_line_number + i)
+                           for i in range(hunk.lines_in_hunk))
+        return origins
+
+    def blame_options(self, commit):
+        opts = libgit2.git_blame_options()
+        libgit2.git_blame_options_init(ct.byref(opts), libgit2.GIT_BLAME_OPTIONS_VERSION)
+        libgit2.git_oid_fromstr(ct.byref(opts.newest_commit),
+                                self.git("rev-parse", commit).encode())
+        return opts
+
+
+class BlameFileTestCase(BlameTestCase):
+
+    def test_blame_file(self):
+        for commit in ("main", "topic", "main~3"):
+            with self.subTest(commit=commit):
+                result = libgit2.blame_file(self.repo, "f.txt", self.blame_options(commit))
+                self.assertEqual(result.commit_id, self.git("rev-parse", commit))
+                self.assertEqual(result.num_lines, len(self.lines))
+                self.assertEqual(self.line_origins(result),
+                                 self.git_blame_origins(commit, "f.txt"))
+                self.assertEqual(self.line_commits(result, 1, len(self.lines)),
+                                 self.git_blame(commit, "f.txt"))
+                self.assertIsNone(result.hunk_byline(len(self.lines) + 1))
+                self.assertEqual(result.hunk_index_byline(0), -1)
+
+    def test_blame_many(self):
+        for name in ("a", "b", "c"):
+            self.commit(name, **{name + ".txt": "{0}\n{0}\n".format(name)})
+        self.commit("change b", **{"b.txt": "b\nchanged\n"})
+        paths = ["a.txt", "b.txt", "c.txt", "f.txt", "none.txt"]
+        results = dict(libgit2.blame_many(self.repo, paths, workers=2))
+        self.assertEqual(sorted(results), paths)
+        self.assertIsInstance(results.pop("none.txt"), libgit2.GitError)
+        for path, result in results.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.line_origins(result),
+                                 self.git_blame_origins("HEAD", path))
+        # Options apply to every file.
+        results = dict(libgit2.blame_many(self.repo, ["a.txt", "b.txt"],
+                                          options=self.blame_options("HEAD~1")))
+        self.assertEqual(self.line_origins(results["b.txt"]),
+                         self.git_blame_origins("HEAD~1", "b.txt"))
+
+
+class BlameServiceTestCase(BlameTestCase):
+
+    def test_blame(self):
+        # Insertions, deletions and changes, one commit after another.
+        commits = [self.git("rev-parse", "HEAD")]
+        for i, edit in enumerate((lambda lines: lines.insert(0, "new first\n"),
+                                  lambda lines: lines.insert(4, "inserted\n"),
+                                  lambda lines: lines.pop(2),
+                                  lambda lines: lines.__setitem__(slice(5, 7), ["x\n"]),
+                                  lambda lines: lines.append("last\n"))):
+            edit(self.lines)
+            commits.append(self.commit("edit {}".format(i), **{"f.txt": "".join(self.lines)}))
+        with libgit2.BlameService(self.repo) as service:
+            for commit in commits + [commits[0], self.git("rev-parse", "topic")]:
+                with self.subTest(commit=commit):
+                    result = service.blame("f.txt", commit)
+                    self.assertEqual(self.line_origins(result),
+                                     self.git_blame_origins(commit, "f.txt"))
+            self.assertIs(service.blame("f.txt"), service.blame("f.txt", commits[-1]))
+            self.assertEqual(service.stats["incremental"], len(commits) - 1)
+            self.assertEqual(service.stats["hits"], 3)
+
+    def test_blame_lines(self):
+        with libgit2.BlameService(self.repo) as service:
+            for start, end in ((1, 3), (2, 2), (5, 8)):
+                with self.subTest(start=start, end=end):
+                    result = service.blame_lines("f.txt", start, end)
+                    self.assertEqual(self.line_commits(result, start, end),
+                                     self.git_blame("HEAD", "f.txt", start, end))
+            since = self.git("rev-parse", "HEAD~3")
+            result = service.blame_lines("f.txt", 1, 8, since=since)
+            self.assertEqual(self.line_commits(result, 1, 8),
+                             self.git_blame("HEAD", "f.txt", 1, 8, since=since))
+            self.assertEqual([lineno for lineno in range(1, 9)
+                              if result.hunk_byline(lineno).boundary], [1, 2, 3, 4, 5])
+            self.assertIs(service.blame_lines("f.txt", 1, 3), service.blame_lines("f.txt", 1, 3))
+
+    def test_blame_lines_history_index(self):
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index, \
+             libgit2.BlameService(self.repo, history_index=index) as service:
+            for commit in ("main", "topic"):
+                sha = self.git("rev-parse", commit)
+                with self.subTest(commit=commit):
+                    result = service.blame_lines("f.txt", 1, 3, commit=sha)
+                    self.assertEqual(self.line_commits(result, 1, 3),
+                                     self.git_blame(commit, "f.txt", 1, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
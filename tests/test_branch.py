@@ -0,0 +1,78 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class BranchSummaryTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        base = self.commit("base")
+        self.git("remote", "add", "origin", os.path.join(self.tmpdir, "origin"))
+        self.git("update-ref", "refs/remotes/origin/main", self.commit("upstream 1"))
+        self.git("update-ref", "refs/remotes/origin/main", self.commit("upstream 2"))
+        self.git("update-ref", "refs/remotes/origin/topic", base)
+        self.git("reset", "-q", "--hard", base)
+        self.commit("local")
+        self.git("branch", "--set-upstream-to=origin/main")
+        self.git("branch", "topic", base)
+        self.git("branch", "--set-upstream-to=origin/topic", "topic")
+        self.git("branch", "gone", base)
+        self.git("config", "branch.gone.remote", "origin")
+        self.git("config", "branch.gone.merge", "refs/heads/gone")
+        self.git("branch", "local", base)
+        self.git("worktree", "add", "-q", "-b", "wt", os.path.join(self.tmpdir, "wt"), base)
+
+    def git_summary(self):
+        output = self.git("for-each-ref", "refs/heads/",
+                          "--format=%(refname:short)\t%(objectname)\t%(upstream)\t"
+                          "%(HEAD)\t%(worktreepath)")
+        summary = []
+        for line in output.splitlines():
+            name, target, upstream, head, worktree = line.split("\t")
+            upstream_target = ahead = behind = None
+            if upstream and self.git("for-each-ref", upstream):
+                upstream_target = self.git("rev-parse", upstream)
+                ahead, behind = map(int, self.git("rev-list", "--left-right", "--count",
+                                                  "{}...{}".format(name, upstream)).split())
+            summary.append(libgit2.BranchSummary(name, target, upstream or None,
+                                                 upstream_target, ahead, behind,
+                                                 head == "*", bool(worktree)))
+        return summary
+
+    def test_branch_summary(self):
+        cache = {}
+        summary = libgit2.branch_summary(self.repo, workers=2, cache=cache)
+        self.assertEqual(summary, self.git_summary())
+        self.assertEqual([branch.name for branch in summary if branch.checked_out],
+                         ["main", "wt"])
+        self.assertEqual({branch.name: (branch.ahead, branch.behind) for branch in summary
+                          if branch.upstream is not None},
+                         {"main": (1, 2), "topic": (0, 0), "gone": (None, None)})
+        self.assertEqual(len(cache), 2)
+        # The counts come from the cache now.
+        for pair in cache:
+            cache[pair] = (7, 7)
+        self.assertEqual({branch.name: branch.ahead for branch in
+                          libgit2.branch_summary(self.repo, cache=cache)}["main"], 7)
+
+    def test_worktree(self):
+        repo = self.open_repo(os.path.join(self.tmpdir, "wt"))
+        try:
+            summary = libgit2.branch_summary(repo)
+        finally:
+            libgit2.git_repository_free(repo)
+        self.assertEqual([branch.name for branch in summary if branch.is_head], ["wt"])
+        self.assertEqual([branch.name for branch in summary if branch.checked_out],
+                         ["main", "wt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
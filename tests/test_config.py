@@ -0,0 +1,73 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class ConfigViewTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.git("config", "test.name", "value")
+        self.git("config", "test.flag", "yes")
+        self.git("config", "test.size", "2k")
+        self.git("config", "test.dir", "~/somewhere")
+        self.git("config", "--add", "test.multi", "one")
+        self.git("config", "--add", "test.multi", "two")
+        self.git("config", "Test.Sub.Key", "sub")
+        # A relative include in an included file is relative to that file.
+        self.git("config", "include.path", "inc/first.cfg")
+        self.write(".git/inc/first.cfg", "[include]\n\tpath = second.cfg\n"
+                                         "[test]\n\tfirst = 1\n")
+        self.write(".git/inc/second.cfg", "[test]\n\tsecond = 2\n")
+        self.config = libgit2.ConfigView(self.repo, interval=0)
+
+    def git_config(self, *args):
+        return self.git("config", *args)
+
+    def test_get(self):
+        for name in ("test.name", "test.first", "test.second", "test.Sub.key",
+                     "TEST.Sub.KEY", "test.multi"):
+            with self.subTest(name=name):
+                self.assertIn(name, self.config)
+                self.assertEqual(self.config.get(name), self.git_config("--get", name))
+        self.assertNotIn("test.missing", self.config)
+        self.assertNotIn("test.sub.key", self.config)
+        self.assertEqual(self.config.get("test.missing", "default"), "default")
+        self.assertEqual(self.config.get_all("test.multi"),
+                         self.git_config("--get-all", "test.multi").splitlines())
+        self.assertIn("test.Sub.key", self.config.names())
+
+    def test_typed(self):
+        self.assertIs(self.config.get_bool("test.flag"), True)
+        self.assertEqual(self.config.get_int("test.size"),
+                         int(self.git_config("--type=int", "test.size")))
+        self.assertEqual(self.config.get_path("test.dir"),
+                         self.git_config("--type=path", "test.dir"))
+        self.assertEqual(self.config.get_bool("test.missing", False), False)
+
+    def test_refresh(self):
+        self.assertFalse(self.config.refresh())
+        self.git("config", "test.name", "changed")
+        self.assertEqual(self.config.get("test.name"), "changed")
+        self.write(".git/inc/second.cfg", "[test]\n\tsecond = changed\n")
+        self.assertEqual(self.config.get("test.second"), "changed")
+        self.write(".git/config.worktree", "[test]\n\tworktree = 1\n")
+        self.assertTrue(self.config.refresh())
+
+    def test_interval(self):
+        config = libgit2.ConfigView(self.repo, interval=3600)
+        self.git("config", "test.name", "changed")
+        self.assertEqual(config.get("test.name"), "value")
+        self.assertTrue(config.refresh())
+        self.assertEqual(config.get("test.name"), "changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import subprocess
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class DescribeBatchTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.commit("untagged root")
+        self.commit("light")
+        self.git("tag", "light")
+        self.commit("v1")
+        self.git("tag", "-a", "v1.0", "-m", "v1.0")
+        self.commit("after v1")
+        self.git("checkout", "-q", "-b", "topic")
+        self.commit("topic 1")
+        self.git("tag", "-a", "topic-tag", "-m", "topic")
+        self.commit("topic 2")
+        self.git("checkout", "-q", "main")
+        self.commit("main 1")
+        self.git("tag", "-a", "v1.1", "-m", "v1.1")
+        self.commit("main 2")
+        self.git("merge", "-q", "--no-ff", "-m", "merge topic", "topic")
+        self.commit("after merge")
+        self.git("checkout", "-q", "--orphan", "orphan")
+        self.commit("orphan root")
+        self.git("checkout", "-q", "main")
+
+    def git_describe(self, commit):
+        try:
+            return self.git("describe", "--abbrev=7", commit)
+        except subprocess.CalledProcessError:
+            return None
+
+    def test_describe_batch(self):
+        commits = self.git("rev-list", "--all").split()
+        results = libgit2.describe_batch(self.repo, commits + commits[:2])
+        self.assertEqual(results[len(commits):], results[:2])
+        for commit, result in zip(commits, results):
+            with self.subTest(commit=commit):
+                expected = self.git_describe(commit)
+                if expected is None:
+                    self.assertIsInstance(result, libgit2.GitError)
+                    self.assertEqual(result.code, libgit2.GIT_ENOTFOUND)
+                else:
+                    self.assertEqual(result, expected)
+
+    def test_no_tags(self):
+        self.git("tag", "-d", "light", "v1.0", "v1.1", "topic-tag")
+        result, = libgit2.describe_batch(self.repo, [self.git("rev-parse", "HEAD")])
+        self.assertIsInstance(result, libgit2.GitError)
+        self.assertEqual(result.code, libgit2.GIT_ENOTFOUND)
+
+
+if __name__ == "__main__":
+    unittest.main()
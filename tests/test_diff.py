@@ -0,0 +1,139 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+def lines(count, prefix="line"):
+    return "".join("{} {}\n".format(prefix, i) for i in range(count))
+
+
+class DiffTestCase(GitRepoTestCase):
+
+    def tree_diff(self, old, new):
+        trees = []
+        for spec in (old, new):
+            obj = ct.POINTER(libgit2.git_object)()
+            self.assertEqual(libgit2.git_revparse_single(ct.byref(obj), self.repo,
+                                                         (spec + "^{tree}").encode()), 0)
+            trees.append(ct.cast(obj, ct.POINTER(libgit2.git_tree)))
+        diff = ct.POINTER(libgit2.git_diff)()
+        try:
+            self.assertEqual(libgit2.git_diff_tree_to_tree(ct.byref(diff), self.repo,
+                                                           trees[0], trees[1], None), 0)
+        finally:
+            for tree in trees:
+                libgit2.git_tree_free(tree)
+        self.addCleanup(libgit2.git_diff_free, diff)
+        return diff
+
+
+class DiffFindSimilarTestCase(DiffTestCase):
+
+    status_codes = {libgit2.GIT_DELTA_ADDED:    "A",
+                    libgit2.GIT_DELTA_DELETED:  "D",
+                    libgit2.GIT_DELTA_MODIFIED: "M",
+                    libgit2.GIT_DELTA_RENAMED:  "R"}
+
+    def setUp(self):
+        super().setUp()
+        self.old = self.commit("first", **{"a.txt": lines(40, "a"), "b.txt": lines(40, "b"),
+                                           "c.txt": lines(40, "c"), "d.txt": lines(5, "d")})
+        self.git("rm", "-q", "a.txt", "b.txt", "d.txt")
+        self.new = self.commit("second", **{"dir__a.txt": lines(40, "a") + "more\n",
+                                            "b2.txt": lines(40, "b"),
+                                            "c.txt": lines(41, "c"), "e.txt": lines(7, "e")})
+
+    def name_status(self, diff):
+        result = []
+        for idx in range(libgit2.git_diff_num_deltas(diff)):
+            delta = libgit2.git_diff_get_delta(diff, idx).contents
+            code = self.status_codes[delta.status]
+            if delta.status == libgit2.GIT_DELTA_RENAMED:
+                code += "{:03d}".format(delta.similarity)
+            paths = [delta.old_file.path.decode(), delta.new_file.path.decode()]
+            result.append([code] + (paths if code[0] == "R" else paths[1:]))
+        return sorted(result, key=lambda entry: entry[-1])
+
+    def test_renames(self):
+        expected = sorted((line.split("\t") for line in
+                           self.git("diff", "-M", "--name-status", self.old, self.new)
+                           .splitlines()), key=lambda entry: entry[-1])
+        cache = libgit2.HashsigCache()
+        for _ in range(2):
+            diff = self.tree_diff(self.old, self.new)
+            self.assertIs(libgit2.diff_find_similar_cached(self.repo, diff,
+                                                           cache=cache, workers=2), cache)
+            self.assertEqual([entry[0][0] + "\t".join(entry[1:]) for entry in
+                              self.name_status(diff)],
+                             [entry[0][0] + "\t".join(entry[1:]) for entry in expected])
+        # Same result (similarity scores included) as the built-in metric.
+        stock = self.tree_diff(self.old, self.new)
+        self.assertEqual(libgit2.git_diff_find_similar(stock, None), 0)
+        self.assertEqual(self.name_status(diff), self.name_status(stock))
+        self.assertGreater(len(cache), 0)
+        cache.max_entries = 1
+        cache.trim()
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_find_all_small_files(self):
+        # Small files are compared too, so that a slightly modified one is
+        # not broken into an addition and a deletion.
+        third  = self.commit("third",  **{"f.txt": "a\nb\nc\n"})
+        fourth = self.commit("fourth", **{"f.txt": "a\nb\nd\n", "e.txt": lines(5, "e")})
+        for old, new in ((self.old, self.new), (third, fourth)):
+            opts = libgit2.git_diff_find_options()
+            self.assertEqual(libgit2.git_diff_find_options_init(
+                             ct.byref(opts), libgit2.GIT_DIFF_FIND_OPTIONS_VERSION), 0)
+            opts.flags = libgit2.GIT_DIFF_FIND_ALL
+            diff = self.tree_diff(old, new)
+            libgit2.diff_find_similar_cached(self.repo, diff, opts, workers=2)
+            stock = self.tree_diff(old, new)
+            self.assertEqual(libgit2.git_diff_find_similar(stock, ct.byref(opts)), 0)
+            self.assertEqual(self.name_status(diff), self.name_status(stock))
+        self.assertEqual(self.name_status(diff), [["M", "e.txt"], ["M", "f.txt"]])
+
+
+class PatchIdsTestCase(DiffTestCase):
+
+    def git_patch_ids(self, *commits):
+        output = self.git("patch-id", "--stable",
+                          input=self.git("show", "--format=commit %H", *commits))
+        return {commit: patch_id for patch_id, commit in
+                (line.split() for line in output.splitlines())}
+
+    def test_patch_ids(self):
+        root = self.commit("root", **{"a.txt": lines(10)})
+        self.git("checkout", "-q", "-b", "topic")
+        picked = self.commit("change", **{"a.txt": lines(11), "b.txt": "b\n"})
+        self.git("checkout", "-q", "main")
+        other = self.commit("other", **{"c.txt": "c\n"})
+        self.git("cherry-pick", picked)
+        cherry = self.git("rev-parse", "HEAD")
+        self.git("merge", "-q", "--no-ff", "-m", "merge", "topic")
+        merge = self.git("rev-parse", "HEAD")
+
+        commits = [root, picked, other, cherry, merge]
+        cache = {}
+        ids = libgit2.patch_ids(self.repo, commits, workers=2, cache=cache)
+        self.assertEqual(list(ids), commits)
+        self.assertEqual({commit: patch_id for commit, patch_id in ids.items()
+                          if patch_id is not None},
+                         self.git_patch_ids(root, picked, other, cherry))
+        self.assertIsNone(ids[merge])
+        self.assertEqual(ids[picked], ids[cherry])
+        cache[other] = "cached"
+        self.assertEqual(libgit2.patch_ids(self.repo, [other], cache=cache),
+                         {other: "cached"})
+
+
+if __name__ == "__main__":
+    unittest.main()
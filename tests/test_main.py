@@ -14,3 +14,13 @@ class MainTestCase(unittest.TestCase):
 
     def test_main(self):
         pass
+
+    def test_namespace(self):
+        # The helpers' own imports must not leak through the star imports.
+        for name in ("threading", "array", "bisect", "itertools", "time", "fnmatch",
+                     "sqlite3", "re", "binascii", "struct", "mmap", "stat", "abc",
+                     "namedtuple", "OrderedDict", "deque", "ThreadPoolExecutor",
+                     "FIRST_COMPLETED", "wait", "is_linux", "git_hashsig_create",
+                     "git_mempack_new", "git_reference__alloc"):
+            with self.subTest(name=name):
+                self.assertFalse(hasattr(libgit2, name))
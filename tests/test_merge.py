@@ -0,0 +1,130 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import subprocess
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase, GIT_ENV
+
+
+class MergeTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        text = "".join("line {}\n".format(i) for i in range(20))
+        self.base = self.commit("base", **{"x.txt": text, "y.txt": text})
+        self.branches = {}
+        for name, files in (("ours",     {"x.txt": text.replace("line 3\n", "ours\n")}),
+                            ("theirs",   {"x.txt": text.replace("line 3\n", "theirs\n")}),
+                            ("other",    {"y.txt": text.replace("line 15\n", "other\n")}),
+                            ("nearby",   {"x.txt": text.replace("line 16\n", "nearby\n")}),
+                            ("same",     {"z.txt": "z\n"})):
+            self.git("checkout", "-q", "-b", name, self.base)
+            self.branches[name] = self.commit(name, **files)
+        # A criss-cross history: two merge bases.
+        self.git("checkout", "-q", "-b", "cross1", self.branches["other"])
+        self.git("merge", "-q", "--no-ff", "-m", "cross1", "nearby")
+        self.git("checkout", "-q", "-b", "cross2", self.branches["nearby"])
+        self.git("merge", "-q", "--no-ff", "-m", "cross2", "other")
+        self.branches["cross2"] = self.commit("after cross2", **{"y.txt": "y\n"})
+        self.git("checkout", "-q", "cross1")
+        self.branches["cross1"] = self.commit("after cross1", **{"x.txt": "x\n"})
+        self.git("checkout", "-q", "--orphan", "unrelated")
+        self.git("rm", "-q", "-r", "-f", ".")
+        self.branches["unrelated"] = self.commit("unrelated", **{"u.txt": "u\n"})
+
+    def run_git(self, *args):
+        # Output and exit status, without raising on a non-zero status.
+        process = subprocess.run(("git",) + args, cwd=self.path, env=GIT_ENV,
+                                 capture_output=True, text=True)
+        return process.stdout.rstrip("\n"), process.returncode
+
+    def git_merge_tree(self, ours, theirs):
+        output, status = self.run_git("merge-tree", "--write-tree", "--name-only",
+                                      ours, theirs)
+        self.assertIn(status, (0, 1))
+        conflicts = output.split("\n\n")[0].splitlines()[1:]
+        return status == 0, conflicts
+
+    def git_merge_bases(self, *commits):
+        # All the best common ancestors (empty for unrelated commits).
+        output, status = self.run_git("merge-base", "--all",
+                                      *(("--octopus",) if len(commits) > 2 else ()),
+                                      *commits)
+        self.assertIn(status, (0, 1))
+        return output.split()
+
+
+class MergeabilityCheckerTestCase(MergeTestCase):
+
+    pairs = [("ours", "theirs"), ("theirs", "ours"), ("ours", "other"), ("ours", "nearby"),
+             ("other", "same"), ("ours", "ours"), ("cross1", "cross2"), ("cross2", "cross1"),
+             ("cross1", "theirs")]
+
+    def test_check(self):
+        with libgit2.MergeabilityChecker(self.repo) as checker:
+            for ours, theirs in self.pairs:
+                with self.subTest(ours=ours, theirs=theirs):
+                    result = checker.check(self.branches[ours], self.branches[theirs])
+                    mergeable, conflicts = self.git_merge_tree(self.branches[ours],
+                                                               self.branches[theirs])
+                    self.assertEqual(result.mergeable, mergeable)
+                    self.assertEqual(result.conflicts, conflicts)
+                    self.assertEqual(sorted(result.bases),
+                                     sorted(self.git("merge-base", "--all",
+                                                     self.branches[ours],
+                                                     self.branches[theirs]).split()))
+
+    def test_unrelated(self):
+        with libgit2.MergeabilityChecker(self.repo) as checker:
+            self.assertEqual(checker.check(self.branches["ours"], self.branches["unrelated"]),
+                             libgit2.Mergeability(True, [], []))
+            # Added on both sides.
+            unrelated = self.commit("unrelated 2", **{"x.txt": "unrelated\n"})
+            self.assertEqual(checker.check(self.branches["ours"], unrelated),
+                             libgit2.Mergeability(False, [], ["x.txt"]))
+
+    def test_check_many(self):
+        pairs = [(self.branches[ours], self.branches[theirs]) for ours, theirs in self.pairs]
+        with libgit2.MergeabilityChecker(self.repo) as checker:
+            results = checker.check_many(pairs + [("0" * 40, self.base)], workers=3)
+            self.assertIsInstance(results[-1], libgit2.GitError)
+            self.assertEqual(results[:-1], [checker.check(*pair) for pair in pairs])
+            # The second round was answered from the caches.
+            self.assertGreaterEqual(checker.stats["base_hits"], len(pairs))
+            self.assertGreater(checker.stats["merge_hits"], 0)
+
+
+class MergeBaseBatchTestCase(MergeTestCase):
+
+    def test_merge_base_batch(self):
+        names = ["ours", "theirs", "other", "cross1", "cross2", "unrelated"]
+        items = [(self.branches[one], self.branches[two])
+                 for one in names for two in names if one != two]
+        items += [(self.branches["ours"], self.branches["theirs"], self.branches["other"]),
+                  (self.branches["ours"],)]
+        cache = {}
+        bases = libgit2.merge_base_batch(self.repo, items, workers=3, cache=cache)
+        for item, base in zip(items, bases):
+            with self.subTest(item=item):
+                if len(item) == 1:
+                    self.assertEqual(base, item[0])
+                elif base is None:
+                    self.assertEqual(self.git_merge_bases(*item), [])
+                else:
+                    # One of them for criss-cross merges.
+                    self.assertIn(base, self.git_merge_bases(*item))
+        self.assertIsNone(bases[items.index((self.branches["ours"],
+                                             self.branches["unrelated"]))])
+        self.assertEqual(len(cache), len(items) // 2 + 1)
+        # The results come from the cache now.
+        cache[tuple(sorted(items[0]))] = "cached"
+        self.assertEqual(libgit2.merge_base_batch(self.repo, items[:1], cache=cache),
+                         ["cached"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class DiffPatchesTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        files = dict(("dir{}__file{}.txt".format(i % 7, i),
+                      "".join("line {}\n".format(j) for j in range(i % 13 + 1)))
+                     for i in range(60))
+        self.old = self.commit("first", **files, image__bin="\0\1\2")
+        for i in range(0, 60, 3):
+            files["dir{}__file{}.txt".format(i % 7, i)] = "changed {}\nline 0\n".format(i)
+        files["new__file.txt"] = "new\n"
+        self.new = self.commit("second", **files, image__bin="\0\1\3\4")
+
+    def make_diff(self, repo):
+        trees = []
+        for spec in (self.old, self.new):
+            obj = ct.POINTER(libgit2.git_object)()
+            self.assertEqual(libgit2.git_revparse_single(ct.byref(obj), repo,
+                                                         (spec + "^{tree}").encode()), 0)
+            trees.append(ct.cast(obj, ct.POINTER(libgit2.git_tree)))
+        diff = ct.POINTER(libgit2.git_diff)()
+        try:
+            self.assertEqual(libgit2.git_diff_tree_to_tree(ct.byref(diff), repo,
+                                                           trees[0], trees[1], None), 0)
+        finally:
+            for tree in trees:
+                libgit2.git_tree_free(tree)
+        return diff
+
+    def test_diff_iter(self):
+        # Hunk headers and lines as in `git diff -U3`.
+        expected = []
+        for line in self.git("diff", "--no-color", "--no-renames", self.old, self.new,
+                             "--", "*.txt").splitlines():
+            if line.startswith("@@"):
+                expected.append(line)
+            elif line[:1] in (" ", "+", "-") and not line.startswith(("+++", "---")):
+                expected.append(line)
+        diff = self.make_diff(self.repo)
+        try:
+            records = list(libgit2.diff_iter(diff, binary=False))
+            self.assertEqual([record.new_path for record in records],
+                             self.git("diff", "--name-only", self.old, self.new,
+                                      "--", "*.txt").split())
+            # The skipped binary delta keeps its position in the diff.
+            self.assertEqual([record.index for record in records],
+                             [record.index for record in libgit2.diff_iter(diff)
+                              if record.new_path != "image/bin"])
+            result = []
+            for record in records:
+                for hunk in record.hunks:
+                    result.append(hunk.header.rstrip("\n"))
+                    result.extend(line.origin + line.content.decode().rstrip("\n")
+                                  for line in hunk.lines)
+            self.assertEqual(result, expected)
+            # Without hunks only the deltas are read.
+            deltas = list(libgit2.diff_iter(diff, hunks=False))
+            self.assertEqual([(record.status, record.old_id, record.new_id)
+                              for record in deltas],
+                             [(record.status, record.old_id, record.new_id)
+                              for record in libgit2.diff_iter(diff)])
+            self.assertTrue(all(record.hunks is None for record in deltas))
+            # Without content the line numbers are still known.
+            hunk = next(libgit2.diff_iter(diff, content=False)).hunks[0]
+            self.assertTrue(all(line.content is None for line in hunk.lines))
+            self.assertEqual(hunk.lines[0].new_lineno, hunk.new_start)
+        finally:
+            libgit2.git_diff_free(diff)
+
+    def test_patches(self):
+        expected = self.git("diff", "--no-color", "--no-renames", self.old, self.new) + "\n"
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                records = list(libgit2.diff_patches(self.make_diff, workers,
+                                                    max_pending=3, repo=self.repo))
+                self.assertEqual([record.index for record in records],
+                                 list(range(len(records))))
+                self.assertEqual(b"".join(record.patch for record in records).decode(),
+                                 expected)
+
+    def test_shared_diff(self):
+        diff = self.make_diff(self.repo)
+        try:
+            records = list(libgit2.diff_patches(diff, workers=4))
+        finally:
+            libgit2.git_diff_free(diff)
+        self.assertEqual(records, list(libgit2.diff_patches(self.make_diff, 4,
+                                                            repo=self.repo)))
+
+    def test_numstat(self):
+        expected = [line.split("\t") for line in
+                    self.git("diff", "--numstat", "--no-renames", self.old, self.new)
+                    .splitlines()]
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                stat = libgit2.diff_numstat(self.make_diff, workers, repo=self.repo)
+                self.assertEqual([["-", "-", path] if binary else [str(adds), str(dels), path]
+                                  for path, adds, dels, binary in
+                                  zip(stat.paths, stat.additions,
+                                      stat.deletions, stat.binary)],
+                                 expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
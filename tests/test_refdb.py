@@ -0,0 +1,178 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+import time
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class RefdbMaintenanceTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.head = self.commit("first")
+        self.git("tag", "v1")
+        self.git("pack-refs", "--all")
+        self.add_loose(3)
+
+    def add_loose(self, count, start=0):
+        self.git("update-ref", "--stdin",
+                 input="".join("create refs/heads/loose{} {}\n".format(i, self.head)
+                               for i in range(start, start + count)))
+
+    def git_loose_refs(self):
+        # Names of the reference files under refs/, as git sees them.
+        refs = self.git("for-each-ref", "--format=%(refname)").split()
+        return sorted(name for name in refs
+                      if os.path.isfile(os.path.join(self.path, ".git", name)))
+
+    def test_due(self):
+        maintenance = libgit2.RefdbMaintenance(self.repo, max_loose=5)
+        self.assertEqual(sorted(name.decode() for name in maintenance.loose_refs()),
+                         self.git_loose_refs())
+        self.assertIsNone(maintenance.due())
+        self.assertIsNone(maintenance.run())
+        self.add_loose(2, start=3)
+        self.assertEqual(maintenance.due(), "loose")
+        maintenance.max_loose = None
+        maintenance.max_age = 3600
+        self.assertIsNone(maintenance.due())
+        packed_refs = os.path.join(self.path, ".git", "packed-refs")
+        os.utime(packed_refs, (time.time() - 7200,) * 2)
+        self.assertGreaterEqual(maintenance.packed_age(), 7200)
+        self.assertEqual(maintenance.due(), "age")
+
+    def test_run(self):
+        refs = self.git("for-each-ref", "--format=%(refname) %(objectname)")
+        maintenance = libgit2.RefdbMaintenance(self.repo, max_loose=3, sample_size=2)
+        record = maintenance.run()
+        self.assertEqual(record["reason"], "loose")
+        self.assertEqual((record["loose_before"], record["loose_after"]), (3, 0))
+        self.assertEqual(maintenance.history, [record])
+        self.assertEqual(self.git_loose_refs(), [])
+        self.assertEqual(self.git("for-each-ref", "--format=%(refname) %(objectname)"), refs)
+        self.assertIsNone(maintenance.run())
+        self.assertEqual(maintenance.run(force=True)["reason"], "forced")
+
+    def test_locked(self):
+        maintenance = libgit2.RefdbMaintenance(self.repo, max_loose=1)
+        lock = os.path.join(self.path, ".git", "packed-refs.lock")
+        open(lock, "w").close()
+        try:
+            self.assertIsNone(maintenance.run())
+        finally:
+            os.remove(lock)
+        self.assertEqual(len(self.git_loose_refs()), 3)
+        self.assertIsNotNone(maintenance.run())
+
+    def test_thread(self):
+        with libgit2.RefdbMaintenance(self.repo, max_loose=1, interval=0.01) as maintenance:
+            maintenance.start()
+            deadline = time.monotonic() + 10
+            while not maintenance.history and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(maintenance.history), 1)
+        self.assertEqual(maintenance.errors, [])
+        self.assertEqual(self.git_loose_refs(), [])
+
+
+class RefdbBackendTestCase(GitRepoTestCase):
+
+    backend_class = libgit2.MemoryRefdbBackend
+
+    def setUp(self):
+        super().setUp()
+        self.first  = self.commit("first")
+        self.second = self.commit("second")
+        self.backend = self.backend_class()
+        self.backend.install(self.repo)
+
+    def oid(self, sha):
+        oid = libgit2.git_oid()
+        self.assertEqual(libgit2.git_oid_fromstr(ct.byref(oid), sha.encode()), 0)
+        return oid
+
+    def create(self, name, sha, force=False):
+        ref = ct.POINTER(libgit2.git_reference)()
+        error = libgit2.git_reference_create(ct.byref(ref), self.repo, name.encode(),
+                                             ct.byref(self.oid(sha)), int(force), b"create")
+        libgit2.git_reference_free(ref)
+        return error
+
+    def resolve(self, name):
+        oid = libgit2.git_oid()
+        if libgit2.git_reference_name_to_id(ct.byref(oid), self.repo, name.encode()) < 0:
+            return None
+        return bytes(oid.id).hex()
+
+    def names(self):
+        array = libgit2.git_strarray()
+        self.assertEqual(libgit2.git_reference_list(ct.byref(array), self.repo), 0)
+        try:
+            return [array.strings[i].decode() for i in range(array.count)]
+        finally:
+            libgit2.git_strarray_free(ct.byref(array))
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            libgit2.RefdbBackend()
+
+    def test_references(self):
+        self.assertEqual(self.create("refs/heads/main", self.first), 0)
+        self.assertEqual(self.create("refs/heads/main", self.second), libgit2.GIT_EEXISTS)
+        self.assertEqual(self.create("refs/heads/main", self.second, force=True), 0)
+        self.assertEqual(self.create("refs/heads/main/sub", self.second), libgit2.GIT_EEXISTS)
+        self.assertEqual(self.create("refs/tags/v1", self.first), 0)
+        ref = ct.POINTER(libgit2.git_reference)()
+        self.assertEqual(libgit2.git_reference_symbolic_create(
+                         ct.byref(ref), self.repo, b"HEAD", b"refs/heads/main", 1, None), 0)
+        libgit2.git_reference_free(ref)
+        self.assertEqual(self.resolve("HEAD"), self.second)
+        self.assertEqual(self.resolve("refs/tags/v1"), self.first)
+        self.assertEqual(self.names(), ["refs/heads/main", "refs/tags/v1"])
+
+        self.assertEqual(libgit2.git_reference_lookup(ct.byref(ref), self.repo,
+                                                      b"refs/tags/v1"), 0)
+        new = ct.POINTER(libgit2.git_reference)()
+        self.assertEqual(libgit2.git_reference_rename(ct.byref(new), ref, b"refs/tags/v2",
+                                                      0, None), 0)
+        self.assertEqual(libgit2.git_reference_delete(new), 0)
+        libgit2.git_reference_free(new)
+        libgit2.git_reference_free(ref)
+        self.assertEqual(self.names(), ["refs/heads/main"])
+        self.assertIsNone(self.resolve("refs/tags/v1"))
+
+    def test_transaction(self):
+        self.assertEqual(self.create("refs/heads/old", self.first), 0)
+        batch = libgit2.RefBatch(self.repo)
+        batch.update("refs/heads/old", self.second, old=self.first)
+        batch.create("refs/heads/new", self.first)
+        batch.delete("refs/heads/missing")
+        result = batch.commit()
+        self.assertEqual(sorted(result.applied), ["refs/heads/new", "refs/heads/old"])
+        self.assertEqual(list(result.failures), ["refs/heads/missing"])
+        self.assertEqual(self.resolve("refs/heads/old"), self.second)
+        self.assertEqual(self.resolve("refs/heads/new"), self.first)
+
+    def test_no_reflog(self):
+        self.assertEqual(self.create("refs/heads/main", self.first), 0)
+        self.assertEqual(libgit2.git_reference_has_log(self.repo, b"refs/heads/main"), 0)
+        reflog = ct.POINTER(libgit2.git_reflog)()
+        self.assertEqual(libgit2.git_reflog_read(ct.byref(reflog), self.repo,
+                                                 b"refs/heads/main"), libgit2.GIT_ENOTFOUND)
+        self.assertLess(libgit2.git_reference_ensure_log(self.repo, b"refs/heads/main"), 0)
+
+
+class SQLiteRefdbBackendTestCase(RefdbBackendTestCase):
+
+    backend_class = libgit2.SQLiteRefdbBackend
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class ReflogTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        commits = [self.commit("commit {}".format(i)) for i in range(4)]
+        # A log with known times and time zones (oldest first).
+        self.entries = [("0" * 40,   commits[0], "A U Thor", "a@example.com",
+                         1600000000, "+0000", "commit (initial): commit 0"),
+                        (commits[0], commits[1], "Bé Tester", "b@example.com",
+                         1600003600, "+0530", "commit: commit 1"),
+                        (commits[1], commits[2], "A U Thor", "a@example.com",
+                         1600007200, "-0700", ""),
+                        (commits[2], commits[3], "A U Thor", "a@example.com",
+                         1600010800, "+0100", "reset: moving to HEAD")]
+        self.log_path = os.path.join(self.path, ".git", "logs", "refs", "heads", "main")
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            for old, new, name, email, time, zone, message in self.entries:
+                f.write("{} {} {} <{}> {} {}{}\n".format(old, new, name, email, time, zone,
+                                                         "\t" + message if message else ""))
+
+    def git_reflog(self):
+        # (new id, name, email, time, message) of the entries, newest first.
+        output = self.git("log", "-g", "--date=raw", "refs/heads/main",
+                          "--format=%H%x09%gn%x09%ge%x09%gd%x09%gs")
+        result = []
+        for line in output.splitlines():
+            new, name, email, selector, message = line.split("\t")
+            time = int(selector.partition("{")[2].split()[0])
+            result.append((new, name, email, time, message))
+        return result
+
+    def test_reflog_columns(self):
+        columns = libgit2.reflog_columns(self.repo, "refs/heads/main")
+        self.assertEqual(len(columns), len(self.entries))
+        self.assertEqual([(new, name, email, time, message)
+                          for old, new, name, email, time, offset, message in columns],
+                         self.git_reflog())
+        self.assertEqual(list(columns.offsets), [60, -420, 330, 0])
+        self.assertEqual(columns[-1][0], "0" * 40)
+        self.assertEqual([entry[:2] for entry in columns],
+                         [entry[:2] for entry in reversed(self.entries)])
+        self.assertEqual(len(libgit2.reflog_columns(self.repo, "refs/heads/none")), 0)
+
+    def test_reflog_expire(self):
+        # Older than an hour before the newest entry.
+        self.assertEqual(libgit2.reflog_expire(self.repo, "refs/heads/main", max_age=3600,
+                                               now=1600010800), 2)
+        self.assertEqual([entry[3] for entry in self.git_reflog()], [1600010800, 1600007200])
+        # More kept entries allowed than there are.
+        self.assertEqual(libgit2.reflog_expire(self.repo, "refs/heads/main", max_count=3), 0)
+        self.assertEqual([entry[3] for entry in self.git_reflog()], [1600010800, 1600007200])
+        self.assertEqual(libgit2.reflog_expire(self.repo, "refs/heads/main", max_count=1), 1)
+        self.assertEqual([entry[3] for entry in self.git_reflog()], [1600010800])
+        self.assertEqual(libgit2.reflog_expire(self.repo, "refs/heads/main", max_count=1), 0)
+        self.assertEqual(libgit2.reflog_expire(self.repo, "refs/heads/none", max_count=0), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.path, ".git", "refs", "heads",
+                                                     "main.lock")))
+
+    def test_locked(self):
+        lock = os.path.join(self.path, ".git", "refs", "heads", "main.lock")
+        open(lock, "w").close()
+        with self.assertRaises(libgit2.GitError) as context:
+            libgit2.reflog_expire(self.repo, "refs/heads/main", max_count=0)
+        self.assertEqual(context.exception.code, libgit2.GIT_ELOCKED)
+        self.assertTrue(os.path.exists(lock))
+        self.assertEqual(len(self.git_reflog()), len(self.entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
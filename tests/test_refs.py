@@ -0,0 +1,67 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class ListRefsTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        first = self.commit("first")
+        self.commit("second")
+        self.git("tag", "-a", "v1", "-m", "v1", first)
+        self.git("branch", "topic", first)
+        self.git("update-ref", "refs/pull/5/head", first)
+        self.git("pack-refs", "--all")
+        # Loose refs, one of them shadowing a stale packed one.
+        self.git("update-ref", "refs/pull/5/head", "HEAD")
+        self.git("update-ref", "refs/pull/6/head", "HEAD")
+        self.git("tag", "loose")
+
+    def for_each_ref(self, prefix):
+        lines = self.git("for-each-ref", "--format=%(refname) %(objectname)").splitlines()
+        return [tuple(line.split()) for line in lines
+                if line.split()[0].startswith(prefix)]
+
+    def test_prefixes(self):
+        for prefix in ("", "refs", "refs/", "refs/pull/", "refs/tags/", "refs/heads/t"):
+            with self.subTest(prefix=prefix):
+                refs = libgit2.list_refs(self.repo, prefix)
+                self.assertEqual([ref[:2] for ref in refs], self.for_each_ref(prefix))
+
+    def test_peel(self):
+        refs = libgit2.list_refs(self.repo, "refs/tags/", peel=True)
+        self.assertEqual(dict((name, peeled) for name, _, peeled in refs),
+                         {"refs/tags/loose": self.git("rev-parse", "loose^{}"),
+                          "refs/tags/v1":    self.git("rev-parse", "v1^{}")})
+
+    def test_cache(self):
+        cache = {}
+        refs = libgit2.list_refs(self.repo, cache=cache)
+        self.assertIs(libgit2.list_refs(self.repo, cache=cache), refs)
+        self.git("update-ref", "-d", "refs/pull/6/head")
+        self.assertEqual([ref[:2] for ref in libgit2.list_refs(self.repo, cache=cache)],
+                         self.for_each_ref("refs/"))
+
+    def test_getitem(self):
+        refs = libgit2.list_refs(self.repo, peel=True)
+        items = list(refs)
+        self.assertEqual(refs[0], items[0])
+        self.assertEqual(refs[-1], items[-1])
+        with self.assertRaises(IndexError):
+            refs[len(items)]
+        for sliced in (slice(1, 3), slice(None, None, 2), slice(None, None, -1)):
+            with self.subTest(slice=sliced):
+                sub = refs[sliced]
+                self.assertIsInstance(sub, libgit2.RefList)
+                self.assertEqual(list(sub), items[sliced])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class RevparseCacheTestCase(GitRepoTestCase):
+
+    specs = ["HEAD", "main", "@", "HEAD~1", "main^", "HEAD^{tree}", "HEAD:a.txt", "v1",
+             "v1^{}", "v1^{commit}~1", "refs/heads/topic", "topic~1", "HEAD@{1}", "main@{0}",
+             ":/second"]
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.commit("first", **{"a.txt": "a\n"})
+        self.commit("second", **{"a.txt": "b\n"})
+        self.commit("third")
+        self.git("tag", "-a", "v1", "-m", "v1", "HEAD~1")
+        self.git("branch", "topic")
+        self.cache = libgit2.RevparseCache(self.repo)
+        self.addCleanup(self.cache.close)
+
+    def git_rev_parse(self, *specs):
+        return self.git("rev-parse", *specs).split()
+
+    def test_resolve(self):
+        specs = self.specs + [self.first, self.first + "^{tree}"]
+        expected = self.git_rev_parse(*specs)
+        self.assertEqual([self.cache.resolve(spec) for spec in specs], expected)
+        self.assertEqual(self.cache.stats, dict(hits=0, misses=len(specs)))
+        self.assertEqual([self.cache.resolve(spec) for spec in specs], expected)
+        # All but the commit message search are cached.
+        self.assertEqual(self.cache.stats, dict(hits=len(specs) - 1, misses=len(specs) + 1))
+        with self.assertRaises(libgit2.GitError) as context:
+            self.cache.resolve("none")
+        self.assertEqual(context.exception.code, libgit2.GIT_ENOTFOUND)
+
+    def test_invalidation(self):
+        self.assertEqual([self.cache.resolve(spec) for spec in self.specs],
+                         self.git_rev_parse(*self.specs))
+        self.commit("fourth", **{"a.txt": "c\n"})
+        self.git("tag", "-f", "-a", "v1", "-m", "v1 moved", "HEAD~1")
+        self.git("update-ref", "refs/heads/topic", "HEAD~2")
+        self.assertEqual([self.cache.resolve(spec) for spec in self.specs],
+                         self.git_rev_parse(*self.specs))
+        self.git("pack-refs", "--all")
+        self.git("checkout", "-q", "topic")
+        self.git("update-ref", "refs/heads/topic", "main~1")
+        self.assertEqual([self.cache.resolve(spec) for spec in self.specs],
+                         self.git_rev_parse(*self.specs))
+        # A loose reference appearing in front of the resolved one.
+        self.git("update-ref", "refs/tags/topic", "HEAD~1")
+        self.assertEqual(self.cache.resolve("topic"), self.git_rev_parse("topic")[0])
+
+    def test_resolve_many(self):
+        specs = self.specs + ["none", "HEAD"]
+        results = self.cache.resolve_many(specs, workers=3)
+        self.assertEqual(results[:len(self.specs)], self.git_rev_parse(*self.specs))
+        self.assertIsInstance(results[-2], libgit2.GitError)
+        self.assertEqual(results[-1], results[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
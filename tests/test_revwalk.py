@@ -0,0 +1,111 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class PathHistoryTestCase(GitRepoTestCase):
+
+    PATHS = ("a.txt", "b.txt", "dir", "dir/c.txt", "dir/sub/d.txt", "missing")
+
+    def setUp(self):
+        super().setUp()
+        self.commit("first", **{"a.txt": "1\n", "dir__c.txt": "1\n"})
+        self.commit("second", **{"b.txt": "1\n"})
+        self.git("checkout", "-q", "-b", "topic")
+        self.topic = self.commit("topic", **{"a.txt": "topic\n", "dir__sub__d.txt": "1\n"})
+        self.git("checkout", "-q", "main")
+        self.main = self.commit("third", **{"dir__c.txt": "2\n"})
+        self.git("merge", "-q", "--no-edit", "topic")
+        self.commit("fourth", **{"b.txt": "2\n", "dir__sub__d.txt": "2\n"})
+
+    def git_log(self, commit, path, *args):
+        return self.git("log", "--format=%H", *args, commit, "--", path).split()
+
+    def test_path_history(self):
+        for path in self.PATHS:
+            for commit in ("main", "topic"):
+                with self.subTest(path=path, commit=commit):
+                    self.assertEqual(
+                        sorted(libgit2.path_history(self.repo, path,
+                                                    self.git("rev-parse", commit))),
+                        sorted(self.git_log(commit, path)))
+
+    def test_mode_change(self):
+        self.git("update-index", "--chmod=+x", "dir/c.txt")
+        self.git("commit", "-q", "-m", "chmod")
+        expected = self.git_log("main", "dir/c.txt")
+        self.assertEqual(expected[0], self.git("rev-parse", "HEAD"))
+        self.assertEqual(sorted(libgit2.path_history(self.repo, "dir/c.txt")), sorted(expected))
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index:
+            self.assertEqual(sorted(index.history("dir/c.txt")), sorted(expected))
+            self.assertEqual(sorted(index.history("dir")), sorted(self.git_log("main", "dir")))
+
+    def test_merge_simplification(self):
+        # A merge which kept the changes of its side branch (topic) goes
+        # on through both parents; one which discarded them (side) only
+        # through the parent with the same entry.
+        self.git("checkout", "-q", "-b", "side")
+        side = self.commit("side", **{"a.txt": "side\n"})
+        self.git("checkout", "-q", "main")
+        self.git("merge", "-q", "--no-edit", "-s", "ours", "side")
+        expected = self.git_log("main", "a.txt")
+        self.assertIn(self.topic, expected)
+        self.assertNotIn(side, expected)
+        self.assertEqual(sorted(libgit2.path_history(self.repo, "a.txt")), sorted(expected))
+        # The index does not simplify the history.
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index:
+            self.assertEqual(sorted(index.history("a.txt")), sorted(expected + [side]))
+
+    def test_deleted_path(self):
+        self.git("rm", "-q", "b.txt")
+        self.git("commit", "-q", "-m", "delete")
+        self.assertEqual(sorted(libgit2.path_history(self.repo, "b.txt")),
+                         sorted(self.git_log("main", "b.txt")))
+        self.assertEqual(libgit2.path_history(self.repo, "b.txt", limit=1),
+                         [self.git("rev-parse", "HEAD")])
+
+    def test_index(self):
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index:
+            for path in self.PATHS:
+                for commit in ("main", "topic", self.main):
+                    with self.subTest(path=path, commit=commit):
+                        sha = self.git("rev-parse", commit)
+                        expected = self.git_log(commit, path, "--topo-order")
+                        self.assertEqual(sorted(index.history(path, sha)), sorted(expected))
+                        self.assertEqual(index.history(path, sha, limit=1), expected[:1])
+            index.save()
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index:
+            self.assertEqual(sorted(index.history("a.txt")),
+                             sorted(self.git_log("main", "a.txt")))
+
+    def test_auto_update(self):
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path) as index:
+            self.assertEqual(index.history("b.txt"), self.git_log("main", "b.txt"))
+            self.commit("fifth", **{"b.txt": "3\n"})
+            self.assertEqual(index.history("b.txt"), self.git_log("main", "b.txt"))
+        with libgit2.PathHistoryIndex(self.repo, index_path, auto_update=False) as index:
+            self.assertEqual(index.history("b.txt"), [])
+            index.update()
+            self.assertEqual(index.history("b.txt"), self.git_log("main", "b.txt"))
+
+    def test_unindexed_commit(self):
+        index_path = os.path.join(self.tmpdir, "history.idx")
+        with libgit2.PathHistoryIndex(self.repo, index_path, refs=("refs/heads/topic",)) as index:
+            main = self.git("rev-parse", "main")
+            self.assertEqual(sorted(index.history("dir", main)),
+                             sorted(self.git_log("main", "dir")))
+
+
+if __name__ == "__main__":
+    unittest.main()
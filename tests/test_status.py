@@ -0,0 +1,180 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+from unittest import mock
+import os
+import ctypes as ct
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class StatusTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.commit("first", **{"a.txt": "a\n", "src__b.txt": "b\n",
+                                ".gitignore": "build/\n"})
+
+    def git_status(self):
+        # Paths `git status` reports, untracked directories recursed into
+        # (without refreshing the index, which would force a rescan).
+        output = self.git("--no-optional-locks", "status", "--porcelain=v1", "-z",
+                          "--untracked-files=all")
+        return sorted(entry[3:] for entry in output.split("\0") if entry)
+
+    def change(self):
+        # Same size as the committed content: only racy-git checks see it.
+        self.write("a.txt", "x\n")
+        self.write("src/c.txt", "c\n")
+        self.write("build/out.o", "o\n")
+        os.remove(os.path.join(self.path, "src", "b.txt"))
+
+    def paths(self, status):
+        return [path for path, _ in status]
+
+
+class ScanWorkdirTestCase(StatusTestCase):
+
+    def test_scan(self):
+        self.assertEqual(libgit2.status_scan_workdir(self.repo), [])
+        self.change()
+        self.git("add", "src/c.txt")
+        self.write("src/d.txt", "d\n")
+        status = dict(libgit2.status_scan_workdir(self.repo, workers=2))
+        self.assertEqual(sorted(status), self.git_status())
+        self.assertEqual(status, {"a.txt":     libgit2.GIT_STATUS_WT_MODIFIED,
+                                  "src/b.txt": libgit2.GIT_STATUS_WT_DELETED,
+                                  "src/c.txt": libgit2.GIT_STATUS_INDEX_NEW,
+                                  "src/d.txt": libgit2.GIT_STATUS_WT_NEW})
+
+    def test_update_index(self):
+        # Touched, but unchanged: stat-dirty for `git diff-files`.
+        stat = os.stat(os.path.join(self.path, "a.txt"))
+        os.utime(os.path.join(self.path, "a.txt"), (stat.st_atime, stat.st_mtime + 10))
+        self.write("src/b.txt", "changed\n")
+        self.assertEqual(self.git("--no-optional-locks", "diff-files", "--name-only"),
+                         "a.txt\nsrc/b.txt")
+        status = libgit2.status_scan_workdir(self.repo, update_index=True)
+        self.assertEqual(status, [("src/b.txt", libgit2.GIT_STATUS_WT_MODIFIED)])
+        self.assertEqual(self.git("--no-optional-locks", "diff-files", "--name-only"), "")
+        self.assertEqual(self.git("diff", "--cached", "--name-only"), "src/b.txt")
+
+
+class StatusListTestCase(StatusTestCase):
+
+    def status_list(self):
+        opts = libgit2.git_status_options()
+        libgit2.git_status_options_init(ct.byref(opts), libgit2.GIT_STATUS_OPTIONS_VERSION)
+        opts.flags = (libgit2.GIT_STATUS_OPT_INCLUDE_UNTRACKED |
+                      libgit2.GIT_STATUS_OPT_RECURSE_UNTRACKED_DIRS |
+                      libgit2.GIT_STATUS_OPT_SORT_CASE_SENSITIVELY)
+        return libgit2.StatusList(self.repo, opts)
+
+    def test_paths(self):
+        self.change()
+        with self.status_list() as status:
+            self.assertEqual(len(status), len(self.git_status()))
+            self.assertEqual(status.paths(), self.git_status())
+            self.assertEqual(status.paths(libgit2.GIT_STATUS_WT_MODIFIED |
+                                          libgit2.GIT_STATUS_WT_DELETED),
+                             self.git("--no-optional-locks", "diff", "--name-only").split())
+            self.assertEqual(status.paths(libgit2.GIT_STATUS_WT_NEW),
+                             self.git("ls-files", "--others", "--exclude-standard").split())
+
+    def test_entries(self):
+        self.change()
+        self.git("add", "-A")
+        expected = dict(reversed(line.split("\t")) for line in
+                        self.git("diff", "--cached", "--name-status").splitlines())
+        codes = {libgit2.GIT_STATUS_INDEX_MODIFIED: "M",
+                 libgit2.GIT_STATUS_INDEX_DELETED:  "D",
+                 libgit2.GIT_STATUS_INDEX_NEW:      "A"}
+        with self.status_list() as status:
+            entries = list(status)
+            self.assertEqual({entry.path: codes[entry.status] for entry in entries}, expected)
+            self.assertEqual(list(status.flags()), [entry.status for entry in entries])
+            self.assertEqual([entry.path for entry in status[1:3]],
+                             [entry.path for entry in entries[1:3]])
+            self.assertEqual(status[-1].path, entries[-1].path)
+            self.assertIsNotNone(status[0].head_to_index)
+            self.assertIsNone(status[0].index_to_workdir)
+            with self.assertRaises(IndexError):
+                status[len(entries)]
+        self.assertEqual(len(status), 0)
+
+
+class StatusWatcherTestCase(StatusTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.watcher = libgit2.StatusWatcher(self.repo)
+        self.assertTrue(self.watcher.watching)
+
+    def tearDown(self):
+        self.watcher.close()
+        super().tearDown()
+
+    def assertStatus(self):
+        self.assertEqual(self.paths(self.watcher.status()), self.git_status())
+
+    def test_changes(self):
+        self.assertStatus()
+        self.write("a.txt", "changed\n")
+        self.write("new/dir/c.txt", "c\n")
+        self.write("build/out.o", "o\n")
+        self.assertStatus()
+        os.remove(os.path.join(self.path, "src", "b.txt"))
+        self.git("add", "a.txt")
+        self.assertStatus()
+
+    def test_incremental(self):
+        self.assertStatus()
+        self.write("a.txt", "changed\n")
+        collect = libgit2.git2.status._status_collect
+        with mock.patch.object(libgit2.git2.status, "_status_collect",
+                               wraps=collect) as status_collect:
+            self.assertStatus()
+        # Only the changed file is rescanned.
+        status_collect.assert_called_once()
+        self.assertEqual(status_collect.call_args.args[3], [b"a.txt"])
+
+    def test_gitignore(self):
+        self.write("build/out.o", "o\n")
+        self.write("x.log", "x\n")
+        self.assertStatus()
+        self.write(".gitignore", "*.log\n")
+        self.assertStatus()
+        # The formerly ignored directory is watched now.
+        self.write("build/other.o", "o\n")
+        self.assertStatus()
+        self.write("src/.gitignore", "*.txt\n")
+        self.write("src/c.txt", "c\n")
+        self.assertStatus()
+
+    def test_info_exclude(self):
+        self.write("x.log", "x\n")
+        self.assertStatus()
+        with open(os.path.join(self.path, ".git", "info", "exclude"), "a") as f:
+            f.write("*.log\n")
+        self.assertStatus()
+
+    def test_excludes_file(self):
+        excludes = os.path.join(self.tmpdir, "ignore")
+        with open(excludes, "w") as f:
+            f.write("*.log\n")
+        self.write("x.log", "x\n")
+        self.write("y.tmp", "y\n")
+        self.assertStatus()
+        self.git("config", "core.excludesFile", excludes)
+        self.assertStatus()
+        with open(excludes, "w") as f:
+            f.write("*.tmp\n")
+        self.assertStatus()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class TagCatalogTestCase(GitRepoTestCase):
+
+    types = {"commit": libgit2.GIT_OBJECT_COMMIT, "tree": libgit2.GIT_OBJECT_TREE,
+             "blob": libgit2.GIT_OBJECT_BLOB}
+
+    def setUp(self):
+        super().setUp()
+        first = self.commit("first", **{"a.txt": "a\n"})
+        self.commit("second")
+        self.git("tag", "light")
+        self.git("tag", "v1.0", "-m", "Release 1.0\n\nWith a body.", first)
+        self.git("tag", "v1.1", "-m", "Release\n1.1 on\ntwo lines\n\nbody")
+        self.git("tag", "v2.0-rc", "-m", "nested", "v1.1")
+        self.git("tag", "tree", "-m", "a tree", "HEAD^{tree}")
+        self.git("tag", "blob", self.git("rev-parse", "HEAD:a.txt"))
+        self.git("pack-refs", "--all")
+        self.git("tag", "v2.0", "-m", "Release 2.0 (loose)")
+
+    def git_tags(self, pattern=None):
+        output = self.git("for-each-ref", "refs/tags/" + (pattern or ""),
+                          "--format=%(refname:short)\t%(objectname)\t%(objecttype)\t"
+                          "%(taggerdate:unix)\t%(contents:subject)")
+        tags = []
+        for line in output.splitlines():
+            name, oid, kind, time, subject = line.split("\t")
+            peeled = self.git("rev-parse", oid + "^{}")
+            peeled_type = self.git("cat-file", "-t", peeled)
+            tags.append((name, oid, peeled, self.types[peeled_type], int(time or 0),
+                         subject if kind == "tag" else None))
+        return tags
+
+    def test_tag_catalog(self):
+        cache = {}
+        catalog = libgit2.tag_catalog(self.repo, workers=2, cache=cache)
+        self.assertEqual(list(catalog), self.git_tags())
+        self.assertEqual(len(catalog), 7)
+        self.assertEqual(catalog[-1], list(catalog)[-1])
+        self.assertEqual(len(cache), 7)
+        # The decoded tags come from the cache now.
+        for key, value in cache.items():
+            cache[key] = value[:3] + ("cached",)
+        self.assertEqual(set(libgit2.tag_catalog(self.repo, cache=cache).summaries),
+                         {"cached"})
+
+    def test_pattern(self):
+        catalog = libgit2.tag_catalog(self.repo, "v2.*")
+        self.assertEqual(list(catalog), self.git_tags("v2.*"))
+        self.assertEqual(catalog.names, ["v2.0", "v2.0-rc"])
+        self.assertEqual(len(libgit2.tag_catalog(self.repo, "none*")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# Copyright (c) 2023 Adam Karpierz
+# Licensed under the zlib/libpng License
+# https://opensource.org/license/zlib
+
+import unittest
+import os
+
+import libgit2
+
+from .gitrepo import GitRepoTestCase
+
+
+class RefBatchTestCase(GitRepoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first  = self.commit("first")
+        self.second = self.commit("second")
+        self.git("branch", "old", self.first)
+        self.git("tag", "gone", self.first)
+
+    def refs(self):
+        return dict(line.split() for line in
+                    self.git("for-each-ref", "--format=%(refname) %(objectname)").splitlines())
+
+    def reflog(self, name):
+        path = os.path.join(self.path, ".git", "logs", *name.split("/"))
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def test_commit(self):
+        batch = libgit2.RefBatch(self.repo, message="batch")
+        batch.create("refs/heads/new", self.second)
+        batch.create("refs/heads/main", self.first)  # exists
+        batch.update("refs/heads/old", self.second, old=self.first)
+        batch.update("refs/heads/main", self.first, old=self.first)  # replaces the create
+        batch.delete("refs/tags/gone")
+        batch.delete("refs/tags/missing")
+        self.assertEqual(len(batch), 5)
+        result = batch.commit()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(sorted(result.applied),
+                         ["refs/heads/new", "refs/heads/old", "refs/tags/gone"])
+        self.assertEqual(sorted(result.failures), ["refs/heads/main", "refs/tags/missing"])
+        self.assertEqual(result.failures["refs/heads/main"].code, libgit2.GIT_EMODIFIED)
+        self.assertEqual(result.failures["refs/tags/missing"].code, libgit2.GIT_ENOTFOUND)
+        self.assertEqual(self.refs(), {"refs/heads/main": self.second,
+                                       "refs/heads/new":  self.second,
+                                       "refs/heads/old":  self.second})
+        self.assertIn("batch", self.reflog("refs/heads/old").splitlines()[-1])
+
+    def test_locked(self):
+        open(os.path.join(self.path, ".git", "refs", "heads", "old.lock"), "w").close()
+        batch = libgit2.RefBatch(self.repo)
+        batch.update("refs/heads/old", self.second)
+        batch.create("refs/heads/new", self.second)
+        result = batch.commit()
+        self.assertEqual(result.applied, ["refs/heads/new"])
+        self.assertEqual(list(result.failures), ["refs/heads/old"])
+        self.assertEqual(self.refs()["refs/heads/old"], self.first)
+
+    def test_no_reflog(self):
+        before = self.reflog("refs/heads/old")
+        batch = libgit2.RefBatch(self.repo, reflog=False)
+        batch.update("refs/heads/old", self.second)
+        batch.create("refs/heads/new", self.second)
+        batch.create("refs/tags/new", self.second)
+        self.assertEqual(len(batch.commit().applied), 3)
+        self.assertEqual(self.reflog("refs/heads/old"), before)
+        self.assertEqual(self.reflog("refs/heads/new"), "")
+        self.assertIsNone(self.reflog("refs/tags/new"))
+
+    def test_no_reflog_log_all(self):
+        for value, logged in (("false", False), ("always", True)):
+            with self.subTest(value=value):
+                self.git("config", "core.logAllRefUpdates", value)
+                batch = libgit2.RefBatch(self.repo, reflog=False)
+                batch.create("refs/heads/new-" + value, self.second)
+                batch.create("refs/tags/new-" + value, self.second)
+                self.assertEqual(len(batch.commit().applied), 2)
+                for name in ("refs/heads/new-" + value, "refs/tags/new-" + value):
+                    self.assertEqual(self.reflog(name), "" if logged else None)
+
+
+if __name__ == "__main__":
+    unittest.main()